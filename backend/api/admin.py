@@ -2,11 +2,13 @@ from __future__ import annotations
 
 from typing import Iterable, List, Sequence, Tuple
 
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.db import models
 from django.forms import Textarea
 
 from . import models as api_models
+from .utils.elective_allocation import allocate_term
+from .utils.schedule_conflicts import conflicts_for_lessons
 
 admin.site.site_title = "MAX • Admin"
 admin.site.site_header = "MAX — административная панель"
@@ -541,6 +543,41 @@ class LessonAdmin(AutoConfiguredAdmin):
     list_filter = ("lesson_type", "format", "status")
     search_fields = ("subject", "notes", "group__title")
     autocomplete_fields = ("course", "room", "teacher", "group")
+    actions = ("check_conflicts",)
+
+    @admin.action(description="Проверить пересечения аудиторий, преподавателей и групп")
+    def check_conflicts(self, request, queryset):
+        conflicts = conflicts_for_lessons(queryset.order_by().values_list("id", flat=True))
+        if not conflicts:
+            self.message_user(request, "Пересечений не найдено.", messages.SUCCESS)
+            return
+        for conflict in conflicts[:20]:
+            self.message_user(request, conflict.describe(), messages.WARNING)
+        if len(conflicts) > 20:
+            self.message_user(request, f"И ещё {len(conflicts) - 20} пересечений.", messages.WARNING)
+
+
+@admin.register(api_models.LessonSeries)
+class LessonSeriesAdmin(AutoConfiguredAdmin):
+    list_display = ("subject", "lesson_type", "group", "teacher", "starts_on", "until", "start_time")
+    list_filter = ("lesson_type", "format", "interval_weeks")
+    search_fields = ("id", "subject", "group__title", "teacher__full_name")
+    autocomplete_fields = ("course", "room", "teacher", "group")
+
+
+@admin.register(api_models.ScheduleChange)
+class ScheduleChangeAdmin(AutoConfiguredAdmin):
+    list_display = ("id", "group_id", "lesson_id", "kind", "starts_at", "changed_at", "notified_at")
+    list_filter = ("kind",)
+    search_fields = ("group_id", "lesson_id")
+
+
+@admin.register(api_models.ScheduleNotification)
+class ScheduleNotificationAdmin(AutoConfiguredAdmin):
+    list_display = ("user", "status", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("user__full_name",)
+    autocomplete_fields = ("user",)
 
 
 @admin.register(api_models.TeacherFeedback)
@@ -551,12 +588,32 @@ class TeacherFeedbackAdmin(AutoConfiguredAdmin):
     autocomplete_fields = ("user", "teacher", "course")
 
 
+@admin.register(api_models.TeacherRatingRollup)
+class TeacherRatingRollupAdmin(AutoConfiguredAdmin):
+    list_display = ("teacher", "course", "period", "count", "rating_sum", "updated_at")
+    list_filter = ("period",)
+    search_fields = ("teacher__full_name", "course__title")
+    autocomplete_fields = ("teacher", "course")
+
+
 @admin.register(api_models.ElectiveEnrollment)
 class ElectiveEnrollmentAdmin(AutoConfiguredAdmin):
-    list_display = ("user", "course", "term", "status", "priority")
+    list_display = ("user", "course", "term", "status", "priority", "waitlist_position")
     list_filter = ("status", "term")
     search_fields = ("user__full_name", "course__title")
     autocomplete_fields = ("user", "course")
+    actions = ("allocate_terms",)
+
+    @admin.action(description="Распределить заявки pending по приоритетам и квотам (семестры выбранных заявок)")
+    def allocate_terms(self, request, queryset):
+        terms = sorted(queryset.order_by().values_list("term", flat=True).distinct())
+        for term in terms:
+            result = allocate_term(term)
+            self.message_user(
+                request,
+                f"{term}: зачислено {result.enrolled}, в листе ожидания {result.waitlisted}, отказано {result.rejected}",
+                messages.SUCCESS,
+            )
 
 
 # ---------------------------------------------------------------------------
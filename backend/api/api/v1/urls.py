@@ -65,7 +65,13 @@ from .views import (
     ProjectSubscriptionsView,
     ProjectTasksView,
     ProjectTeamView,
+    FreeClassroomsView,
+    ScheduleFeedLinksView,
+    ScheduleChangesView,
+    ScheduleFreeSlotsView,
+    ScheduleGroupFeedView,
     ScheduleGroupView,
+    ScheduleMyFeedView,
     ScheduleMyView,
     TeacherFeedbackView,
     TrackerWebhookView,
@@ -105,6 +111,12 @@ urlpatterns = [
     path("admissions/inquiries", AdmissionsInquiryView.as_view(), name="admissions-inquiries"),
 
     path("schedule/my", ScheduleMyView.as_view(), name="schedule-my"),
+    path("schedule/my.ics", ScheduleMyFeedView.as_view(), name="schedule-my-ics"),
+    path("schedule/feeds", ScheduleFeedLinksView.as_view(), name="schedule-feeds"),
+    path("schedule/rooms/free", FreeClassroomsView.as_view(), name="schedule-rooms-free"),
+    path("schedule/free-slots", ScheduleFreeSlotsView.as_view(), name="schedule-free-slots"),
+    path("schedule/changes", ScheduleChangesView.as_view(), name="schedule-changes"),
+    path("schedule/groups/<str:group_id>.ics", ScheduleGroupFeedView.as_view(), name="schedule-group-ics"),
     path("schedule/groups/<str:group_id>", ScheduleGroupView.as_view(), name="schedule-group"),
     path("feedback/teachers", TeacherFeedbackView.as_view(), name="feedback-teachers"),
     path("electives/catalog", ElectiveCatalogView.as_view(), name="electives-catalog"),
@@ -86,7 +86,13 @@ from .schedule import (
     ElectiveCatalogView,
     ElectiveEnrollmentCreateView,
     ElectiveEnrollmentListView,
+    FreeClassroomsView,
+    ScheduleFeedLinksView,
+    ScheduleChangesView,
+    ScheduleFreeSlotsView,
+    ScheduleGroupFeedView,
     ScheduleGroupView,
+    ScheduleMyFeedView,
     ScheduleMyView,
     TeacherFeedbackView,
 )
@@ -107,6 +113,12 @@ __all__ = [
     "AdmissionsInquiryView",
     "ScheduleMyView",
     "ScheduleGroupView",
+    "ScheduleMyFeedView",
+    "ScheduleGroupFeedView",
+    "ScheduleFeedLinksView",
+    "FreeClassroomsView",
+    "ScheduleChangesView",
+    "ScheduleFreeSlotsView",
     "TeacherFeedbackView",
     "ElectiveCatalogView",
     "ElectiveEnrollmentCreateView",
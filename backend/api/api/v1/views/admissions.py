@@ -1,15 +1,13 @@
-import base64
-import json
 from datetime import timedelta
 
 from django.db import IntegrityError, transaction
-from django.db.models import Q
 from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     AdmissionsInquiryCreateSerializer,
     AdmissionsInquirySerializer,
@@ -23,29 +21,30 @@ from ....serializers import (
     UniversityDetailSerializer,
     UniversitySerializer,
 )
-from ....utils import parse_init_data_payload, validate_init_data
+from ....utils import get_request_init_data
 from ....utils.audit import write_audit_log
+from ....utils.facets import (
+    OPEN_DAY_FILTER_PARAMS,
+    PROGRAM_FILTER_PARAMS,
+    open_day_facets,
+    open_day_queryset,
+    program_facets,
+    program_queryset,
+    request_filters,
+)
+from ....utils.keyset import KeysetPaginator
 
 
-def _encode_cursor(id_value: str) -> str:
-    payload = json.dumps({"id": id_value}).encode("utf-8")
-    return base64.urlsafe_b64encode(payload).decode("utf-8")
-
-
-def _decode_cursor(cursor: str) -> str:
-    try:
-        decoded = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
-        data = json.loads(decoded)
-        return data.get("id")
-    except (ValueError, json.JSONDecodeError, TypeError):
-        return ""
+def _invalid_page_params() -> Response:
+    return Response({"detail": "invalid cursor or limit"}, status=status.HTTP_400_BAD_REQUEST)
 
 
 class UniversityListView(generics.ListAPIView):
     serializer_class = UniversitySerializer
+    keyset = KeysetPaginator(("title", "id"), salt="admissions.universities")
 
     def get_queryset(self):
-        queryset = models.University.objects.all().order_by("id")
+        queryset = models.University.objects.all()
         city = self.request.query_params.get("city")
         if city:
             queryset = queryset.filter(city__iexact=city)
@@ -55,22 +54,14 @@ class UniversityListView(generics.ListAPIView):
         has_open_day = self.request.query_params.get("has_open_day")
         if has_open_day is not None:
             queryset = queryset.filter(feature_has_open_day=has_open_day.lower() == "true")
-        cursor = self.request.query_params.get("cursor")
-        if cursor:
-            last_id = _decode_cursor(cursor)
-            if last_id:
-                queryset = queryset.filter(id__gt=last_id)
-        limit = min(int(self.request.query_params.get("limit", 20)), 100)
-        return queryset[: limit + 1]
+        return queryset
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        limit = min(int(self.request.query_params.get("limit", 20)), 100)
-        items = queryset[:limit]
+        try:
+            items, next_cursor = self.keyset.paginate(self.get_queryset(), request.query_params)
+        except ValueError:
+            return _invalid_page_params()
         serializer = self.get_serializer(items, many=True)
-        next_cursor = None
-        if len(queryset) > limit:
-            next_cursor = _encode_cursor(items[-1].id)
         return Response({"items": serializer.data, "next_cursor": next_cursor})
 
 
@@ -94,54 +85,29 @@ class UniversityDetailView(generics.RetrieveAPIView):
 
 class ProgramListView(generics.ListAPIView):
     serializer_class = ProgramSerializer
+    keyset = KeysetPaginator(("title", "id"), salt="admissions.programs")
 
     def get_queryset(self):
         params = self.request.query_params
-        queryset = models.Program.objects.select_related("department", "university").all().order_by("id")
-        university_id = params.get("university_id")
-        if university_id:
-            queryset = queryset.filter(university_id=university_id)
-        level = params.get("level")
-        if level:
-            queryset = queryset.filter(level=level)
-        format_value = params.get("format")
-        if format_value:
-            queryset = queryset.filter(format=format_value)
-        department = params.get("department")
-        if department:
-            queryset = queryset.filter(department_id=department)
-        duration = params.get("duration")
-        if duration:
-            queryset = queryset.filter(duration_years=duration)
-        has_budget = params.get("has_budget")
-        if has_budget is not None:
-            queryset = queryset.filter(has_budget=has_budget.lower() == "true")
-
-        cursor = params.get("cursor")
-        if cursor:
-            last_id = _decode_cursor(cursor)
-            if last_id:
-                queryset = queryset.filter(id__gt=last_id)
-        limit = min(int(params.get("limit", 20)), 100)
-        return queryset[: limit + 1]
+        return program_queryset(request_filters(params, PROGRAM_FILTER_PARAMS)).select_related(
+            "department", "university"
+        )
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        limit = min(int(self.request.query_params.get("limit", 20)), 100)
-        items = queryset[:limit]
+        try:
+            items, next_cursor = self.keyset.paginate(self.get_queryset(), request.query_params)
+        except ValueError:
+            return _invalid_page_params()
         serializer = self.get_serializer(items, many=True)
-        next_cursor = None
-        if len(queryset) > limit:
-            next_cursor = _encode_cursor(items[-1].id)
+        facets = program_facets()
         filters = {
-            "levels": list(models.Program.objects.values_list("level", flat=True).distinct()),
-            "formats": list(models.Program.objects.values_list("format", flat=True).distinct()),
-            "departments": [
-                {"id": dept.id, "title": dept.title}
-                for dept in models.Department.objects.all().order_by("title")
-            ],
+            "levels": [item["value"] for item in facets["levels"]],
+            "formats": [item["value"] for item in facets["formats"]],
+            "departments": [{"id": item["id"], "title": item["title"]} for item in facets["departments"]],
         }
-        return Response({"items": serializer.data, "filters": filters, "next_cursor": next_cursor})
+        if request.query_params.get("facets") == "filtered":
+            facets = program_facets(request_filters(request.query_params, PROGRAM_FILTER_PARAMS))
+        return Response({"items": serializer.data, "filters": filters, "facets": facets, "next_cursor": next_cursor})
 
 
 class ProgramDetailView(generics.RetrieveAPIView):
@@ -185,52 +151,29 @@ class ProgramRequirementView(APIView):
 
 class OpenDayListView(generics.ListAPIView):
     serializer_class = OpenDayEventSerializer
+    keyset = KeysetPaginator(("starts_at", "id"), salt="admissions.open_days")
 
     def get_queryset(self):
         params = self.request.query_params
         university_id = params.get("university_id")
         if not university_id:
             return models.OpenDayEvent.objects.none()
-        queryset = models.OpenDayEvent.objects.filter(university_id=university_id).order_by("starts_at")
-        program_id = params.get("program_id")
-        if program_id:
-            queryset = queryset.filter(programs__id=program_id)
-        type_filter = params.get("type")
-        if type_filter:
-            queryset = queryset.filter(type=type_filter)
-        city = params.get("city")
-        if city:
-            queryset = queryset.filter(Q(city__iexact=city))
-        date_from = params.get("date_from")
-        if date_from:
-            queryset = queryset.filter(date__gte=date_from)
-        date_to = params.get("date_to")
-        if date_to:
-            queryset = queryset.filter(date__lte=date_to)
-
-        cursor = params.get("cursor")
-        if cursor:
-            last_id = _decode_cursor(cursor)
-            if last_id:
-                queryset = queryset.filter(id__gt=last_id)
-        limit = min(int(params.get("limit", 20)), 100)
-        return queryset.distinct()[: limit + 1]
+        return open_day_queryset(request_filters(params, OPEN_DAY_FILTER_PARAMS)).distinct()
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        limit = min(int(self.request.query_params.get("limit", 20)), 100)
-        items = list(queryset[:limit])
+        try:
+            items, next_cursor = self.keyset.paginate(self.get_queryset(), request.query_params)
+        except ValueError:
+            return _invalid_page_params()
         serializer = self.get_serializer(items, many=True)
-        next_cursor = None
-        if len(queryset) > limit:
-            next_cursor = _encode_cursor(items[-1].id)
+        facets = open_day_facets()
         filters = {
-            "types": list(models.OpenDayEvent.objects.values_list("type", flat=True).distinct()),
-            "cities": [
-                city for city in models.OpenDayEvent.objects.exclude(city="").values_list("city", flat=True).distinct()
-            ],
+            "types": [item["value"] for item in facets["types"]],
+            "cities": [item["value"] for item in facets["cities"]],
         }
-        return Response({"items": serializer.data, "filters": filters, "next_cursor": next_cursor})
+        if request.query_params.get("facets") == "filtered":
+            facets = open_day_facets(request_filters(request.query_params, OPEN_DAY_FILTER_PARAMS))
+        return Response({"items": serializer.data, "filters": filters, "facets": facets, "next_cursor": next_cursor})
 
 
 class OpenDayRegistrationView(APIView):
@@ -238,24 +181,14 @@ class OpenDayRegistrationView(APIView):
         serializer = OpenDayRegistrationCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
+        # Повторы по Idempotency-Key отдаёт IdempotencyMiddleware
         idempotency_key = request.headers.get("Idempotency-Key")
-        if idempotency_key:
-            existing = models.OpenDayRegistration.objects.filter(idempotency_key=idempotency_key).first()
-            if existing:
-                return Response(
-                    OpenDayRegistrationSerializer(existing).data,
-                    status=status.HTTP_200_OK,
-                )
-
-        raw_init_data = request.META.get("HTTP_X_MAX_INIT_DATA")
 
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
-        user_id = user_payload.get("id")
+        user_id = get_request_init_data(request).user_id
         if not user_id:
             return Response({"detail": "Init data does not contain user id."}, status=status.HTTP_400_BAD_REQUEST)
 
-        user_profile = models.UserProfile.objects.filter(user_id=str(user_id)).first()
+        user_profile = get_request_profile(request)
         if not user_profile:
             return Response({"detail": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -326,14 +259,11 @@ class AdmissionsInquiryView(APIView):
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
-        raw_init_data = request.META.get("HTTP_X_MAX_INIT_DATA")
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
-        user_id = user_payload.get("id")
+        user_id = get_request_init_data(request).user_id
         if not user_id:
             return Response({"detail": "Init data does not contain user id."}, status=status.HTTP_400_BAD_REQUEST)
 
-        user_profile = models.UserProfile.objects.filter(user_id=str(user_id)).first()
+        user_profile = get_request_profile(request)
         if not user_profile:
             return Response({"detail": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -348,11 +278,6 @@ class AdmissionsInquiryView(APIView):
                 return Response({"detail": "program_not_found"}, status=status.HTTP_404_NOT_FOUND)
 
         idempotency_key = request.headers.get("Idempotency-Key")
-        if idempotency_key:
-            existing = models.AdmissionsInquiry.objects.filter(idempotency_key=idempotency_key).first()
-            if existing:
-                return Response(AdmissionsInquirySerializer(existing).data, status=status.HTTP_200_OK)
-
         inquiry = models.AdmissionsInquiry.objects.create(
             user=user_profile,
             university=university,
@@ -1,22 +1,36 @@
+import hashlib
+import json
 from datetime import timedelta
 from secrets import token_urlsafe
 
-from django.db import transaction
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from api import models
+from api.authentication import resolve_profile
 from api.serializers import LoginRequestSerializer
 from api.services import (
     UniversityAuthInvalidCredentials,
     UniversityAuthServiceUnavailable,
     authenticate_user,
 )
-from api.utils import parse_init_data_payload
+from api.utils import get_request_init_data
+from api.utils.init_data import INIT_DATA_META_KEY
 
-INIT_DATA_META_KEY = "HTTP_X_MAX_INIT_DATA"
+
+INIT_PAYLOAD_FINGERPRINT_KEY = "init_data_fingerprint"
+
+# Поля init_data, которые меняются при каждом открытии мини-приложения
+VOLATILE_INIT_PAYLOAD_KEYS = frozenset({"auth_date", "hash", "query_id", "signature"})
+
+
+def _init_payload_fingerprint(init_payload: dict) -> str:
+    """Хэш значимой части init_data, по которому решаем, обновлять ли metadata."""
+    stable = {key: value for key, value in init_payload.items() if key not in VOLATILE_INIT_PAYLOAD_KEYS}
+    encoded = json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
 
 
 def _serialize_profile(profile: models.UserProfile) -> dict:
@@ -39,25 +53,39 @@ class AuthMeView(APIView):
     permission_classes: list = []
 
     def get(self, request):
-        raw_init_data = request.META.get(INIT_DATA_META_KEY)
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
+        init_data = get_request_init_data(request)
+        init_payload = init_data.payload
+        user_payload = init_data.user
 
-        user_id = str(user_payload.get("id") or "")
+        user_id = init_data.user_id
         if not user_id:
             return Response(
                 {"detail": "Unable to determine user id."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        role = models.UserProfile.ROLE_APPLICANT
+        fingerprint = _init_payload_fingerprint(init_payload)
 
-        scopes = []
-        if isinstance(scopes, str):
-            scopes = [scope.strip() for scope in scopes.split(",") if scope.strip()]
-        elif not isinstance(scopes, list):
-            scopes = []
+        # Быстрый путь: профиль почти всегда уже есть, читаем без транзакции
+        profile = resolve_profile(user_id)
+        if profile is None:
+            profile = self._create_profile(user_id, user_payload, init_payload, fingerprint)
+        elif (profile.metadata or {}).get(INIT_PAYLOAD_FINGERPRINT_KEY) != fingerprint:
+            metadata = dict(profile.metadata or {})
+            metadata.update(init_payload)
+            metadata[INIT_PAYLOAD_FINGERPRINT_KEY] = fingerprint
+            profile.metadata = metadata
+            profile.save(update_fields=["metadata", "updated_at"])
 
+        return Response({"user": _serialize_profile(profile)})
+
+    def _create_profile(
+        self,
+        user_id: str,
+        user_payload: dict,
+        init_payload: dict,
+        fingerprint: str,
+    ) -> models.UserProfile:
         first_name = user_payload.get("first_name") or ""
         last_name = user_payload.get("last_name") or ""
         full_name = (
@@ -66,35 +94,27 @@ class AuthMeView(APIView):
             or " ".join(part for part in [first_name, last_name] if part)
         )
 
-        defaults = {
-            "role": role,
-            "scopes": scopes,
-            "full_name": full_name,
-            "email": user_payload.get("email") or "",
-            "locale": user_payload.get("language_code") or "",
-            "time_zone": user_payload.get("time_zone") or "",
-            "metadata": init_payload,
-        }
-
-        with transaction.atomic():
-            profile, created = models.UserProfile.objects.get_or_create(
-                user_id=user_id,
-                defaults=defaults,
-            )
-
-            # if not created:
-            #     update_fields: list[str] = []
-            #     for field, value in defaults.items():
-            #         if value is None:
-            #             continue
-            #         if getattr(profile, field) != value:
-            #             setattr(profile, field, value)
-            #             update_fields.append(field)
-
-            #     if update_fields:
-            #         profile.save(update_fields=update_fields)
-
-        return Response({"user": _serialize_profile(profile)})
+        metadata = dict(init_payload)
+        metadata[INIT_PAYLOAD_FINGERPRINT_KEY] = fingerprint
+
+        # INSERT ... ON CONFLICT DO NOTHING: параллельный /auth/me той же сессии не падает
+        # на уникальном индексе, а просто перечитывает уже созданный профиль.
+        models.UserProfile.objects.bulk_create(
+            [
+                models.UserProfile(
+                    user_id=user_id,
+                    role=models.UserProfile.ROLE_APPLICANT,
+                    scopes=[],
+                    full_name=full_name,
+                    email=user_payload.get("email") or "",
+                    locale=user_payload.get("language_code") or "",
+                    time_zone=user_payload.get("time_zone") or "",
+                    metadata=metadata,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        return models.UserProfile.objects.get(user_id=user_id)
 
 
 class LoginView(APIView):
@@ -117,16 +137,14 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
-        user_id = str(user_payload.get("id") or "")
+        user_id = get_request_init_data(request).user_id
         if not user_id:
             return Response(
                 {"detail": "Unable to determine user id from init data."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        profile = models.UserProfile.objects.filter(user_id=user_id).first()
+        profile = resolve_profile(user_id)
         if profile is None:
             return Response(
                 {"detail": "User profile not found."},
@@ -221,16 +239,14 @@ class LogoutView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
-        user_id = str(user_payload.get("id") or "")
+        user_id = get_request_init_data(request).user_id
         if not user_id:
             return Response(
                 {"detail": "Unable to determine user id from init data."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        profile = models.UserProfile.objects.filter(user_id=user_id).first()
+        profile = resolve_profile(user_id)
         if profile is None:
             return Response(
                 {"detail": "User profile not found."},
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     CareerConsultationCreateSerializer,
     CareerConsultationSerializer,
@@ -15,7 +16,6 @@ from ....serializers import (
     CareerVacancyDetailSerializer,
     CareerVacancySerializer,
 )
-from ....utils.init_data import parse_init_data_payload
 
 class CareerVacancyPagination(PageNumberPagination):
     page_size = 20
@@ -29,32 +29,6 @@ class CareerConsultationPagination(PageNumberPagination):
     max_page_size = 50
 
 
-def resolve_user_from_request(request):
-    if hasattr(request, "_resolved_user"):
-        return request._resolved_user
-
-    user = getattr(request, "user", None)
-    if getattr(user, "is_authenticated", False):
-        request._resolved_user = user
-        return user
-
-    init_data = request.META.get("HTTP_X_MAX_INIT_DATA")
-    if not init_data:
-        request._resolved_user = None
-        return None
-
-    payload = parse_init_data_payload(init_data)
-    user_payload = payload.get("user") or {}
-    user_id = str(user_payload.get("id") or "")
-    if not user_id:
-        request._resolved_user = None
-        return None
-
-    resolved_user = models.UserProfile.objects.filter(user_id=user_id).first()
-    request._resolved_user = resolved_user
-    return resolved_user
-
-
 class CareerVacancyListView(ListAPIView):
     serializer_class = CareerVacancySerializer
     pagination_class = CareerVacancyPagination
@@ -98,7 +72,7 @@ class CareerVacancyDetailView(RetrieveAPIView):
 
 class CareerVacancyApplyView(APIView):
     def post(self, request, vacancy_id: str):
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         vacancy = models.CareerVacancy.objects.filter(id=vacancy_id).first()
@@ -125,7 +99,7 @@ class CareerVacancyApplyView(APIView):
 
 class CareerConsultationCreateView(APIView):
     def post(self, request):
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         serializer = CareerConsultationCreateSerializer(data=request.data)
@@ -146,7 +120,7 @@ class CareerConsultationListView(ListAPIView):
     pagination_class = CareerConsultationPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.CareerConsultation.objects.filter(user=user).order_by("-created_at")
@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     AcademicLeaveCreateSerializer,
     AcademicLeaveRequestSerializer,
@@ -19,7 +20,6 @@ from ....serializers import (
     TuitionPaymentIntentCreateSerializer,
     TuitionPaymentIntentSerializer,
 )
-from ..views.careers import resolve_user_from_request
 
 
 class DeaneryPagination(PageNumberPagination):
@@ -32,7 +32,7 @@ class DeaneryCertificateCreateView(APIView):
     def post(self, request):
         serializer = DeaneryCertificateCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         request_obj = models.DeaneryCertificateRequest.objects.create(
@@ -54,7 +54,7 @@ class DeaneryCertificateListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DeaneryCertificateRequest.objects.filter(user=user).order_by("-created_at")
@@ -64,7 +64,7 @@ class DeaneryTuitionInvoiceCreateView(APIView):
     def post(self, request):
         serializer = TuitionInvoiceSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         invoice = models.TuitionInvoice.objects.create(
@@ -87,7 +87,7 @@ class TuitionInvoiceListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.TuitionInvoice.objects.filter(user=user).order_by("due_date")
@@ -98,7 +98,7 @@ class TuitionPaymentIntentCreateView(APIView):
         serializer = TuitionPaymentIntentCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         invoice = None
@@ -120,7 +120,7 @@ class TuitionPaymentIntentListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return (
@@ -135,7 +135,7 @@ class DeaneryCompensationCreateView(APIView):
         serializer = DeaneryCompensationCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         req = models.DeaneryCompensationRequest.objects.create(
@@ -155,7 +155,7 @@ class DeaneryCompensationListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DeaneryCompensationRequest.objects.filter(user=user).order_by("-created_at")
@@ -166,7 +166,7 @@ class DeaneryTransferCreateView(APIView):
         serializer = DeaneryTransferCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         from_program = None
@@ -191,7 +191,7 @@ class DeaneryTransferListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DeaneryTransferRequest.objects.filter(user=user).order_by("-created_at")
@@ -202,7 +202,7 @@ class AcademicLeaveCreateView(APIView):
         serializer = AcademicLeaveCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         leave = models.AcademicLeaveRequest.objects.create(
@@ -221,7 +221,7 @@ class AcademicLeaveListView(ListAPIView):
     pagination_class = DeaneryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.AcademicLeaveRequest.objects.filter(user=user).order_by("-created_at")
@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     DormGuestPassCreateSerializer,
     DormGuestPassSerializer,
@@ -17,7 +18,6 @@ from ....serializers import (
     DormSupportTicketCreateSerializer,
     DormSupportTicketSerializer,
 )
-from ..views.careers import resolve_user_from_request
 
 
 class DormPagination(PageNumberPagination):
@@ -31,7 +31,7 @@ class DormPaymentIntentCreateView(APIView):
         serializer = DormPaymentIntentCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         intent = models.DormPaymentIntent.objects.create(
@@ -50,7 +50,7 @@ class DormPaymentIntentListView(ListAPIView):
     pagination_class = DormPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DormPaymentIntent.objects.filter(user=user).order_by("-created_at")
@@ -69,7 +69,7 @@ class DormServiceOrderCreateView(APIView):
         serializer = DormServiceOrderCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         service = models.DormService.objects.filter(id=data["service_id"]).first()
@@ -89,7 +89,7 @@ class DormServiceOrderListView(ListAPIView):
     pagination_class = DormPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return (
@@ -104,7 +104,7 @@ class DormGuestPassCreateView(APIView):
         serializer = DormGuestPassCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         guest_pass = models.DormGuestPass.objects.create(
@@ -124,7 +124,7 @@ class DormGuestPassListView(ListAPIView):
     pagination_class = DormPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DormGuestPass.objects.filter(user=user).order_by("-visit_date", "-created_at")
@@ -135,7 +135,7 @@ class DormSupportTicketCreateView(APIView):
         serializer = DormSupportTicketCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         ticket = models.DormSupportTicket.objects.create(
@@ -153,7 +153,7 @@ class DormSupportTicketListView(ListAPIView):
     pagination_class = DormPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.DormSupportTicket.objects.filter(user=user).order_by("-created_at")
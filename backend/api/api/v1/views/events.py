@@ -7,12 +7,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     CampusEventSerializer,
     EventRegistrationCreateSerializer,
     EventRegistrationSerializer,
 )
-from ..views.careers import resolve_user_from_request
 
 
 class EventsPagination(PageNumberPagination):
@@ -50,7 +50,7 @@ class EventRegistrationCreateView(APIView):
             return Response({"detail": "event_not_found"}, status=status.HTTP_404_NOT_FOUND)
         serializer = EventRegistrationCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         data = serializer.validated_data
@@ -69,7 +69,7 @@ class EventRegistrationsMyView(ListAPIView):
     pagination_class = EventsPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.EventRegistration.objects.filter(user=user).select_related("event").order_by("-created_at")
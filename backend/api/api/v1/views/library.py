@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     LibraryCatalogItemSerializer,
     LibraryEBookAccessCreateSerializer,
@@ -17,7 +18,6 @@ from ....serializers import (
     LibraryLoanCreateSerializer,
     LibraryLoanSerializer,
 )
-from ..views.careers import resolve_user_from_request
 
 
 class LibraryPagination(PageNumberPagination):
@@ -49,7 +49,7 @@ class LibraryHoldCreateView(APIView):
     def post(self, request):
         serializer = LibraryHoldCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         item = models.LibraryCatalogItem.objects.filter(id=serializer.validated_data["item_id"]).first()
@@ -68,7 +68,7 @@ class LibraryHoldListView(ListAPIView):
     pagination_class = LibraryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.LibraryHold.objects.filter(user=user).select_related("item").order_by("-created_at")
@@ -79,7 +79,7 @@ class LibraryLoansListView(ListAPIView):
     pagination_class = LibraryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.LibraryLoan.objects.filter(user=user).select_related("item").order_by("due_at")
@@ -89,7 +89,7 @@ class LibraryLoanCreateView(APIView):
     def post(self, request):
         serializer = LibraryLoanCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         item = models.LibraryCatalogItem.objects.filter(id=serializer.validated_data["item_id"]).first()
@@ -115,7 +115,7 @@ class LibraryEBookAccessListView(ListAPIView):
     pagination_class = LibraryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return models.LibraryEBookAccess.objects.filter(user=user).select_related("item").order_by(
@@ -127,7 +127,7 @@ class LibraryEBookAccessCreateView(APIView):
     def post(self, request):
         serializer = LibraryEBookAccessCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         item = models.LibraryCatalogItem.objects.filter(id=serializer.validated_data["item_id"]).first()
@@ -153,7 +153,7 @@ class LibraryFinePaymentIntentCreateView(APIView):
         serializer = LibraryFinePaymentIntentCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
         loan = None
@@ -173,7 +173,7 @@ class LibraryFinePaymentIntentListView(ListAPIView):
     pagination_class = LibraryPagination
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         return (
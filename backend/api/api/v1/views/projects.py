@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile
 from ....serializers import (
     ProjectApplicationCreateSerializer,
     ProjectApplicationSerializer,
@@ -15,7 +16,7 @@ from ....serializers import (
     ProjectTaskSerializer,
     ProjectTeamMembershipSerializer,
 )
-from ....utils import parse_init_data_payload
+from ....utils import get_request_init_data
 
 
 class ProjectListView(ListAPIView):
@@ -50,12 +51,10 @@ class ProjectListView(ListAPIView):
         raw_init_data = request.META.get("HTTP_X_MAX_INIT_DATA")
         if not raw_init_data:
             return Response({"detail": "X-Max-Init-Data header is required."}, status=status.HTTP_401_UNAUTHORIZED)
-        init_payload = parse_init_data_payload(raw_init_data)
-        user_payload = init_payload.get("user") or {}
-        user_id = user_payload.get("id")
+        user_id = get_request_init_data(request).user_id
         if not user_id:
             return Response({"detail": "Init data does not contain user id."}, status=status.HTTP_400_BAD_REQUEST)
-        user_profile = models.UserProfile.objects.filter(user_id=str(user_id)).first()
+        user_profile = get_request_profile(request)
         if not user_profile:
             return Response({"detail": "User profile not found."}, status=status.HTTP_404_NOT_FOUND)
         if user_profile.role not in {models.UserProfile.ROLE_STUDENT, models.UserProfile.ROLE_STAFF}:
@@ -1,10 +1,19 @@
-from copy import deepcopy
-from datetime import datetime, timezone as dt_timezone
-from typing import Optional
+import heapq
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponseForbidden, HttpResponseNotFound, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from django.utils.text import slugify
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views import View
 from rest_framework import status
 from rest_framework.generics import ListAPIView
 from rest_framework.exceptions import NotAuthenticated
@@ -12,6 +21,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .... import models
+from ....authentication import get_request_profile, resolve_profile
 from ....serializers import (
     AcademicCourseSerializer,
     ElectiveCourseSerializer,
@@ -22,7 +32,26 @@ from ....serializers import (
     TeacherFeedbackSerializer,
 )
 from ....utils.audit import write_audit_log
-from .careers import resolve_user_from_request
+from ....utils.elective_catalog import CATALOG_ORDERING, CURSOR_SALT, catalog_filters, render_catalog_page
+from ....utils.free_slots import find_common_free_slots
+from ....utils.ical import LESSON_FEED_FIELDS, iter_calendar
+from ....utils.keyset import KeysetPaginator
+from ....utils.lesson_series import feed_row, merge_by_start, series_lessons
+from ....utils.room_occupancy import find_free_rooms
+from ....utils.schedule_changes import CHANGES_CURSOR_SALT, CHANGES_ORDERING, changes_page, current_changes_cursor
+from ....utils.schedule_provider import ScheduleProviderUnavailable, get_schedule_source
+from ....utils.schedule_snapshots import get_week_payloads, whole_weeks
+from ....utils.schedule_store import ensure_teacher_stubs
+from ....utils.schedule_version import (
+    get_schedule_version,
+    make_etag,
+    not_modified,
+    request_etag_parts,
+    version_digest,
+    with_etag,
+)
+
+from .admissions import _invalid_page_params
 
 
 def _parse_date(value: str) -> Optional[datetime]:
@@ -35,7 +64,8 @@ def _parse_date(value: str) -> Optional[datetime]:
 class ScheduleMyView(APIView):
     """Персональное расписание пользователя.
 
-    В демо-режиме данные берём из условного API университета (фикстуры).
+    Данные берём из API университета (UNIVERSITY_SCHEDULE_PROVIDER = "http")
+    или, в демо-режиме, из фикстур.
     """
 
     def get(self, request):
@@ -45,16 +75,27 @@ class ScheduleMyView(APIView):
         if not date_from or not date_to:
             return Response({"detail": "from/to are required in YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
 
-        group_id = request.query_params.get("group_id") or request.user.academic_group_id
+        group_id = request.query_params.get("group_id") or getattr(request.user, "academic_group_id", None)
         if not group_id:
             return Response({"detail": "group_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        schedule = self._fetch_schedule_from_university(group_id=group_id, date_from=date_from, date_to=date_to)
+        source = get_schedule_source()
+        try:
+            version = source.version(group_id, date_from, date_to)
+            schedule_version = version_digest("my", group_id, version, request_etag_parts(request))
+            # generated_at меняется на каждый ответ, поэтому ETag слабый
+            etag = f'W/"{schedule_version}"'
+            cached = not_modified(request, etag)
+            if cached is not None:
+                return cached
+            schedule = self._fetch_schedule_from_university(group_id=group_id, date_from=date_from, date_to=date_to)
+        except ScheduleProviderUnavailable:
+            return Response({"detail": "schedule_unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         time_zone = params.get("tz")
         time_zone = time_zone or "UTC"
 
-        return Response(
+        response = Response(
             {
                 "range": {
                     "from": params.get("from"),
@@ -65,49 +106,18 @@ class ScheduleMyView(APIView):
                 "items": schedule,
                 "meta": {
                     "generated_at": timezone.now().isoformat(),
-                    "schedule_version": "v1",
-                    "source": "university_api",
+                    "schedule_version": schedule_version,
+                    "source": source.source,
                 },
             }
         )
+        return with_etag(response, etag)
 
     def _fetch_schedule_from_university(self, group_id: str, date_from: datetime, date_to: datetime):
-        fixtures = getattr(settings, "UNIVERSITY_SCHEDULE_FIXTURES", {})
-        group_schedule = fixtures.get(group_id, [])
-
-        items = []
-        for entry in group_schedule:
-            starts_at = datetime.fromisoformat(entry["starts_at"])
-            if not (date_from <= starts_at < date_to):
-                continue
-            copied = deepcopy(entry)
-            copied.setdefault("id", f"{group_id}-{starts_at.isoformat()}")
-            teacher = copied.get("teacher")
-            if isinstance(teacher, dict):
-                full_name = teacher.get("full_name") or "Неизвестный преподаватель"
-                teacher["full_name"] = full_name
-                teacher_id = teacher.get("id")
-                if not teacher_id:
-                    slug = slugify(full_name, allow_unicode=True) or "unknown"
-                    teacher_id = f"teacher-{slug}"
-                    teacher["id"] = teacher_id
-                self._ensure_teacher_stub(teacher_id, full_name)
-            items.append(copied)
-
-        items.sort(key=lambda item: item["starts_at"])
+        items = get_schedule_source().window(group_id, date_from, date_to)
+        ensure_teacher_stubs(items)
         return items
 
-    def _ensure_teacher_stub(self, teacher_id: str, full_name: str) -> None:
-        if not teacher_id:
-            return
-        models.Teacher.objects.get_or_create(
-            id=teacher_id,
-            defaults={
-                "full_name": full_name or "Неизвестный преподаватель",
-                "metadata": {"source": "schedule_fixture"},
-            },
-        )
-
 
 class ScheduleGroupView(APIView):
     """Расписание группы."""
@@ -119,28 +129,48 @@ class ScheduleGroupView(APIView):
         if not date_from or not date_to:
             return Response({"detail": "from/to are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = models.Lesson.objects.filter(
-            group_id=group_id,
-            starts_at__gte=date_from,
-            starts_at__lt=date_to,
-        ).select_related("teacher", "group", "room")
+        # Версия проверяется до запроса занятий: неизменное расписание отдаём 304.
+        # Правки группы, преподавателей и аудиторий тоже увеличивают версию (см. сигналы)
+        version = get_schedule_version(group_id)
+        etag = make_etag("group", group_id, version.version if version else 0, request_etag_parts(request))
+        cached = not_modified(request, etag)
+        if cached is not None:
+            return cached
 
         include_canceled = params.get("include_canceled", "false").lower() == "true"
-        if not include_canceled:
-            queryset = queryset.exclude(status=models.LESSON_STATUS_CANCELED)
-
         lesson_format = params.get("format")
-        if lesson_format:
-            queryset = queryset.filter(format=lesson_format)
-
         teacher_id = params.get("teacher_id")
-        if teacher_id:
-            queryset = queryset.filter(teacher_id=teacher_id)
 
-        queryset = queryset.order_by("starts_at")
-        serializer = LessonSerializer(queryset, many=True)
+        weeks = whole_weeks(date_from, date_to)
+        if weeks is not None:
+            items = self._items_from_snapshots(
+                group_id, weeks, version.version if version else 0, include_canceled, lesson_format, teacher_id
+            )
+        else:
+            queryset = models.Lesson.objects.filter(
+                group_id=group_id,
+                starts_at__gte=date_from,
+                starts_at__lt=date_to,
+            ).select_related("teacher", "group", "room")
+            if not include_canceled:
+                queryset = queryset.exclude(status=models.LESSON_STATUS_CANCELED)
+            if lesson_format:
+                queryset = queryset.filter(format=lesson_format)
+            if teacher_id:
+                queryset = queryset.filter(teacher_id=teacher_id)
+            series_filter = Q()
+            if lesson_format:
+                series_filter &= Q(format=lesson_format)
+            if teacher_id:
+                series_filter &= Q(teacher_id=teacher_id)
+            lessons = merge_by_start(
+                queryset,
+                series_lessons(date_from, date_to, group_id=group_id, extra=series_filter, select_related=True),
+            )
+            items = LessonSerializer(lessons, many=True).data
+
         group = models.AcademicGroup.objects.filter(id=group_id).first()
-        return Response(
+        response = Response(
             {
                 "group": {"id": group_id, "title": group.title if group else group_id},
                 "range": {
@@ -148,14 +178,358 @@ class ScheduleGroupView(APIView):
                     "to": params.get("to"),
                     "time_zone": params.get("tz") or "UTC",
                 },
-                "items": serializer.data,
+                "items": items,
                 "meta": {
-                    "generated_at": timezone.now().isoformat(),
-                    "schedule_version": "v1",
+                    "generated_at": version.changed_at.isoformat() if version else None,
+                    "schedule_version": str(version.version if version else 0),
                     "source": "schedule_core",
                 },
             }
         )
+        return with_etag(response, etag)
+
+    def _items_from_snapshots(self, group_id, weeks, schedule_version, include_canceled, lesson_format, teacher_id):
+        """Целые недели отдаём из снапшотов: выборка по первичному ключу без JOIN и сериализации."""
+        payloads = get_week_payloads(group_id, weeks, schedule_version)
+        items = []
+        for week in weeks:
+            for item in payloads.get(week, []):
+                if not include_canceled and item.get("status") == models.LESSON_STATUS_CANCELED:
+                    continue
+                if lesson_format and item.get("format") != lesson_format:
+                    continue
+                if teacher_id and (item.get("teacher") or {}).get("id") != teacher_id:
+                    continue
+                items.append(item)
+        return items
+
+
+FEED_TOKEN_SALT = "api.schedule-feed"
+# Номер поколения ссылок пользователя в UserProfile.metadata: увеличение отзывает все выданные ссылки
+FEED_TOKEN_VERSION_KEY = "ics_feed_version"
+
+
+def feed_token_version(profile: models.UserProfile) -> int:
+    try:
+        return int((profile.metadata or {}).get(FEED_TOKEN_VERSION_KEY) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def make_feed_token(kind: str, value: str, profile: models.UserProfile) -> str:
+    payload = {"kind": kind, "id": value, "user": profile.user_id, "v": feed_token_version(profile)}
+    return signing.dumps(payload, salt=FEED_TOKEN_SALT, compress=True)
+
+
+def read_feed_token(token: Optional[str], kind: str) -> Optional[Tuple[str, models.UserProfile]]:
+    """
+    Идентификатор из токена подписки и профиль, которому токен выдан.
+
+    Токен отклоняется, если он старше ICS_FEED_TOKEN_MAX_AGE или выдан
+    до отзыва ссылок пользователем.
+    """
+    if not token:
+        return None
+    try:
+        payload = signing.loads(token, salt=FEED_TOKEN_SALT, max_age=settings.ICS_FEED_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if not isinstance(payload, dict) or payload.get("kind") != kind or not payload.get("id"):
+        return None
+    profile = resolve_profile(str(payload.get("user") or ""))
+    if profile is None or payload.get("v") != feed_token_version(profile):
+        return None
+    return payload["id"], profile
+
+
+class ScheduleFeedLinksView(APIView):
+    """
+    Ссылки на iCalendar-подписки для текущего пользователя.
+
+    POST отзывает все выданные ранее ссылки и возвращает новые.
+    """
+
+    def get(self, request):
+        user = get_request_profile(request)
+        if not user:
+            return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(self._links(request, user))
+
+    def post(self, request):
+        user = get_request_profile(request)
+        if not user:
+            return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
+        with transaction.atomic():
+            profile = models.UserProfile.objects.select_for_update().get(pk=user.pk)
+            profile.metadata = {**(profile.metadata or {}), FEED_TOKEN_VERSION_KEY: feed_token_version(profile) + 1}
+            profile.save(update_fields=["metadata", "updated_at"])
+        write_audit_log(
+            user=profile,
+            action="schedule_feeds_revoke",
+            resource=f"UserProfile:{profile.id}",
+            request_id=request.headers.get("X-Request-Id"),
+            metadata={"version": profile.metadata[FEED_TOKEN_VERSION_KEY]},
+            ip_address=request.META.get("REMOTE_ADDR"),
+            user_agent=request.META.get("HTTP_USER_AGENT"),
+        )
+        return Response(self._links(request, profile))
+
+    def _links(self, request, user: models.UserProfile) -> dict:
+        my_url = reverse("schedule-my-ics")
+        links = {"my": request.build_absolute_uri(f"{my_url}?token={make_feed_token('user', user.user_id, user)}")}
+        group_id = request.query_params.get("group_id") or user.academic_group_id
+        if group_id:
+            group_url = reverse("schedule-group-ics", kwargs={"group_id": group_id})
+            token = make_feed_token("group", group_id, user)
+            links["group"] = request.build_absolute_uri(f"{group_url}?token={token}")
+        return links
+
+
+class _LessonFeedView(View):
+    """
+    Потоковая выдача занятий группы в формате iCalendar.
+
+    Строки читаются курсором пачками по ICS_FEED_CHUNK_SIZE и сразу
+    превращаются в VEVENT, без сериализатора и без сборки всего семестра
+    в памяти. ETag/Last-Modified берутся из версии расписания группы.
+    """
+
+    def feed_response(self, request, group_id: str, name: str):
+        version = get_schedule_version(group_id)
+        today = timezone.now().date()
+        window_from = datetime.combine(today - timedelta(days=settings.ICS_FEED_PAST_DAYS), time.min, dt_timezone.utc)
+        window_to = datetime.combine(today + timedelta(days=settings.ICS_FEED_FUTURE_DAYS), time.min, dt_timezone.utc)
+
+        # Окно сдвигается раз в сутки, поэтому день входит и в ETag, и в Last-Modified
+        day_start = datetime.combine(today, time.min, dt_timezone.utc)
+        stamp = max(version.changed_at, day_start) if version else day_start
+        etag = make_etag("ics", group_id, version.version if version else 0, today.isoformat())
+        last_modified = int(stamp.timestamp())
+
+        cached = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if cached is not None:
+            cached["ETag"] = etag
+            return cached
+
+        rows = (
+            models.Lesson.objects.filter(group_id=group_id, starts_at__gte=window_from, starts_at__lt=window_to)
+            .order_by("starts_at")
+            .values(*LESSON_FEED_FIELDS)
+            .iterator(chunk_size=settings.ICS_FEED_CHUNK_SIZE)
+        )
+        # Занятия серий разворачиваются в памяти и вливаются в поток по времени начала
+        occurrences = series_lessons(window_from, window_to, group_id=group_id, select_related=True)
+        if occurrences:
+            rows = heapq.merge(rows, map(feed_row, occurrences), key=lambda row: row["starts_at"])
+        response = StreamingHttpResponse(
+            iter_calendar(rows, name=name, uid_domain=request.get_host().split(":")[0], stamp=stamp),
+            content_type="text/calendar; charset=utf-8",
+        )
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "private, no-cache"
+        response["Content-Disposition"] = f'inline; filename="{group_id}.ics"'
+        return response
+
+
+class ScheduleGroupFeedView(_LessonFeedView):
+    """Подписка на расписание группы: /schedule/groups/<id>.ics?token=..."""
+
+    def get(self, request, group_id: str):
+        granted = read_feed_token(request.GET.get("token"), "group")
+        if granted is None or granted[0] != group_id:
+            return HttpResponseForbidden("Invalid feed token.")
+        group = models.AcademicGroup.objects.filter(id=group_id).only("title").first()
+        return self.feed_response(request, group_id, group.title if group else group_id)
+
+
+class ScheduleMyFeedView(_LessonFeedView):
+    """Подписка на личное расписание: занятия академической группы пользователя."""
+
+    def get(self, request):
+        granted = read_feed_token(request.GET.get("token"), "user")
+        if granted is None:
+            return HttpResponseForbidden("Invalid feed token.")
+        profile = granted[1]
+        if not profile.academic_group_id:
+            return HttpResponseNotFound("Schedule not found.")
+        return self.feed_response(request, profile.academic_group_id, "Моё расписание")
+
+
+FREE_ROOMS_DEFAULT_DURATION = timedelta(minutes=90)
+FREE_ROOMS_MAX_DURATION = timedelta(days=1)
+
+
+def _parse_moment(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+class FreeClassroomsView(APIView):
+    """Свободные аудитории: /schedule/rooms/free?campus=&building=&from=&to=&min_capacity=.
+
+    По умолчанию — ближайшие полтора часа. Ответ строится по индексу
+    занятости в памяти, без запроса к таблице занятий.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        date_from = _parse_moment(params.get("from")) if params.get("from") else timezone.now()
+        if date_from is None:
+            return Response({"detail": "from must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+        date_to = _parse_moment(params.get("to")) if params.get("to") else date_from + FREE_ROOMS_DEFAULT_DURATION
+        if date_to is None or date_to <= date_from:
+            return Response({"detail": "to must be a datetime after from"}, status=status.HTTP_400_BAD_REQUEST)
+        if date_to - date_from > FREE_ROOMS_MAX_DURATION:
+            return Response({"detail": "window must not exceed one day"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            min_capacity = int(params.get("min_capacity") or 0)
+        except ValueError:
+            return Response({"detail": "min_capacity must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rooms = find_free_rooms(
+            date_from,
+            date_to,
+            campus_id=params.get("campus") or None,
+            building=params.get("building") or None,
+            min_capacity=min_capacity or None,
+        )
+        return Response(
+            {
+                "range": {"from": date_from.isoformat(), "to": date_to.isoformat()},
+                "items": [room.payload for room in rooms],
+            }
+        )
+
+
+def _list_param(request, name: str) -> List[str]:
+    """?group=a&group=b и ?group=a,b — одинаково."""
+    values = []
+    for raw in request.query_params.getlist(name):
+        values.extend(part.strip() for part in raw.split(",") if part.strip())
+    return list(dict.fromkeys(values))
+
+
+def _parse_clock(value: Optional[str], default: time) -> Optional[time]:
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except ValueError:
+        return None
+
+
+class ScheduleFreeSlotsView(APIView):
+    """Общие свободные окна групп и преподавателей.
+
+    /schedule/free-slots?group=...&teacher=...&from=YYYY-MM-DD&to=YYYY-MM-DD
+    &duration=90&day_start=08:00&day_end=21:00&weekdays=0,1,2,3,4,5&tz=Europe/Moscow
+    """
+
+    def get(self, request):
+        params = request.query_params
+        group_ids = _list_param(request, "group")
+        teacher_ids = _list_param(request, "teacher")
+        if not group_ids and not teacher_ids:
+            return Response({"detail": "group or teacher is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(group_ids) + len(teacher_ids) > settings.FREE_SLOTS_MAX_PARTICIPANTS:
+            return Response({"detail": "too_many_participants"}, status=status.HTTP_400_BAD_REQUEST)
+
+        date_from = _parse_date(params.get("from"))
+        if not date_from:
+            return Response({"detail": "from is required in YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        date_to = _parse_date(params.get("to")) if params.get("to") else date_from + timedelta(days=7)
+        if not date_to or date_to <= date_from:
+            return Response({"detail": "to must be a date after from"}, status=status.HTTP_400_BAD_REQUEST)
+        if (date_to - date_from).days > settings.FREE_SLOTS_MAX_DAYS:
+            return Response({"detail": "range_too_long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        day_start = _parse_clock(params.get("day_start"), time(8, 0))
+        day_end = _parse_clock(params.get("day_end"), time(21, 0))
+        if not day_start or not day_end or day_end <= day_start:
+            return Response({"detail": "day_start/day_end must be HH:MM"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            duration = int(params.get("duration") or 90)
+            limit = min(max(int(params.get("limit") or 50), 1), 200)
+            weekdays = {int(day) for day in _list_param(request, "weekdays")} or set(range(6))
+        except ValueError:
+            return Response({"detail": "duration/limit/weekdays must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 15 <= duration <= 12 * 60:
+            return Response({"detail": "duration must be between 15 and 720 minutes"}, status=status.HTTP_400_BAD_REQUEST)
+
+        tz_name = params.get("tz")
+        if not tz_name and group_ids:
+            tz_name = (
+                models.AcademicGroup.objects.filter(id=group_ids[0])
+                .values_list("schedule_time_zone", flat=True)
+                .first()
+            )
+        tz_name = tz_name or "Europe/Moscow"
+        try:
+            time_zone = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            return Response({"detail": "unknown time zone"}, status=status.HTTP_400_BAD_REQUEST)
+
+        windows = find_common_free_slots(
+            group_ids,
+            teacher_ids,
+            date_from,
+            date_to,
+            duration=timedelta(minutes=duration),
+            time_zone=time_zone,
+            day_start=day_start,
+            day_end=day_end,
+            weekdays=sorted(weekdays),
+            limit=limit,
+        )
+        return Response(
+            {
+                "range": {"from": params.get("from"), "to": date_to.date().isoformat(), "time_zone": tz_name},
+                "participants": {"groups": group_ids, "teachers": teacher_ids},
+                "items": [
+                    {
+                        "starts_at": starts_at.astimezone(time_zone).isoformat(),
+                        "ends_at": ends_at.astimezone(time_zone).isoformat(),
+                        "duration_minutes": int((ends_at - starts_at).total_seconds() // 60),
+                    }
+                    for starts_at, ends_at in windows
+                ],
+            }
+        )
+
+
+class ScheduleChangesView(APIView):
+    """Лента изменений расписания группы по курсору.
+
+    /schedule/changes?since=<cursor>&group_id=...&limit=100
+    Без since возвращается только текущий курсор — клиент запоминает его
+    и дальше запрашивает изменения после него. Курсор непрозрачный и идёт
+    в порядке фиксации событий; числовые курсоры прежних версий принимаются.
+    """
+
+    keyset = KeysetPaginator(CHANGES_ORDERING, salt=CHANGES_CURSOR_SALT, default_limit=100, max_limit=500)
+
+    def get(self, request):
+        params = request.query_params
+        group_id = params.get("group_id") or getattr(request.user, "academic_group_id", None)
+        if not group_id:
+            return Response({"detail": "group_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = self.keyset.limit(params)
+            if not params.get("since"):
+                cursor = current_changes_cursor(group_id)
+                return Response({"group": {"id": group_id}, "items": [], "cursor": cursor, "has_more": False})
+            rows, cursor, has_more = changes_page(group_id, params["since"], limit)
+        except ValueError:
+            return _invalid_page_params()
+        return Response({"group": {"id": group_id}, "items": rows, "cursor": cursor, "has_more": has_more})
 
 
 class TeacherFeedbackView(APIView):
@@ -172,7 +546,7 @@ class TeacherFeedbackView(APIView):
         if not course:
             return Response({"detail": "course_not_found"}, status=status.HTTP_404_NOT_FOUND)
 
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -203,43 +577,37 @@ class TeacherFeedbackView(APIView):
         return Response(TeacherFeedbackSerializer(feedback).data, status=status.HTTP_201_CREATED)
 
 
-class ElectiveCatalogView(ListAPIView):
-    serializer_class = ElectiveCourseSerializer
+class ElectiveCatalogView(APIView):
+    """Каталог элективов с keyset-пагинацией по (title, id).
 
-    def get_queryset(self):
-        params = self.request.query_params
-        queryset = models.AcademicCourse.objects.filter(kind=models.COURSE_KIND_ELECTIVE).order_by("title")
-        term = params.get("term")
-        if term:
-            queryset = queryset.filter(term=term)
-        department = params.get("department")
-        if department:
-            queryset = queryset.filter(department_id=department)
-        digital_faculty = params.get("digital_faculty")
-        if digital_faculty is not None:
-            queryset = queryset.filter(digital_faculty=digital_faculty.lower() == "true")
-        lesson_format = params.get("lesson_format")
-        if lesson_format:
-            queryset = queryset.filter(format__icontains=lesson_format)
-        language = params.get("language")
-        if language:
-            queryset = queryset.filter(language=language)
-        return queryset
+    /electives/catalog?term=...&department=...&limit=50&cursor=<next_cursor>
+    """
 
-    def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        response.data = {
-            "term": request.query_params.get("term"),
-            "items": response.data,
-        }
-        return response
+    keyset = KeysetPaginator(
+        CATALOG_ORDERING,
+        salt=CURSOR_SALT,
+        default_limit=50,
+        max_limit=settings.ELECTIVE_CATALOG_MAX_LIMIT,
+    )
+
+    def get(self, request):
+        try:
+            page = render_catalog_page(
+                catalog_filters(request.query_params),
+                request.query_params,
+                paginator=self.keyset,
+                serializer_class=ElectiveCourseSerializer,
+            )
+        except ValueError:
+            return _invalid_page_params()
+        return Response({"term": request.query_params.get("term"), **page})
 
 
 class ElectiveEnrollmentCreateView(APIView):
     """Создание записи на электив."""
 
     def post(self, request):
-        user = resolve_user_from_request(request)
+        user = get_request_profile(request)
         if not user:
             return Response({"detail": "authentication_required"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -250,16 +618,8 @@ class ElectiveEnrollmentCreateView(APIView):
         if not course:
             return Response({"detail": "course_not_found"}, status=status.HTTP_404_NOT_FOUND)
 
+        # Повторы по Idempotency-Key отдаёт IdempotencyMiddleware
         idempotency_key = request.headers.get("Idempotency-Key")
-        if idempotency_key:
-            existing = models.ElectiveEnrollment.objects.filter(
-                user=user,
-                course=course,
-                idempotency_key=idempotency_key,
-            ).first()
-            if existing:
-                return Response(ElectiveEnrollmentSerializer(existing).data, status=status.HTTP_200_OK)
-
         enrollment, created = models.ElectiveEnrollment.objects.get_or_create(
             user=user,
             course=course,
@@ -282,7 +642,7 @@ class ElectiveEnrollmentCreateView(APIView):
             action="elective_enroll",
             resource=f"Course:{course.id}",
             request_id=request.headers.get("X-Request-Id"),
-            idempotency_key=request.headers.get("Idempotency-Key"),
+            idempotency_key=idempotency_key,
             metadata={"enrollment_id": str(enrollment.id)},
             ip_address=request.META.get("REMOTE_ADDR"),
             user_agent=request.META.get("HTTP_USER_AGENT"),
@@ -294,11 +654,15 @@ class ElectiveEnrollmentListView(ListAPIView):
     serializer_class = ElectiveEnrollmentSerializer
 
     def get_queryset(self):
-        user = resolve_user_from_request(self.request)
+        user = get_request_profile(self.request)
         if not user:
             raise NotAuthenticated()
         term = self.request.query_params.get("term")
-        queryset = models.ElectiveEnrollment.objects.filter(user=user).select_related("course")
+        queryset = (
+            models.ElectiveEnrollment.objects.filter(user=user)
+            .select_related("course__department")
+            .prefetch_related("course__teachers", "course__rating_rollups")
+        )
         if term:
             queryset = queryset.filter(term=term)
         status_filter = self.request.query_params.get("status")
@@ -3,27 +3,19 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from api import models
+from api.authentication import get_request_profile
 from api.serializers import UserSettingsSerializer
-from api.utils import parse_init_data_payload
-
-from .auth import INIT_DATA_META_KEY
+from api.utils import get_request_init_data
 
 
 def _resolve_profile(request) -> models.UserProfile:
-    raw_init_data = request.META.get(INIT_DATA_META_KEY)
-
-    init_payload = parse_init_data_payload(raw_init_data)
-    user_payload = init_payload.get("user") or {}
+    profile = get_request_profile(request)
+    if profile is not None:
+        return profile
 
-    user_id = str(user_payload.get("id") or "")
-    if not user_id:
+    if not get_request_init_data(request).user_id:
         raise exceptions.ValidationError(detail="Unable to determine user id from init data.")
-
-    profile = models.UserProfile.objects.filter(user_id=user_id).first()
-    if profile is None:
-        raise exceptions.NotFound(detail="User profile not found.")
-
-    return profile
+    raise exceptions.NotFound(detail="User profile not found.")
 
 
 class UserSettingsView(APIView):
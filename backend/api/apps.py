@@ -4,3 +4,28 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.core.signals import setting_changed
+
+        from . import signals  # noqa: F401
+        from .utils.init_data import clear_init_data_cache
+        from .utils.keyring import get_key_ring, reset_key_ring
+        from .utils.room_occupancy import reset_room_occupancy
+        from .utils.schedule_provider import reset_schedule_source
+        from .utils.schedule_store import reset_schedule_store
+
+        def _on_setting_changed(setting, **kwargs):
+            if setting in {"BOT_TOKEN", "BOT_TOKENS_PREVIOUS"}:
+                reset_key_ring()
+                clear_init_data_cache()
+            if setting in {"UNIVERSITY_SCHEDULE_FIXTURES", "UNIVERSITY_SCHEDULE_FIXTURES_PATH"}:
+                reset_schedule_store()
+            if setting.startswith("UNIVERSITY_SCHEDULE_") or setting.startswith("SCHEDULE_CACHE_"):
+                reset_schedule_source()
+            if setting.startswith("ROOM_OCCUPANCY_"):
+                reset_room_occupancy()
+
+        setting_changed.connect(_on_setting_changed, weak=False, dispatch_uid="api.bot_key_ring")
+        # Секреты для проверки init_data вычисляем один раз при старте воркера
+        get_key_ring()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import copy
+from typing import Optional
+
+from django.conf import settings
+from rest_framework.authentication import BaseAuthentication
+
+from . import models
+from .utils.cache import TTLCache
+from .utils.init_data import get_request_init_data
+
+_profile_cache: TTLCache[models.UserProfile] = TTLCache(
+    maxsize=getattr(settings, "USER_PROFILE_CACHE_SIZE", 4096),
+    ttl=getattr(settings, "USER_PROFILE_CACHE_TTL", 30),
+)
+
+
+def resolve_profile(user_id: str) -> Optional[models.UserProfile]:
+    """
+    Найти UserProfile по идентификатору пользователя MAX.
+
+    Профили кэшируются в памяти воркера на короткое время и сбрасываются
+    сигналами post_save/post_delete. Каждый вызов получает собственную копию,
+    поэтому изменения в одном запросе не протекают в другие.
+    """
+    if not user_id:
+        return None
+
+    profile = _profile_cache.get(user_id)
+    if profile is None:
+        profile = models.UserProfile.objects.filter(user_id=user_id).first()
+        if profile is None:
+            return None
+        _profile_cache.set(user_id, profile)
+    return copy.deepcopy(profile)
+
+
+def forget_profile(user_id: str) -> None:
+    _profile_cache.pop(user_id)
+
+
+def clear_profile_cache() -> None:
+    _profile_cache.clear()
+
+
+def get_request_profile(request) -> Optional[models.UserProfile]:
+    """Профиль, определённый InitDataAuthentication для текущего запроса."""
+    user = getattr(request, "user", None)
+    if isinstance(user, models.UserProfile):
+        return user
+    return None
+
+
+class InitDataAuthentication(BaseAuthentication):
+    """
+    Аутентификация мини-приложения по X-Max-Init-Data.
+
+    Подпись уже проверена InitDataValidationMiddleware, здесь только
+    сопоставляем пользователя с UserProfile. DRF вызывает класс один раз
+    за запрос и запоминает результат в ``request.user``.
+    """
+
+    def authenticate(self, request):
+        init_data = get_request_init_data(request)
+        if not init_data.validated or not init_data.user_id:
+            return None
+
+        profile = resolve_profile(init_data.user_id)
+        if profile is None:
+            return None
+        return profile, init_data
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import models
+from api.utils.elective_allocation import allocate_term
+
+
+class Command(BaseCommand):
+    help = "Распределить заявки на элективы семестра по приоритетам и квотам (одним проходом)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--term", action="append", dest="terms", help="Семестр (можно несколько).")
+        parser.add_argument("--all-terms", action="store_true", help="Все семестры, где есть заявки pending.")
+        parser.add_argument("--seats-per-student", type=int, help="Сколько элективов может получить студент.")
+        parser.add_argument("--seed", default="", help="Соль жребия при равных приоритетах.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать результат.")
+
+    def handle(self, *args, **options) -> None:
+        terms = options["terms"] or []
+        if options["all_terms"]:
+            terms = sorted(
+                models.ElectiveEnrollment.objects.filter(status=models.ENROLLMENT_STATUS_PENDING)
+                .order_by()
+                .values_list("term", flat=True)
+                .distinct()
+            )
+        if not terms:
+            raise CommandError("Укажите --term или --all-terms.")
+
+        for term in terms:
+            result = allocate_term(
+                term,
+                seats_per_student=options["seats_per_student"],
+                seed=options["seed"],
+                dry_run=options["dry_run"],
+                batch_size=max(options["batch_size"], 1),
+            )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{term}: зачислено {result.enrolled}, в листе ожидания {result.waitlisted}, "
+                    f"отказано {result.rejected}"
+                    + (" (dry-run)" if options["dry_run"] else "")
+                )
+            )
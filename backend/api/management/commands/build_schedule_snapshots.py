@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import models
+from api.utils.schedule_snapshots import build_week_snapshots, week_of
+
+
+class Command(BaseCommand):
+    help = "Собрать недельные снапшоты расписания групп на ближайшие недели."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, default=2, help="Сколько недель, начиная с текущей.")
+        parser.add_argument("--group", action="append", dest="groups", help="Только указанные группы.")
+
+    def handle(self, *args, **options) -> None:
+        current = week_of(timezone.now())
+        weeks = [current + timedelta(days=7 * offset) for offset in range(max(options["weeks"], 1))]
+        group_ids = options["groups"] or list(models.AcademicGroup.objects.values_list("id", flat=True))
+
+        for group_id in group_ids:
+            build_week_snapshots(group_id, weeks)
+
+        # Снапшоты прошедших недель больше не запрашиваются
+        stale, _ = models.ScheduleWeekSnapshot.objects.filter(week_start__lt=current - timedelta(days=28)).delete()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Собрано снапшотов: {len(group_ids) * len(weeks)} ({len(group_ids)} групп), удалено устаревших: {stale}"
+            )
+        )
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.utils.audit_partitions import AuditPartitioningUnavailable, add_months, ensure_partition, month_start
+
+
+class Command(BaseCommand):
+    help = "Создать месячные партиции журнала аудита на ближайшие месяцы."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="Сколько месяцев вперёд подготовить.")
+
+    def handle(self, *args, **options) -> None:
+        current = month_start(timezone.now().date())
+        created = []
+        try:
+            for offset in range(max(options["months_ahead"], 0) + 1):
+                month = add_months(current, offset)
+                if ensure_partition(month):
+                    created.append(month)
+        except AuditPartitioningUnavailable as exc:
+            raise CommandError(str(exc)) from exc
+
+        if not created:
+            self.stdout.write("Все партиции уже существуют.")
+            return
+        months = ", ".join(f"{month:%Y-%m}" for month in created)
+        self.stdout.write(self.style.SUCCESS(f"Созданы партиции аудита: {months}"))
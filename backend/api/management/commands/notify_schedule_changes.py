@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.utils.schedule_changes import notify_pending, prune_changes
+
+
+class Command(BaseCommand):
+    help = "Разослать участникам групп накопленные изменения расписания (одно сообщение на пачку)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--no-prune", action="store_true", help="Не удалять старые разосланные события.")
+
+    def handle(self, *args, **options) -> None:
+        batch_size = max(options["batch_size"], 1)
+        total_changes = total_messages = 0
+        while True:
+            changes, messages = notify_pending(batch_size=batch_size)
+            if not changes:
+                break
+            total_changes += changes
+            total_messages += messages
+
+        pruned = 0
+        if not options["no_prune"]:
+            retention = timedelta(days=getattr(settings, "SCHEDULE_CHANGES_RETENTION_DAYS", 30))
+            pruned = prune_changes(timezone.now() - retention)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Событий: {total_changes}, сообщений: {total_messages}, удалено старых событий: {pruned}"
+            )
+        )
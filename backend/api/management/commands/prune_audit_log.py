@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.utils.audit_partitions import (
+    AuditPartitioningUnavailable,
+    add_months,
+    archive_partition,
+    drop_partition,
+    list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = "Удалить (и при необходимости заархивировать) партиции аудита старше срока хранения."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, required=True, help="Сколько последних месяцев хранить.")
+        parser.add_argument("--archive-dir", default=None, help="Каталог для архивов .jsonl.gz перед удалением.")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено.")
+
+    def handle(self, *args, **options) -> None:
+        keep_months = options["keep_months"]
+        if keep_months < 1:
+            raise CommandError("--keep-months должен быть не меньше 1.")
+
+        cutoff = add_months(month_start(timezone.now().date()), -(keep_months - 1))
+        try:
+            expired = [name for name, month in list_partitions() if month < cutoff]
+        except AuditPartitioningUnavailable as exc:
+            raise CommandError(str(exc)) from exc
+
+        if not expired:
+            self.stdout.write(f"Нет партиций старше {cutoff:%Y-%m}.")
+            return
+
+        archive_dir = Path(options["archive_dir"]) if options["archive_dir"] else None
+        for name in expired:
+            if options["dry_run"]:
+                self.stdout.write(f"[dry-run] {name} будет удалена.")
+                continue
+            if archive_dir is not None:
+                path, rows = archive_partition(name, archive_dir)
+                self.stdout.write(f"{name}: {rows} записей сохранено в {path}")
+            drop_partition(name)
+            self.stdout.write(self.style.SUCCESS(f"{name} удалена."))
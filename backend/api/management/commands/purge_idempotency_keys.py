@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from api.utils.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Удалить просроченные записи Idempotency-Key."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options) -> None:
+        deleted = purge_expired(batch_size=max(options["batch_size"], 1))
+        self.stdout.write(self.style.SUCCESS(f"Удалено просроченных ключей: {deleted}"))
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from api.utils.ratings import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Пересчитать агрегаты оценок преподавателей и курсов по принятым отзывам."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options) -> None:
+        total = rebuild_rollups(chunk_size=max(options["chunk_size"], 1))
+        self.stdout.write(self.style.SUCCESS(f"Агрегатов оценок: {total}"))
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import models
+from api.utils.audit import spool_path, read_spool
+
+
+class Command(BaseCommand):
+    help = "Переиграть записи аудита, отложенные в spool-файл во время недоступности БД."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="Путь к spool-файлу (по умолчанию AUDIT_LOG_SPOOL_PATH).")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        path = Path(options["path"]) if options["path"] else spool_path()
+        replaying = path.with_name(path.name + ".replaying")
+
+        # Незавершённый прошлый запуск переигрываем первым; новые записи воркеры
+        # продолжают дописывать в исходный файл.
+        if not replaying.exists():
+            if not path.exists():
+                self.stdout.write("Spool-файл пуст, переигрывать нечего.")
+                return
+            path.rename(replaying)
+
+        entries = read_spool(replaying)
+        if not entries:
+            replaying.unlink()
+            self.stdout.write("Spool-файл пуст, переигрывать нечего.")
+            return
+
+        # Пользователь мог быть удалён, пока запись лежала в spool
+        user_ids = {entry.user_id for entry in entries if entry.user_id}
+        existing_user_ids = {
+            str(pk) for pk in models.UserProfile.objects.filter(id__in=user_ids).values_list("id", flat=True)
+        }
+        for entry in entries:
+            if entry.user_id and str(entry.user_id) not in existing_user_ids:
+                entry.user_id = None
+
+        try:
+            with transaction.atomic():
+                # Идентификаторы записей стабильны, повторный запуск не создаёт дублей
+                models.AuditLogEntry.objects.bulk_create(
+                    entries,
+                    batch_size=options["batch_size"],
+                    ignore_conflicts=True,
+                )
+        except Exception as exc:
+            raise CommandError(f"Не удалось переиграть {replaying}: {exc}") from exc
+
+        replaying.unlink()
+        self.stdout.write(self.style.SUCCESS(f"Переиграно записей аудита: {len(entries)}"))
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import models
+from api.utils.lesson_sync import SyncResult, copy_sync_groups, sync_group
+from api.utils.schedule_conflicts import conflicts_for_lessons, log_conflicts
+from api.utils.schedule_provider import ScheduleProviderUnavailable, build_schedule_provider, week_start
+
+
+def _parse_day(value: str) -> datetime:
+    try:
+        return datetime.combine(datetime.strptime(value, "%Y-%m-%d").date(), time.min, dt_timezone.utc)
+    except ValueError as exc:
+        raise CommandError(f"Дата должна быть в формате YYYY-MM-DD: {value}") from exc
+
+
+class Command(BaseCommand):
+    help = "Синхронизировать занятия групп с API университета (только изменения, пачками)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--group", action="append", dest="groups", help="Идентификатор группы (можно несколько).")
+        parser.add_argument("--faculty", action="append", dest="faculties", help="Все группы факультета.")
+        parser.add_argument("--from", dest="date_from", help="Начало окна, YYYY-MM-DD (по умолчанию текущая неделя).")
+        parser.add_argument("--to", dest="date_to", help="Конец окна (не включая), YYYY-MM-DD.")
+        parser.add_argument("--weeks", type=int, default=2, help="Длина окна в неделях, если --to не задан.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--copy", action="store_true", help="Загрузка через COPY во временную таблицу (семестр целиком).")
+        parser.add_argument("--dry-run", action="store_true", help="Только посчитать изменения.")
+        parser.add_argument(
+            "--skip-conflicts",
+            action="store_true",
+            help="Не проверять пересечения аудиторий, преподавателей и групп у изменённых занятий.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        groups = models.AcademicGroup.objects.all()
+        if options["groups"] or options["faculties"]:
+            groups = groups.filter(id__in=options["groups"] or []) | groups.filter(
+                faculty_id__in=options["faculties"] or []
+            )
+        group_ids = sorted(groups.values_list("id", flat=True))
+        if not group_ids:
+            raise CommandError("Не найдено ни одной группы для синхронизации.")
+
+        if options["date_from"]:
+            date_from = _parse_day(options["date_from"])
+        else:
+            monday = week_start(timezone.now())
+            date_from = datetime.combine(monday, time.min, dt_timezone.utc)
+        date_to = _parse_day(options["date_to"]) if options["date_to"] else date_from + timedelta(weeks=options["weeks"])
+        if date_to <= date_from:
+            raise CommandError("--to должен быть позже --from.")
+
+        if options["copy"] and options["dry_run"]:
+            raise CommandError("--copy не поддерживает --dry-run.")
+
+        provider = build_schedule_provider()
+        try:
+            if options["copy"]:
+                total = copy_sync_groups(provider, group_ids, date_from, date_to)
+            else:
+                total = SyncResult()
+                for group_id in group_ids:
+                    result = sync_group(
+                        provider,
+                        group_id,
+                        date_from,
+                        date_to,
+                        batch_size=max(options["batch_size"], 1),
+                        dry_run=options["dry_run"],
+                    )
+                    total += result
+                    self.stdout.write(
+                        f"{group_id}: +{result.created} ~{result.updated} -{result.canceled} ={result.unchanged}"
+                    )
+        except ScheduleProviderUnavailable as exc:
+            raise CommandError(f"API расписания недоступно: {exc}") from exc
+
+        prefix = "[dry-run] " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Групп: {len(group_ids)}; создано {total.created}, обновлено {total.updated}, "
+                f"отменено {total.canceled}, без изменений {total.unchanged}"
+            )
+        )
+
+        if options["dry_run"] or options["skip_conflicts"] or not total.changed_ids:
+            return
+        conflicts = conflicts_for_lessons(total.changed_ids)
+        if not conflicts:
+            return
+        log_conflicts(conflicts)
+        self.stdout.write(self.style.WARNING(f"Пересечений в расписании: {len(conflicts)}"))
+        for conflict in conflicts[:20]:
+            self.stdout.write(f"  {conflict.describe()}")
@@ -2,39 +2,125 @@ from __future__ import annotations
 
 import logging
 
-from django.http import HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.urls import Resolver404, resolve
 
-from .utils.init_data import validate_init_data, get_tg_id_from_headers
+from .utils import idempotency
+from .utils.init_data import INIT_DATA_META_KEY, build_init_data_context, get_request_init_data
 
 logger = logging.getLogger(__name__)
 
-INIT_DATA_HEADER = "HTTP_X_MAX_INIT_DATA"
+INIT_DATA_HEADER = INIT_DATA_META_KEY
+
+# .ics-подписки открывают календарные приложения без init_data,
+# они проверяют подписанный токен в URL сами
+FEED_URL_NAMES = frozenset({"schedule-my-ics", "schedule-group-ics"})
+
+
+def is_feed_request(request) -> bool:
+    if not request.path.endswith(".ics"):
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return match.url_name in FEED_URL_NAMES
 
 
 class InitDataValidationMiddleware:
     """
     Middleware, которая валидирует заголовок X-Max-Init-Data для запросов мини-приложения.
 
-    Если заголовок отсутствует, запрос пропускается. Если подпись невалидна, возвращается 403.
+    Если заголовок отсутствует или подпись невалидна, возвращается 403.
+    Разобранный контекст доступен во вьюхах как ``request.init_data``.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.path.startswith("/admin"):
+        if request.path.startswith("/admin") or is_feed_request(request):
             return self.get_response(request)
 
         init_data = request.META.get(INIT_DATA_HEADER)
         if not init_data:
             return HttpResponseForbidden("Init data is required.")
-        if init_data and not validate_init_data(init_data):
+
+        context = build_init_data_context(init_data)
+        if not context.validated:
             logger.warning("Запрос отклонён: подпись init_data не прошла проверку.")
             return HttpResponseForbidden("Invalid init data signature.")
 
-        if init_data:
-            tg_id = get_tg_id_from_headers({"Data-check-string": init_data})
-            request.tg_id = tg_id
+        request.init_data = context
+        request.tg_id = context.tg_id
 
         return self.get_response(request)
 
+
+
+class IdempotencyMiddleware:
+    """
+    Повтор небезопасных запросов с заголовком Idempotency-Key.
+
+    Первый ответ (кроме 5xx) сохраняется в IdempotencyKeyRecord вместе с хэшем
+    запроса и отдаётся повторно без выполнения вьюхи. Тот же ключ с другим
+    телом запроса отклоняется с 422.
+    """
+
+    UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        raw_key = request.META.get(idempotency.IDEMPOTENCY_HEADER)
+        if not raw_key or request.method not in self.UNSAFE_METHODS or request.path.startswith("/admin"):
+            return self.get_response(request)
+        if len(raw_key) > idempotency.MAX_KEY_LENGTH:
+            return JsonResponse({"detail": "invalid_idempotency_key"}, status=400)
+
+        user_id = get_request_init_data(request).user_id
+        key = idempotency.record_key(user_id, raw_key)
+        scope = idempotency.request_scope(request.method, request.path)
+        request_hash = idempotency.request_hash(request.method, request.get_full_path(), request.body)
+
+        with idempotency.advisory_lock(key):
+            record = idempotency.find_record(key)
+            if record is not None:
+                if record.request_hash != request_hash:
+                    return JsonResponse({"detail": "idempotency_key_reused"}, status=422)
+                if (record.metadata or {}).get("empty_body"):
+                    response = HttpResponse(status=record.status_code or 204)
+                else:
+                    response = JsonResponse(record.response_payload, status=record.status_code or 200, safe=False)
+                response["Idempotent-Replayed"] = "true"
+                return response
+
+            response = self.get_response(request)
+            if response.status_code >= 500 or getattr(response, "streaming", False):
+                return response
+            metadata = {"user_id": user_id, "idempotency_key": raw_key}
+            if not response.content:
+                # Ответ без тела (например, 204 от DRF) повторяется тоже без тела
+                payload = {}
+                metadata["empty_body"] = True
+            elif "json" in response.get("Content-Type", ""):
+                try:
+                    payload = idempotency.decode_payload(response.content)
+                except ValueError:
+                    return response
+                if payload is None:
+                    # JSON null в поле response_payload не сохранить
+                    return response
+            else:
+                return response
+
+            idempotency.store_record(
+                key=key,
+                scope=scope,
+                request_hash_value=request_hash,
+                status_code=response.status_code,
+                payload=payload,
+                metadata=metadata,
+            )
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_userprofile_settings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlogentry',
+            name='performed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
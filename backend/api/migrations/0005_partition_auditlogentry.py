@@ -0,0 +1,98 @@
+from datetime import date, datetime, time, timezone as dt_timezone
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+TABLE = "api_auditlogentry"
+LEGACY = "api_auditlogentry_legacy"
+DEFAULT_PARTITION = "api_auditlogentry_default"
+MONTHS_AHEAD = 3
+
+
+def _add_months(value, months):
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+
+
+def partition_table(apps, schema_editor):
+    """Переложить аудит в таблицу, партиционированную по месяцам performed_at."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+    execute(f"ALTER INDEX {TABLE}_pkey RENAME TO {LEGACY}_pkey")
+    execute("DROP INDEX IF EXISTS api_auditlo_action_d0a658_idx")
+    execute("DROP INDEX IF EXISTS api_auditlo_request_d86805_idx")
+
+    # Ключ партиционирования обязан входить в первичный ключ
+    execute(
+        f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS) PARTITION BY RANGE (performed_at)"
+    )
+    execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, performed_at)")
+    execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk_api_userprofile_id "
+        "FOREIGN KEY (user_id) REFERENCES api_userprofile (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(f"CREATE INDEX {TABLE}_user_id_part_idx ON {TABLE} (user_id)")
+    execute(f"CREATE INDEX api_auditlo_action_d0a658_idx ON {TABLE} (action)")
+    execute(f"CREATE INDEX api_auditlo_request_d86805_idx ON {TABLE} (request_id)")
+    execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(performed_at) FROM {LEGACY}")
+        oldest = cursor.fetchone()[0]
+
+    today = date.today()
+    month = date(oldest.year, oldest.month, 1) if oldest else date(today.year, today.month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        execute(
+            f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+            params=[_bound(month), _bound(_add_months(month, 1))],
+        )
+        month = _add_months(month, 1)
+
+    execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY}")
+    execute(f"DROP TABLE {LEGACY}")
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {LEGACY}")
+    execute(f"ALTER INDEX {TABLE}_pkey RENAME TO {LEGACY}_pkey")
+    execute("DROP INDEX IF EXISTS api_auditlo_action_d0a658_idx")
+    execute("DROP INDEX IF EXISTS api_auditlo_request_d86805_idx")
+    execute(f"CREATE TABLE {TABLE} (LIKE {LEGACY} INCLUDING DEFAULTS)")
+    execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+    execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_user_id_fk_api_userprofile_id "
+        "FOREIGN KEY (user_id) REFERENCES api_userprofile (id) DEFERRABLE INITIALLY DEFERRED"
+    )
+    execute(f"CREATE INDEX {TABLE}_user_id_part_idx ON {TABLE} (user_id)")
+    execute(f"CREATE INDEX api_auditlo_action_d0a658_idx ON {TABLE} (action)")
+    execute(f"CREATE INDEX api_auditlo_request_d86805_idx ON {TABLE} (request_id)")
+    execute(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY}")
+    execute(f"DROP TABLE {LEGACY} CASCADE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_auditlogentry_performed_at_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['performed_at'], name='api_auditlo_perform_brin'),
+        ),
+    ]
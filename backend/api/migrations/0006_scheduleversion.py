@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:22
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_versions(apps, schema_editor):
+    Lesson = apps.get_model('api', 'Lesson')
+    ScheduleVersion = apps.get_model('api', 'ScheduleVersion')
+    rows = (
+        Lesson.objects.exclude(group_id=None)
+        .values('group_id')
+        .annotate(changed_at=Max('updated_at'))
+    )
+    ScheduleVersion.objects.bulk_create(
+        [ScheduleVersion(group_id=row['group_id'], version=1, changed_at=row['changed_at']) for row in rows],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_partition_auditlogentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleVersion',
+            fields=[
+                ('group_id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(backfill_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_scheduleversion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lesson',
+            name='api_lesson_group_i_f4593d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'starts_at'], name='api_lesson_group_starts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('status', 'canceled'), _negated=True), fields=['group', 'starts_at'], name='api_lesson_group_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['teacher', 'starts_at'], name='api_lesson_teacher_starts_idx'),
+        ),
+    ]
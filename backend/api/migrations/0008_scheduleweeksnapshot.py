@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_lesson_schedule_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleWeekSnapshot',
+            fields=[
+                ('id', models.CharField(max_length=120, primary_key=True, serialize=False)),
+                ('group_id', models.CharField(max_length=100)),
+                ('week_start', models.DateField()),
+                ('payload', models.JSONField(blank=True, default=list)),
+                ('schedule_version', models.PositiveBigIntegerField(default=0)),
+                ('built_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['week_start'], name='api_schedul_week_st_97e3f0_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:34
+
+import django.core.validators
+import django.db.models.deletion
+import django.db.models.fields.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_lesson_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonSeries',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('subject', models.CharField(max_length=255)),
+                ('lesson_type', models.CharField(choices=[('lecture', 'Lecture'), ('seminar', 'Seminar'), ('lab', 'Lab'), ('exam', 'Exam'), ('consultation', 'Consultation'), ('other', 'Other')], max_length=32)),
+                ('format', models.CharField(blank=True, choices=[('online', 'Online'), ('offline', 'Offline'), ('hybrid', 'Hybrid')], max_length=32)),
+                ('room_snapshot', models.JSONField(blank=True, default=dict)),
+                ('teacher_snapshot', models.JSONField(blank=True, default=dict)),
+                ('subgroup', models.JSONField(blank=True, default=dict)),
+                ('links', models.JSONField(blank=True, default=dict)),
+                ('notes', models.TextField(blank=True)),
+                ('starts_on', models.DateField()),
+                ('until', models.DateField()),
+                ('weekdays', models.JSONField(blank=True, default=list, help_text='Дни недели: 0 — понедельник, 6 — воскресенье.')),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, help_text='2 — через неделю (числитель/знаменатель).', validators=[django.core.validators.MinValueValidator(1)])),
+                ('start_time', models.TimeField()),
+                ('duration_minutes', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('time_zone', models.CharField(default='Europe/Moscow', max_length=64)),
+                ('exdates', models.JSONField(blank=True, default=list, help_text='Даты без занятия, YYYY-MM-DD.')),
+            ],
+            options={
+                'ordering': ['starts_on', 'start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(django.db.models.fields.json.KeyTextTransform('id', 'series'), name='api_lesson_series_idx'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lesson_series', to='api.academiccourse'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lesson_series', to='api.academicgroup'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='room',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lesson_series', to='api.classroom'),
+        ),
+        migrations.AddField(
+            model_name='lessonseries',
+            name='teacher',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lesson_series', to='api.teacher'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonseries',
+            index=models.Index(fields=['group', 'starts_on', 'until'], name='api_series_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonseries',
+            index=models.Index(fields=['teacher', 'starts_on', 'until'], name='api_series_teacher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonseries',
+            index=models.Index(fields=['updated_at'], name='api_series_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:37
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_lesson_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('group_id', models.CharField(max_length=100)),
+                ('lesson_id', models.CharField(max_length=100)),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('rescheduled', 'Rescheduled'), ('canceled', 'Canceled'), ('restored', 'Restored'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('series_updated', 'Series updated')], max_length=32)),
+                ('starts_at', models.DateTimeField(blank=True, null=True)),
+                ('previous_starts_at', models.DateTimeField(blank=True, null=True)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group_id', 'id'], name='api_schedchange_group_idx'), models.Index(fields=['changed_at'], name='api_schedchange_changed_idx'), models.Index(condition=models.Q(('notified_at__isnull', True)), fields=['id'], name='api_schedchange_pending_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduleNotification',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('change_ids', models.JSONField(blank=True, default=list)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=32)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_notifications', to='api.userprofile')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='api_schedul_status_f3de6e_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_schedule_changes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='academiccourse',
+            index=models.Index(fields=['kind', 'term', 'title', 'id'], name='api_course_catalog_idx'),
+        ),
+    ]
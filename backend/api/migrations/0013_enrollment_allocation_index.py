@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_course_catalog_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='electiveenrollment',
+            index=models.Index(fields=['term', 'status', 'course'], name='api_enroll_alloc_idx'),
+        ),
+    ]
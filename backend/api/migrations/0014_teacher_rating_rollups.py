@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_enrollment_allocation_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherRatingRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(blank=True, max_length=32)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_squares', models.PositiveIntegerField(default=0)),
+                ('tags', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_rollups', to='api.academiccourse')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_rollups', to='api.teacher')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('teacher', 'course', 'period'), name='api_rating_rollup_key')],
+            },
+        ),
+    ]
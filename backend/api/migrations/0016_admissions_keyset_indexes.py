@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_catalog_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='opendayevent',
+            index=models.Index(fields=['university', 'starts_at', 'id'], name='api_openday_univ_starts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['university', 'title', 'id'], name='api_program_univ_title_idx'),
+        ),
+    ]
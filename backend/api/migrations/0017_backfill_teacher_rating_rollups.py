@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:05
+
+from collections import Counter, defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    # Тот же агрегат, что и api.utils.ratings.rebuild_rollups: без него первый
+    # принятый отзыв создаёт агрегат с count=1 поверх рейтинга курса.
+    TeacherFeedback = apps.get_model('api', 'TeacherFeedback')
+    TeacherRatingRollup = apps.get_model('api', 'TeacherRatingRollup')
+    AcademicCourse = apps.get_model('api', 'AcademicCourse')
+    counted = TeacherFeedback.objects.filter(status='accepted', rating__isnull=False).order_by()
+    rows = counted.values('teacher_id', 'course_id', 'period').annotate(
+        total_count=Count('id'),
+        total_sum=Sum('rating'),
+        total_squares=Sum(F('rating') * F('rating')),
+    )
+    rollups = {
+        (row['teacher_id'], row['course_id'], row['period']): TeacherRatingRollup(
+            teacher_id=row['teacher_id'],
+            course_id=row['course_id'],
+            period=row['period'],
+            count=row['total_count'],
+            rating_sum=row['total_sum'],
+            rating_squares=row['total_squares'],
+        )
+        for row in rows
+    }
+    tags = defaultdict(Counter)
+    for teacher_id, course_id, period, values in counted.values_list(
+        'teacher_id', 'course_id', 'period', 'tags'
+    ).iterator(chunk_size=5000):
+        if isinstance(values, list):
+            tags[(teacher_id, course_id, period)].update(str(tag) for tag in values if tag)
+    for key, rollup in rollups.items():
+        rollup.tags = dict(tags.get(key, {}))
+
+    TeacherRatingRollup.objects.all().delete()
+    TeacherRatingRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+    AcademicCourse.objects.filter(id__in={key[1] for key in rollups}).update(updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_admissions_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_backfill_teacher_rating_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='schedulechange',
+            name='api_schedchange_group_idx',
+        ),
+        migrations.AddField(
+            model_name='schedulechange',
+            name='xact_id',
+            field=models.BigIntegerField(db_default=models.Func(function='pg_current_xact_id', output_field=models.BigIntegerField(), template='%(function)s()::text::bigint'), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='schedulechange',
+            index=models.Index(fields=['group_id', 'xact_id', 'id'], name='api_schedchange_group_idx'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 import uuid
 
+from django.contrib.postgres.indexes import BrinIndex
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.fields.json import KT
+from django.utils import timezone
 
 
 class TimeStampedModel(models.Model):
@@ -299,6 +302,8 @@ class Program(StringIDModel):
             models.Index(fields=["format"]),
             models.Index(fields=["has_budget"]),
             models.Index(fields=["university", "department"]),
+            # Каталог программ вуза: keyset-пагинация по (title, id)
+            models.Index(fields=["university", "title", "id"], name="api_program_univ_title_idx"),
         ]
 
     def __str__(self) -> str:
@@ -520,6 +525,10 @@ class OpenDayEvent(StringIDModel):
 
     class Meta:
         ordering = ["date", "starts_at"]
+        indexes = [
+            # Дни открытых дверей вуза: keyset-пагинация по (starts_at, id)
+            models.Index(fields=["university", "starts_at", "id"], name="api_openday_univ_starts_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title} ({self.date})"
@@ -675,6 +684,17 @@ class AdmissionsInquiry(UUIDModel):
         return f"{self.full_name} → {self.university_id}"
 
 
+class CatalogVersion(models.Model):
+    """Версия справочника каталога (программы, дни открытых дверей) для кэшей фасетов."""
+
+    name = models.CharField(primary_key=True, max_length=64)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
 # ---------------------------------------------------------------------------
 # Раздел «Расписание и учебный процесс»
 # ---------------------------------------------------------------------------
@@ -850,6 +870,8 @@ class AcademicCourse(StringIDModel):
             models.Index(fields=["kind"]),
             models.Index(fields=["term"]),
             models.Index(fields=["format"]),
+            # Каталог элективов: фильтр по семестру и keyset-пагинация по (title, id)
+            models.Index(fields=["kind", "term", "title", "id"], name="api_course_catalog_idx"),
         ]
 
     def __str__(self) -> str:
@@ -929,13 +951,219 @@ class Lesson(StringIDModel):
             models.Index(fields=["starts_at"]),
             models.Index(fields=["ends_at"]),
             models.Index(fields=["status"]),
-            models.Index(fields=["group"]),
+            # Расписание группы: диапазон по starts_at с сортировкой по нему же
+            models.Index(fields=["group", "starts_at"], name="api_lesson_group_starts_idx"),
+            models.Index(
+                fields=["group", "starts_at"],
+                condition=~models.Q(status=LESSON_STATUS_CANCELED),
+                name="api_lesson_group_active_idx",
+            ),
+            models.Index(fields=["teacher", "starts_at"], name="api_lesson_teacher_starts_idx"),
+            # Дозагрузка изменённых занятий в индекс занятости аудиторий
+            models.Index(fields=["updated_at"], name="api_lesson_updated_idx"),
+            # Исключения из серий: series = {"id": ..., "occurrence": "YYYY-MM-DD"}
+            models.Index(KT("series__id"), name="api_lesson_series_idx"),
         ]
 
     def __str__(self) -> str:
         return f"{self.subject} {self.starts_at}"
 
 
+class LessonSeries(StringIDModel):
+    """
+    Повторяющееся занятие: правило повторения вместо строки Lesson на каждую неделю.
+
+    Занятия серии разворачиваются на лету для запрошенного окна. Перенос или
+    отмена отдельного занятия хранится строкой Lesson с series = {"id": ...,
+    "occurrence": "YYYY-MM-DD"} (и replaces/cancel_info), праздники и прочие
+    пропуски без замены — датами в exdates.
+    """
+
+    course = models.ForeignKey(
+        AcademicCourse,
+        related_name="lesson_series",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    subject = models.CharField(max_length=255)
+    lesson_type = models.CharField(max_length=32, choices=LESSON_TYPE_CHOICES)
+    format = models.CharField(max_length=32, choices=COURSE_FORMAT_CHOICES, blank=True)
+    room = models.ForeignKey(
+        Classroom,
+        related_name="lesson_series",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    room_snapshot = models.JSONField(default=dict, blank=True)
+    teacher = models.ForeignKey(
+        Teacher,
+        related_name="lesson_series",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    teacher_snapshot = models.JSONField(default=dict, blank=True)
+    group = models.ForeignKey(
+        AcademicGroup,
+        related_name="lesson_series",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    subgroup = models.JSONField(default=dict, blank=True)
+    links = models.JSONField(default=dict, blank=True)
+    notes = models.TextField(blank=True)
+
+    starts_on = models.DateField()
+    until = models.DateField()
+    weekdays = models.JSONField(default=list, blank=True, help_text="Дни недели: 0 — понедельник, 6 — воскресенье.")
+    interval_weeks = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="2 — через неделю (числитель/знаменатель).",
+    )
+    start_time = models.TimeField()
+    duration_minutes = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
+    time_zone = models.CharField(max_length=64, default="Europe/Moscow")
+    exdates = models.JSONField(default=list, blank=True, help_text="Даты без занятия, YYYY-MM-DD.")
+
+    class Meta:
+        ordering = ["starts_on", "start_time"]
+        indexes = [
+            models.Index(fields=["group", "starts_on", "until"], name="api_series_group_idx"),
+            models.Index(fields=["teacher", "starts_on", "until"], name="api_series_teacher_idx"),
+            models.Index(fields=["updated_at"], name="api_series_updated_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} ({self.starts_on}–{self.until})"
+
+
+class ScheduleVersion(models.Model):
+    """Версия расписания группы: растёт при каждом изменении её занятий."""
+
+    group_id = models.CharField(primary_key=True, max_length=100)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self) -> str:
+        return f"{self.group_id}@{self.version}"
+
+
+class ScheduleWeekSnapshot(models.Model):
+    """Готовое сериализованное расписание группы на неделю (с понедельника, UTC)."""
+
+    id = models.CharField(primary_key=True, max_length=120)
+    group_id = models.CharField(max_length=100)
+    week_start = models.DateField()
+    payload = models.JSONField(default=list, blank=True)
+    schedule_version = models.PositiveBigIntegerField(default=0)
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["week_start"]),
+        ]
+
+    def __str__(self) -> str:
+        return self.id
+
+
+class ScheduleChange(models.Model):
+    """
+    Событие ленты изменений расписания.
+
+    id выдаются не в порядке фиксации: долгая синхронизация может
+    зафиксировать меньший id позже. Поэтому курсор /schedule/changes —
+    (xact_id, id), где xact_id — транзакция, записавшая событие.
+    """
+
+    KIND_CREATED = "created"
+    KIND_RESCHEDULED = "rescheduled"
+    KIND_CANCELED = "canceled"
+    KIND_RESTORED = "restored"
+    KIND_UPDATED = "updated"
+    KIND_DELETED = "deleted"
+    KIND_SERIES = "series_updated"
+
+    KIND_CHOICES = [
+        (KIND_CREATED, "Created"),
+        (KIND_RESCHEDULED, "Rescheduled"),
+        (KIND_CANCELED, "Canceled"),
+        (KIND_RESTORED, "Restored"),
+        (KIND_UPDATED, "Updated"),
+        (KIND_DELETED, "Deleted"),
+        (KIND_SERIES, "Series updated"),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    group_id = models.CharField(max_length=100)
+    lesson_id = models.CharField(max_length=100)
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    starts_at = models.DateTimeField(null=True, blank=True)
+    previous_starts_at = models.DateTimeField(null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    xact_id = models.BigIntegerField(
+        db_default=models.Func(
+            function="pg_current_xact_id",
+            template="%(function)s()::text::bigint",
+            output_field=models.BigIntegerField(),
+        ),
+        editable=False,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["group_id", "xact_id", "id"], name="api_schedchange_group_idx"),
+            models.Index(fields=["changed_at"], name="api_schedchange_changed_idx"),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(notified_at__isnull=True),
+                name="api_schedchange_pending_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.group_id}: {self.kind} {self.lesson_id}"
+
+
+class ScheduleNotification(UUIDModel):
+    """Сообщение пользователю об изменениях расписания — одно на пачку событий."""
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(
+        UserProfile,
+        related_name="schedule_notifications",
+        on_delete=models.CASCADE,
+    )
+    change_ids = models.JSONField(default=list, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.user_id}: {len(self.change_ids)} изменений"
+
+
 class TeacherFeedback(UUIDModel):
     """Отзыв о преподавателе."""
 
@@ -991,6 +1219,40 @@ class TeacherFeedback(UUIDModel):
         return f"{self.teacher_id}: {self.rating}"
 
 
+class TeacherRatingRollup(models.Model):
+    """
+    Агрегат принятых отзывов по (преподаватель, курс, период).
+
+    Хранит сумму и сумму квадратов оценок, поэтому среднее и разброс
+    считаются без чтения отзывов, а новый отзыв меняет одну строку.
+    """
+
+    teacher = models.ForeignKey(
+        Teacher,
+        related_name="rating_rollups",
+        on_delete=models.CASCADE,
+    )
+    course = models.ForeignKey(
+        AcademicCourse,
+        related_name="rating_rollups",
+        on_delete=models.CASCADE,
+    )
+    period = models.CharField(max_length=32, blank=True)
+    count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_squares = models.PositiveIntegerField(default=0)
+    tags = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["teacher", "course", "period"], name="api_rating_rollup_key"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.teacher_id}/{self.course_id}/{self.period}: {self.count}"
+
+
 ENROLLMENT_STATUS_ENROLLED = "enrolled"
 ENROLLMENT_STATUS_WAITLISTED = "waitlisted"
 ENROLLMENT_STATUS_REJECTED = "rejected"
@@ -1041,6 +1303,8 @@ class ElectiveEnrollment(UUIDModel):
         indexes = [
             models.Index(fields=["term"]),
             models.Index(fields=["status"]),
+            # Распределение: заявки семестра по статусу, занятые места курсов
+            models.Index(fields=["term", "status", "course"], name="api_enroll_alloc_idx"),
         ]
 
     def __str__(self) -> str:
@@ -2593,7 +2857,12 @@ class IdempotencyKeyRecord(UUIDModel):
 
 
 class AuditLogEntry(UUIDModel):
-    """Аудит действий пользователей/системы."""
+    """
+    Аудит действий пользователей/системы.
+
+    В PostgreSQL таблица партиционирована по месяцам performed_at
+    (см. миграцию 0005 и команды ensure_audit_partitions / prune_audit_log).
+    """
 
     user = models.ForeignKey(
         UserProfile,
@@ -2610,13 +2879,14 @@ class AuditLogEntry(UUIDModel):
     metadata = models.JSONField(default=dict, blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.CharField(max_length=255, blank=True)
-    performed_at = models.DateTimeField(auto_now_add=True)
+    performed_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ["-performed_at"]
         indexes = [
             models.Index(fields=["action"]),
             models.Index(fields=["request_id"]),
+            BrinIndex(fields=["performed_at"], name="api_auditlo_perform_brin"),
         ]
 
     def __str__(self) -> str:
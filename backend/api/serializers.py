@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
 from . import models
+from .utils.ratings import summarize, summarize_by_teacher
 
 
 # ---------------------------------------------------------------------------
@@ -612,7 +613,8 @@ class LessonSerializer(serializers.ModelSerializer):
 
 
 class AcademicCourseSerializer(serializers.ModelSerializer):
-    teachers = TeacherSerializer(many=True, read_only=True)
+    teachers = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
 
     class Meta:
         model = models.AcademicCourse
@@ -639,6 +641,20 @@ class AcademicCourseSerializer(serializers.ModelSerializer):
             "teachers",
         )
 
+    def get_teachers(self, obj):
+        # Агрегаты отзывов читаются из prefetch_related("rating_rollups"), если он есть
+        ratings = summarize_by_teacher(obj.rating_rollups.all())
+        return [
+            {**TeacherSerializer(teacher).data, "rating": ratings.get(teacher.id)}
+            for teacher in obj.teachers.all()
+        ]
+
+    def get_rating(self, obj):
+        summary = summarize(obj.rating_rollups.all())
+        if summary is None:
+            return obj.rating
+        return {**(obj.rating or {}), **summary}
+
 
 class TeacherFeedbackSerializer(serializers.ModelSerializer):
     teacher = TeacherSerializer(read_only=True)
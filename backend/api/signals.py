@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import models
+from .authentication import forget_profile
+from .utils.elective_catalog import touch_courses
+from .utils.facets import CATALOG_OPEN_DAYS, CATALOG_PROGRAMS, bump_catalog_versions
+from .utils.lesson_series import replaced_occurrence, series_weeks
+from .utils.ratings import apply_feedback_change, feedback_state
+from .utils.room_occupancy import lesson_changed, lesson_deleted, series_changed
+from .utils.schedule_changes import build_change, classify, record_changes, series_change, tracked_state
+from .utils.schedule_snapshots import invalidate_week_snapshots, week_of
+from .utils.schedule_store import forget_teacher
+from .utils.schedule_version import bump_schedule_versions, groups_using
+
+
+@receiver([post_save, post_delete], sender=models.UserProfile, dispatch_uid="api.forget_user_profile")
+def invalidate_user_profile_cache(sender, instance: models.UserProfile, **kwargs) -> None:
+    user_id = instance.user_id
+    forget_profile(user_id)
+    # Параллельный запрос мог закэшировать профиль до коммита — сбрасываем ещё раз
+    transaction.on_commit(lambda: forget_profile(user_id))
+
+
+@receiver(post_delete, sender=models.Teacher, dispatch_uid="api.forget_teacher_stub")
+def invalidate_known_teacher(sender, instance: models.Teacher, **kwargs) -> None:
+    forget_teacher(instance.id)
+
+
+@receiver(post_init, sender=models.Lesson, dispatch_uid="api.remember_lesson_group")
+def remember_lesson_group(sender, instance: models.Lesson, **kwargs) -> None:
+    # Через __dict__, чтобы не догружать отложенные (.only/.defer) поля
+    instance._loaded_group_id = instance.__dict__.get("group_id")
+    instance._loaded_starts_at = instance.__dict__.get("starts_at")
+
+
+@receiver([post_save, post_delete], sender=models.Lesson, dispatch_uid="api.bump_schedule_version")
+def bump_lesson_schedule_version(sender, instance: models.Lesson, **kwargs) -> None:
+    # Занятие могли перенести в другую группу или неделю — обновляем обе стороны
+    old_group_id = getattr(instance, "_loaded_group_id", None)
+    old_starts_at = getattr(instance, "_loaded_starts_at", None)
+    bump_schedule_versions([old_group_id, instance.group_id])
+
+    weeks = []
+    if old_group_id and old_starts_at:
+        weeks.append((old_group_id, week_of(old_starts_at)))
+    if instance.group_id and instance.starts_at:
+        weeks.append((instance.group_id, week_of(instance.starts_at)))
+    # Исключение из серии скрывает занятие серии в его исходную неделю
+    replaced = replaced_occurrence(instance.series)
+    if replaced and instance.group_id:
+        weeks.extend(series_weeks(instance.group_id, replaced[1], replaced[1]))
+    invalidate_week_snapshots(weeks)
+
+    instance._loaded_group_id = instance.group_id
+    instance._loaded_starts_at = instance.starts_at
+
+
+@receiver(post_save, sender=models.Lesson, dispatch_uid="api.update_room_occupancy")
+def update_room_occupancy(sender, instance: models.Lesson, **kwargs) -> None:
+    lesson_changed(instance)
+
+
+@receiver(post_delete, sender=models.Lesson, dispatch_uid="api.discard_room_occupancy")
+def discard_room_occupancy(sender, instance: models.Lesson, **kwargs) -> None:
+    lesson_deleted(instance.id)
+    if replaced_occurrence(instance.series):
+        # Занятие серии, которое заменяла строка, возвращается в расписание
+        series_changed()
+
+
+@receiver(post_save, sender=models.AcademicGroup, dispatch_uid="api.bump_group_schedule_version")
+def bump_group_schedule_version(sender, instance: models.AcademicGroup, **kwargs) -> None:
+    # Данные группы входят в ответ расписания и снапшоты недель
+    bump_schedule_versions([instance.id])
+
+
+@receiver(post_save, sender=models.Teacher, dispatch_uid="api.bump_teacher_schedule_versions")
+@receiver(pre_delete, sender=models.Teacher, dispatch_uid="api.bump_deleted_teacher_schedule_versions")
+def bump_teacher_schedule_versions(sender, instance: models.Teacher, created: bool = False, **kwargs) -> None:
+    if not created:
+        bump_schedule_versions(groups_using(teacher_id=instance.id))
+
+
+@receiver(post_save, sender=models.Classroom, dispatch_uid="api.bump_room_schedule_versions")
+@receiver(pre_delete, sender=models.Classroom, dispatch_uid="api.bump_deleted_room_schedule_versions")
+def bump_room_schedule_versions(sender, instance: models.Classroom, created: bool = False, **kwargs) -> None:
+    if not created:
+        bump_schedule_versions(groups_using(room_id=instance.id))
+
+
+@receiver(post_init, sender=models.LessonSeries, dispatch_uid="api.remember_series_span")
+def remember_series_span(sender, instance: models.LessonSeries, **kwargs) -> None:
+    instance._loaded_span = (
+        instance.__dict__.get("group_id"),
+        instance.__dict__.get("starts_on"),
+        instance.__dict__.get("until"),
+    )
+
+
+@receiver([post_save, post_delete], sender=models.LessonSeries, dispatch_uid="api.expand_series_changes")
+def invalidate_series_schedule(sender, instance: models.LessonSeries, **kwargs) -> None:
+    """Изменение серии — одна строка, но затрагивает все недели семестра."""
+    old_group_id, old_starts_on, old_until = getattr(instance, "_loaded_span", (None,) * 3)
+    bump_schedule_versions([old_group_id, instance.group_id])
+    weeks = series_weeks(old_group_id, old_starts_on, old_until)
+    weeks |= series_weeks(instance.group_id, instance.starts_on, instance.until)
+    invalidate_week_snapshots(weeks)
+    series_changed()
+    if kwargs.get("signal") is post_delete or not kwargs.get("created"):
+        record_changes([series_change(instance, deleted=kwargs.get("signal") is post_delete)])
+
+    instance._loaded_span = (instance.group_id, instance.starts_on, instance.until)
+
+
+@receiver(post_init, sender=models.Lesson, dispatch_uid="api.remember_lesson_state")
+def remember_lesson_state(sender, instance: models.Lesson, **kwargs) -> None:
+    instance._loaded_state = tracked_state(instance.__dict__)
+
+
+@receiver(post_save, sender=models.Lesson, dispatch_uid="api.record_lesson_change")
+def record_lesson_change(sender, instance: models.Lesson, created: bool, **kwargs) -> None:
+    old = None if created else getattr(instance, "_loaded_state", None)
+    new = tracked_state(instance.__dict__)
+    record_changes([build_change(classify(old, new), instance.id, instance.group_id, new, old)])
+    instance._loaded_state = new
+
+
+@receiver(post_delete, sender=models.Lesson, dispatch_uid="api.record_lesson_deletion")
+def record_lesson_deletion(sender, instance: models.Lesson, **kwargs) -> None:
+    state = tracked_state(instance.__dict__)
+    record_changes([build_change(models.ScheduleChange.KIND_DELETED, instance.id, instance.group_id, state)])
+
+
+@receiver(m2m_changed, sender=models.AcademicCourse.teachers.through, dispatch_uid="api.touch_course_teachers")
+def touch_course_teachers(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    # Каталог элективов версионируется по updated_at курсов
+    if action not in {"post_add", "post_remove", "pre_clear"}:
+        return
+    if not reverse:
+        touch_courses(models.AcademicCourse.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch_courses(models.AcademicCourse.objects.filter(pk__in=pk_set))
+    else:
+        touch_courses(models.AcademicCourse.objects.filter(teachers=instance))
+
+
+@receiver(post_save, sender=models.Teacher, dispatch_uid="api.touch_teacher_courses")
+@receiver(pre_delete, sender=models.Teacher, dispatch_uid="api.touch_deleted_teacher_courses")
+def touch_teacher_courses(sender, instance: models.Teacher, **kwargs) -> None:
+    touch_courses(models.AcademicCourse.objects.filter(teachers=instance))
+
+
+@receiver(post_save, sender=models.Department, dispatch_uid="api.touch_department_courses")
+@receiver(pre_delete, sender=models.Department, dispatch_uid="api.touch_deleted_department_courses")
+def touch_department_courses(sender, instance: models.Department, **kwargs) -> None:
+    touch_courses(models.AcademicCourse.objects.filter(department=instance))
+
+
+@receiver(post_init, sender=models.TeacherFeedback, dispatch_uid="api.remember_feedback_rating")
+def remember_feedback_rating(sender, instance: models.TeacherFeedback, **kwargs) -> None:
+    instance._loaded_rating = feedback_state(instance.__dict__)
+
+
+@receiver([post_save, post_delete], sender=models.TeacherFeedback, dispatch_uid="api.update_rating_rollups")
+def update_rating_rollups(sender, instance: models.TeacherFeedback, **kwargs) -> None:
+    # Модерация, правка и удаление отзыва меняют агрегат на разницу вкладов
+    old = None if kwargs.get("created") else getattr(instance, "_loaded_rating", None)
+    new = None if kwargs.get("signal") is post_delete else feedback_state(instance.__dict__)
+    apply_feedback_change(old, new)
+    instance._loaded_rating = new
+
+
+@receiver([post_save, post_delete], sender=models.Program, dispatch_uid="api.bump_program_facets")
+@receiver([post_save, post_delete], sender=models.Department, dispatch_uid="api.bump_department_facets")
+def bump_program_catalog(sender, instance, **kwargs) -> None:
+    bump_catalog_versions([CATALOG_PROGRAMS])
+
+
+@receiver([post_save, post_delete], sender=models.OpenDayEvent, dispatch_uid="api.bump_open_day_facets")
+def bump_open_day_catalog(sender, instance: models.OpenDayEvent, update_fields=None, **kwargs) -> None:
+    # Запись на день открытых дверей меняет только remaining — на фасеты это не влияет
+    if update_fields and set(update_fields) <= {"remaining", "updated_at"}:
+        return
+    bump_catalog_versions([CATALOG_OPEN_DAYS])
+
+
+@receiver(m2m_changed, sender=models.OpenDayEvent.programs.through, dispatch_uid="api.bump_open_day_programs")
+def bump_open_day_programs(sender, action: str, **kwargs) -> None:
+    if action in {"post_add", "post_remove", "post_clear"}:
+        bump_catalog_versions([CATALOG_OPEN_DAYS])
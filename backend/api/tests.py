@@ -1,3 +1,1878 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, time as clock, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import parse_qs, urlencode, urlparse
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.http import HttpResponse, JsonResponse
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.db.models.lookups import In
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from . import models
+from .api.v1.views.auth import INIT_PAYLOAD_FINGERPRINT_KEY, AuthMeView
+from .api.v1.views.schedule import (
+    FEED_TOKEN_VERSION_KEY,
+    ElectiveCatalogView,
+    ScheduleGroupView,
+    ScheduleMyView,
+    make_feed_token,
+    read_feed_token,
+)
+from .authentication import InitDataAuthentication, clear_profile_cache, forget_profile, resolve_profile
+from .middleware import IdempotencyMiddleware, InitDataValidationMiddleware
+from .utils.audit import AuditLogBuffer, read_spool, spill_to_spool
+from .utils.audit_partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    ensure_partition,
+    is_partitioned,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+from .utils.elective_allocation import allocate, course_capacity, lottery_key
+from .utils.elective_catalog import catalog_filters, render_catalog_page
+from .utils.facets import PROGRAM_FILTER_PARAMS, program_queryset, request_filters
+from .utils.ical import CRLF, escape_text, fold_line, render_event
+from .utils.idempotency import MAX_SCOPE_LENGTH, request_scope
+from .utils.free_slots import SLOT, allowed_mask, busy_mask, clear_busy_cache, iter_runs, week_busy_masks
+from .utils.init_data import (
+    EMPTY_INIT_DATA_CONTEXT,
+    INIT_DATA_META_KEY,
+    build_init_data_context,
+    clear_init_data_cache,
+    get_request_init_data,
+)
+from .utils.keyring import BotTokenKeyRing, derive_secret_key, get_key_ring, reset_key_ring
+from .utils.keyset import InvalidCursor, KeysetPaginator, after, decode_cursor, encode_cursor
+from .utils.lesson_sync import REMOVED_REASON, _changed, fetch_remote_lessons, sync_group
+from .utils.lesson_series import occurrence, occurrence_days, replacement_rows, series_weeks
+from .utils.ratings import feedback_state, summarize, summarize_by_teacher
+from .utils.room_occupancy import LiveRoomOccupancy, RoomInfo, RoomOccupancyIndex, find_free_rooms
+from .utils.schedule_changes import (
+    CHANGES_CURSOR_SALT,
+    build_change,
+    changes_page,
+    classify,
+    current_changes_cursor,
+    render_message,
+    wants_schedule_notifications,
+)
+from .utils.schedule_conflicts import (
+    KIND_GROUP,
+    KIND_ROOM,
+    KIND_TEACHER,
+    LessonIntervals,
+    conflicts_for_lessons,
+    detect_conflicts,
+    room_key,
+)
+from .utils.schedule_provider import (
+    CachedScheduleSource,
+    CircuitBreaker,
+    HttpScheduleProvider,
+    ScheduleProvider,
+    ScheduleProviderUnavailable,
+    StaleWhileRevalidateCache,
+    week_window,
+    weeks_between,
+)
+from .utils.schedule_snapshots import get_week_payloads, snapshot_id
+from .utils.schedule_store import (
+    UNKNOWN_TEACHER,
+    build_group_schedule,
+    clear_known_teachers,
+    ensure_teacher_stubs,
+    forget_teacher,
+)
+
+WEEK = date(2024, 4, 1)
+
+
+def sign_init_data(bot_token: str, **fields) -> str:
+    """init_data, подписанный как это делает клиент мини-приложения."""
+    data_check_string = "\n".join(f"{key}={value}" for key, value in sorted(fields.items()))
+    digest = hmac.new(derive_secret_key(bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": digest})
+
+
+@override_settings(BOT_TOKEN="current-token", BOT_TOKENS_PREVIOUS=[])
+class InitDataContextTests(SimpleTestCase):
+    def setUp(self):
+        reset_key_ring()
+        clear_init_data_cache()
+        self.addCleanup(reset_key_ring)
+        self.addCleanup(clear_init_data_cache)
+        self.init_data = sign_init_data("current-token", auth_date="1700000000", user=json.dumps({"id": 42}))
+
+    def test_valid_context_is_parsed(self):
+        context = build_init_data_context(self.init_data)
+
+        self.assertTrue(context.validated)
+        self.assertEqual(context.tg_id, 42)
+        self.assertEqual(context.user_id, "42")
+        self.assertEqual(context.payload["user"], {"id": 42})
+
+    def test_valid_context_is_cached(self):
+        first = build_init_data_context(self.init_data)
+        with mock.patch("api.utils.init_data.validate_init_data") as validate:
+            second = build_init_data_context(self.init_data)
+
+        validate.assert_not_called()
+        self.assertIs(second, first)
+
+    def test_invalid_init_data_is_not_cached(self):
+        forged = self.init_data.replace("hash=", "hash=00")
+
+        self.assertIs(build_init_data_context(forged), EMPTY_INIT_DATA_CONTEXT)
+        with mock.patch("api.utils.init_data.validate_init_data", return_value=False) as validate:
+            self.assertIs(build_init_data_context(forged), EMPTY_INIT_DATA_CONTEXT)
+        validate.assert_called_once_with(forged)
+        self.assertIs(build_init_data_context(""), EMPTY_INIT_DATA_CONTEXT)
+
+    def test_request_context_is_built_once(self):
+        request = RequestFactory().get("/", **{INIT_DATA_META_KEY: self.init_data})
+
+        context = get_request_init_data(request)
+
+        self.assertIs(request.init_data, context)
+        self.assertIs(get_request_init_data(request), context)
+
+
+@override_settings(BOT_TOKEN="current-token", BOT_TOKENS_PREVIOUS=[])
+class ProfileCacheTests(SimpleTestCase):
+    def setUp(self):
+        for reset in (clear_profile_cache, reset_key_ring, clear_init_data_cache):
+            reset()
+            self.addCleanup(reset)
+
+    def _profiles(self, profile):
+        lookup = mock.patch.object(models.UserProfile.objects, "filter")
+        filter_ = lookup.start()
+        self.addCleanup(lookup.stop)
+        filter_.return_value.first.return_value = profile
+        return filter_
+
+    def test_profile_is_cached_and_copied(self):
+        lookup = self._profiles(models.UserProfile(user_id="42", metadata={"theme": "dark"}))
+
+        first = resolve_profile("42")
+        first.metadata["theme"] = "light"
+        second = resolve_profile("42")
+
+        lookup.assert_called_once_with(user_id="42")
+        self.assertIsNot(second, first)
+        self.assertEqual(second.metadata, {"theme": "dark"})
+
+    def test_missing_profile_is_not_cached(self):
+        lookup = self._profiles(None)
+
+        self.assertIsNone(resolve_profile("42"))
+        self.assertIsNone(resolve_profile("42"))
+        self.assertIsNone(resolve_profile(""))
+
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_forgotten_profile_is_read_again(self):
+        lookup = self._profiles(models.UserProfile(user_id="42"))
+        resolve_profile("42")
+
+        forget_profile("42")
+        resolve_profile("42")
+
+        self.assertEqual(lookup.call_count, 2)
+
+    def test_authentication_uses_validated_init_data(self):
+        self._profiles(models.UserProfile(user_id="42"))
+        init_data = sign_init_data("current-token", auth_date="1700000000", user=json.dumps({"id": 42}))
+        signed = RequestFactory().get("/", **{INIT_DATA_META_KEY: init_data})
+        forged = RequestFactory().get("/", **{INIT_DATA_META_KEY: init_data.replace("hash=", "hash=00")})
+
+        profile, context = InitDataAuthentication().authenticate(signed)
+
+        self.assertEqual(profile.user_id, "42")
+        self.assertIs(context, signed.init_data)
+        self.assertIsNone(InitDataAuthentication().authenticate(forged))
+
+
+@skipUnless(connection.vendor == "postgresql", "сигналы профиля проверяются на схеме PostgreSQL")
+class ProfileCacheInvalidationTests(TestCase):
+    def setUp(self):
+        clear_profile_cache()
+        self.addCleanup(clear_profile_cache)
+        self.profile = models.UserProfile.objects.create(user_id="42", metadata={"theme": "dark"})
+
+    def test_save_and_delete_drop_cached_profile(self):
+        resolve_profile("42")
+        models.UserProfile.objects.filter(user_id="42").update(metadata={"theme": "light"})
+        self.assertEqual(resolve_profile("42").metadata, {"theme": "dark"})
+
+        self.profile.save()
+        self.assertEqual(resolve_profile("42").metadata, {"theme": "light"})
+
+        self.profile.delete()
+        self.assertIsNone(resolve_profile("42"))
+
+    def test_profile_cached_before_commit_is_dropped_after_commit(self):
+        stale = mock.Mock()
+        stale.first.return_value = models.UserProfile(user_id="42", metadata={"theme": "dark"})
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.profile.metadata = {"theme": "light"}
+            self.profile.save()
+            # Параллельный запрос успел закэшировать старую строку до коммита
+            with mock.patch.object(models.UserProfile.objects, "filter", return_value=stale):
+                self.assertEqual(resolve_profile("42").metadata, {"theme": "dark"})
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(resolve_profile("42").metadata, {"theme": "light"})
+
+
+@override_settings(BOT_TOKEN="current-token", BOT_TOKENS_PREVIOUS=[])
+class AuthMeViewTests(SimpleTestCase):
+    def setUp(self):
+        for reset in (reset_key_ring, clear_init_data_cache):
+            reset()
+            self.addCleanup(reset)
+
+    def _me(self, auth_date="1700000000", **user):
+        user = {"id": 42, "first_name": "Анна", **user}
+        init_data = sign_init_data("current-token", auth_date=auth_date, user=json.dumps(user))
+        request = RequestFactory().get("/api/v1/auth/me", **{INIT_DATA_META_KEY: init_data})
+        return AuthMeView.as_view()(request)
+
+    def test_unchanged_init_data_is_not_written(self):
+        profile = models.UserProfile(user_id="42", metadata={})
+        with mock.patch("api.api.v1.views.auth.resolve_profile", side_effect=lambda _: profile), mock.patch.object(
+            models.UserProfile, "save"
+        ) as save:
+            self._me()
+            fingerprint = profile.metadata[INIT_PAYLOAD_FINGERPRINT_KEY]
+            # Новое открытие мини-приложения: меняются только auth_date и hash
+            response = self._me(auth_date="1700000600")
+            renamed = self._me(first_name="Анна-Мария")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"]["user_id"], "42")
+        self.assertEqual(save.call_count, 2)
+        save.assert_called_with(update_fields=["metadata", "updated_at"])
+        self.assertNotEqual(profile.metadata[INIT_PAYLOAD_FINGERPRINT_KEY], fingerprint)
+        self.assertEqual(renamed.status_code, 200)
+
+    def test_first_login_inserts_ignoring_conflicts_and_rereads(self):
+        winner = models.UserProfile(user_id="42", full_name="Из параллельного запроса")
+        with mock.patch("api.api.v1.views.auth.resolve_profile", return_value=None), mock.patch.object(
+            models.UserProfile.objects, "bulk_create"
+        ) as bulk_create, mock.patch.object(models.UserProfile.objects, "get", return_value=winner) as get:
+            response = self._me()
+
+        created = bulk_create.call_args.args[0][0]
+        self.assertEqual(bulk_create.call_args.kwargs, {"ignore_conflicts": True})
+        self.assertEqual((created.user_id, created.full_name), ("42", "Анна"))
+        self.assertIn(INIT_PAYLOAD_FINGERPRINT_KEY, created.metadata)
+        get.assert_called_once_with(user_id="42")
+        self.assertEqual(response.data["user"]["full_name"], "Из параллельного запроса")
+
+    def test_missing_user_id_is_rejected(self):
+        request = RequestFactory().get("/api/v1/auth/me")
+
+        self.assertEqual(AuthMeView.as_view()(request).status_code, 400)
+
+
+@skipUnless(connection.vendor == "postgresql", "вставка с ON CONFLICT проверяется на PostgreSQL")
+@override_settings(BOT_TOKEN="current-token", BOT_TOKENS_PREVIOUS=[])
+class AuthMeFirstLoginTests(TestCase):
+    def setUp(self):
+        for reset in (reset_key_ring, clear_init_data_cache, clear_profile_cache):
+            reset()
+            self.addCleanup(reset)
+
+    def test_profile_created_concurrently_is_reused(self):
+        existing = models.UserProfile.objects.create(user_id="42", full_name="Первый запрос")
+        init_data = sign_init_data("current-token", auth_date="1700000000", user=json.dumps({"id": 42}))
+        request = RequestFactory().get("/api/v1/auth/me", **{INIT_DATA_META_KEY: init_data})
+
+        # Второй запрос не увидел профиль при чтении и пытается вставить свой
+        with mock.patch("api.api.v1.views.auth.resolve_profile", return_value=None):
+            response = AuthMeView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["user"]["id"], str(existing.id))
+        self.assertEqual(models.UserProfile.objects.filter(user_id="42").count(), 1)
+
+
+class BotTokenKeyRingTests(SimpleTestCase):
+    DATA_CHECK_STRING = "auth_date=1700000000\nuser={\"id\": 42}"
+
+    def signature(self, bot_token: str) -> str:
+        return hmac.new(derive_secret_key(bot_token), self.DATA_CHECK_STRING.encode(), hashlib.sha256).hexdigest()
+
+    def test_keys_keep_configured_order(self):
+        ring = BotTokenKeyRing(["new", "", "old", "new", "oldest"])
+
+        self.assertEqual([key.label for key in ring.keys], ["current", "previous-1", "previous-2"])
+        self.assertEqual([key.secret for key in ring.keys], [derive_secret_key(t) for t in ("new", "old", "oldest")])
+        self.assertFalse(BotTokenKeyRing(["", None]))
+
+    def test_current_token_is_checked_first(self):
+        ring = BotTokenKeyRing(["new", "old"])
+
+        key = ring.verify(self.DATA_CHECK_STRING, self.signature("new"))
+
+        self.assertEqual(key.label, "current")
+        self.assertEqual(ring.stats()["current"]["hits"], 1)
+        self.assertEqual(ring.stats()["previous-1"], {"fingerprint": ring.keys[1].fingerprint, "hits": 0, "misses": 0})
+
+    def test_previous_token_is_accepted_during_rotation(self):
+        ring = BotTokenKeyRing(["new", "old"])
+
+        key = ring.verify(self.DATA_CHECK_STRING, self.signature("old"))
+
+        self.assertEqual(key.label, "previous-1")
+        stats = ring.stats()
+        self.assertEqual((stats["current"]["hits"], stats["current"]["misses"]), (0, 1))
+        self.assertEqual((stats["previous-1"]["hits"], stats["previous-1"]["misses"]), (1, 0))
+
+    def test_unknown_token_is_rejected(self):
+        ring = BotTokenKeyRing(["new", "old"])
+
+        self.assertIsNone(ring.verify(self.DATA_CHECK_STRING, self.signature("retired")))
+        self.assertIsNone(ring.verify(self.DATA_CHECK_STRING + "\nextra=1", self.signature("new")))
+        self.assertEqual({label: row["misses"] for label, row in ring.stats().items()}, {"current": 2, "previous-1": 2})
+
+    def test_key_ring_follows_settings_after_reset(self):
+        self.addCleanup(reset_key_ring)
+        with override_settings(BOT_TOKEN="new", BOT_TOKENS_PREVIOUS=["old"]):
+            reset_key_ring()
+            ring = get_key_ring()
+            self.assertIs(get_key_ring(), ring)
+            self.assertEqual(len(ring.keys), 2)
+        with override_settings(BOT_TOKEN="newer", BOT_TOKENS_PREVIOUS=[]):
+            reset_key_ring()
+            self.assertIsNone(get_key_ring().verify(self.DATA_CHECK_STRING, self.signature("new")))
+
+
+def _audit_entry(action: str = "profile.update", **fields) -> models.AuditLogEntry:
+    return models.AuditLogEntry(action=action, resource="profile", performed_at=datetime.now(dt_timezone.utc), **fields)
+
+
+class AuditLogBufferTests(SimpleTestCase):
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool = Path(spool_dir.name) / "audit_spool.jsonl"
+        settings_override = override_settings(AUDIT_LOG_SPOOL_PATH=str(self.spool))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Фоновый поток не нужен: сброс вызывается явно
+        worker = mock.patch.object(AuditLogBuffer, "_ensure_worker")
+        worker.start()
+        self.addCleanup(worker.stop)
+
+    def test_flush_writes_pending_entries_in_batches(self):
+        buffer = AuditLogBuffer(batch_size=2, max_pending=100)
+        for index in range(5):
+            buffer.enqueue(_audit_entry(f"action-{index}"))
+
+        with mock.patch.object(models.AuditLogEntry.objects, "bulk_create") as bulk_create:
+            written = buffer.flush()
+
+        self.assertEqual(written, 5)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [2, 2, 1])
+        self.assertEqual(len(buffer), 0)
+        self.assertFalse(self.spool.exists())
+
+    def test_failed_flush_is_spooled(self):
+        buffer = AuditLogBuffer(batch_size=10, max_pending=100)
+        entries = [_audit_entry("login", metadata={"via": "bot"}), _audit_entry("logout")]
+        for entry in entries:
+            buffer.enqueue(entry)
+
+        with mock.patch.object(models.AuditLogEntry.objects, "bulk_create", side_effect=DatabaseError("down")):
+            self.assertEqual(buffer.flush(), 0)
+
+        spooled = read_spool(self.spool)
+        self.assertEqual([entry.id for entry in spooled], [entry.id for entry in entries])
+        self.assertEqual([entry.action for entry in spooled], ["login", "logout"])
+        self.assertEqual(spooled[0].metadata, {"via": "bot"})
+        self.assertEqual(spooled[0].performed_at, entries[0].performed_at)
+
+    def test_overflow_is_spooled_without_touching_database(self):
+        buffer = AuditLogBuffer(batch_size=2, max_pending=3)
+
+        with mock.patch.object(models.AuditLogEntry.objects, "bulk_create") as bulk_create:
+            for index in range(4):
+                buffer.enqueue(_audit_entry(f"action-{index}"))
+
+        bulk_create.assert_not_called()
+        self.assertEqual([entry.action for entry in read_spool(self.spool)], ["action-0", "action-1", "action-2"])
+        self.assertEqual(len(buffer), 1)
+
+    def test_corrupted_spool_lines_are_skipped(self):
+        spill_to_spool([_audit_entry("first")])
+        with self.spool.open("a", encoding="utf-8") as spool:
+            spool.write("{not json\n\n")
+        spill_to_spool([_audit_entry("second")])
+
+        self.assertEqual([entry.action for entry in read_spool(self.spool)], ["first", "second"])
+
+
+@skipUnless(connection.vendor == "postgresql", "таблица аудита партиционирована только в PostgreSQL")
+class ReplayAuditSpoolTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool = Path(spool_dir.name) / "audit_spool.jsonl"
+
+    def test_replay_is_idempotent_and_drops_missing_users(self):
+        user = models.UserProfile.objects.create(user_id="42")
+        kept = _audit_entry("login", user_id=user.id)
+        orphan = _audit_entry("logout", user_id=uuid.uuid4())
+        spill_to_spool([kept, orphan])
+
+        call_command("replay_audit_spool", path=str(self.spool), stdout=io.StringIO())
+
+        self.assertFalse(self.spool.exists())
+        self.assertFalse(self.spool.with_name(self.spool.name + ".replaying").exists())
+        replayed = {entry.id: entry for entry in models.AuditLogEntry.objects.filter(id__in=[kept.id, orphan.id])}
+        self.assertEqual(replayed[kept.id].user_id, user.id)
+        self.assertIsNone(replayed[orphan.id].user_id)
+
+        # Прерванный запуск: файл уже переименован, записи частично в БД
+        spill_to_spool([kept])
+        self.spool.rename(self.spool.with_name(self.spool.name + ".replaying"))
+        call_command("replay_audit_spool", path=str(self.spool), stdout=io.StringIO())
+
+        self.assertEqual(models.AuditLogEntry.objects.filter(id=kept.id).count(), 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "таблица аудита партиционирована только в PostgreSQL")
+class AuditPartitionTests(TestCase):
+    MONTH = date(2001, 1, 1)
+
+    def _rows_in(self, table, entry_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {connection.ops.quote_name(table)} WHERE id = %s", [entry_id])
+            return cursor.fetchone()[0]
+
+    def _old_entry(self):
+        return models.AuditLogEntry.objects.create(
+            action="legacy", resource="profile", performed_at=datetime(2001, 1, 15, tzinfo=dt_timezone.utc)
+        )
+
+    def test_migration_prepares_months_ahead(self):
+        current = month_start(timezone.now().date())
+
+        self.assertTrue(is_partitioned())
+        months = [month for _, month in list_partitions()]
+        self.assertEqual(months[-4:], [add_months(current, offset) for offset in range(4)])
+
+    def test_new_partition_takes_rows_from_default(self):
+        entry = self._old_entry()
+        self.assertEqual(self._rows_in(DEFAULT_PARTITION, entry.id), 1)
+
+        self.assertTrue(ensure_partition(self.MONTH))
+        self.assertFalse(ensure_partition(self.MONTH))
+
+        self.assertEqual(self._rows_in(DEFAULT_PARTITION, entry.id), 0)
+        self.assertEqual(self._rows_in(partition_name(self.MONTH), entry.id), 1)
+        self.assertEqual(models.AuditLogEntry.objects.get(id=entry.id).action, "legacy")
+
+    def test_ensure_command_creates_missing_months(self):
+        current = month_start(timezone.now().date())
+        stdout = io.StringIO()
+
+        call_command("ensure_audit_partitions", months_ahead=5, stdout=stdout)
+
+        self.assertIn(f"{add_months(current, 5):%Y-%m}", stdout.getvalue())
+        self.assertIn(partition_name(add_months(current, 5)), [name for name, _ in list_partitions()])
+
+    def test_prune_archives_and_drops_expired_partitions(self):
+        entry = self._old_entry()
+        ensure_partition(self.MONTH)
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+
+        call_command("prune_audit_log", keep_months=1, dry_run=True, stdout=io.StringIO())
+        self.assertIn(partition_name(self.MONTH), [name for name, _ in list_partitions()])
+
+        call_command("prune_audit_log", keep_months=1, archive_dir=archive_dir.name, stdout=io.StringIO())
+
+        names = [name for name, _ in list_partitions()]
+        self.assertNotIn(partition_name(self.MONTH), names)
+        self.assertIn(partition_name(month_start(timezone.now().date())), names)
+        self.assertFalse(models.AuditLogEntry.objects.filter(id=entry.id).exists())
+        with gzip.open(Path(archive_dir.name) / f"{partition_name(self.MONTH)}.jsonl.gz", "rt", encoding="utf-8") as archive:
+            self.assertEqual([json.loads(line)["id"] for line in archive], [str(entry.id)])
+
+
+class IdempotencyMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.records = {}
+        self.calls = 0
+        for name, replacement in (
+            ("find_record", self.records.get),
+            ("store_record", self.store_record),
+            ("advisory_lock", lambda key: contextlib.nullcontext()),
+        ):
+            patcher = mock.patch(f"api.utils.idempotency.{name}", side_effect=replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def store_record(self, *, key, scope, request_hash_value, status_code, payload, metadata=None):
+        self.assertLessEqual(len(scope), MAX_SCOPE_LENGTH)
+        self.assertIsNotNone(payload)
+        self.records[key] = models.IdempotencyKeyRecord(
+            key=key,
+            scope=scope,
+            request_hash=request_hash_value,
+            status_code=status_code,
+            response_payload=payload,
+            metadata=metadata or {},
+        )
+
+    def middleware(self, response_factory):
+        def view(request):
+            self.calls += 1
+            return response_factory()
+
+        return IdempotencyMiddleware(view)
+
+    def post(self, middleware, body, key="key-1", path="/api/v1/electives/enroll"):
+        request = RequestFactory().post(path, data=body, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key)
+        return middleware(request)
+
+    def test_response_is_replayed(self):
+        middleware = self.middleware(lambda: JsonResponse({"id": self.calls}, status=201))
+
+        first = self.post(middleware, {"course": "c1"})
+        second = self.post(middleware, {"course": "c1"})
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((second.status_code, json.loads(second.content)), (201, {"id": 1}))
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+
+    def test_reused_key_with_other_body_is_rejected(self):
+        middleware = self.middleware(lambda: JsonResponse({"ok": True}))
+
+        self.post(middleware, {"course": "c1"})
+        response = self.post(middleware, {"course": "c2"})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_bodiless_response_is_replayed_without_body(self):
+        middleware = self.middleware(lambda: HttpResponse(status=204, content_type="application/json"))
+
+        self.post(middleware, {})
+        response = self.post(middleware, {})
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((response.status_code, response.content), (204, b""))
+
+    def test_server_errors_are_not_stored(self):
+        middleware = self.middleware(lambda: JsonResponse({"detail": "boom"}, status=503))
+
+        self.post(middleware, {})
+        self.post(middleware, {})
+
+        self.assertEqual(self.calls, 2)
+
+    def test_long_scope_is_shortened(self):
+        path = "/api/v1/" + "x" * 300
+        scope = request_scope("POST", path)
+
+        self.assertEqual(len(scope), MAX_SCOPE_LENGTH)
+        self.assertNotEqual(scope, request_scope("POST", path + "y"))
+        self.assertEqual(request_scope("POST", "/api/v1/a"), "POST /api/v1/a")
+        self.post(self.middleware(lambda: JsonResponse({})), {}, path=path)
+
+
+@skipUnless(connection.vendor == "postgresql", "advisory-блокировки есть только в PostgreSQL")
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_run_view_once(self):
+        calls = []
+        started = threading.Event()
+
+        def view(request):
+            calls.append(request)
+            started.set()
+            time.sleep(0.3)
+            return JsonResponse({"calls": len(calls)}, status=201)
+
+        middleware = IdempotencyMiddleware(view)
+        responses = []
+
+        def send():
+            try:
+                request = RequestFactory().post(
+                    "/api/v1/electives/enroll",
+                    data={"course": "c1"},
+                    content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY="same-key",
+                )
+                responses.append(middleware(request))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(response.status_code for response in responses), [201, 201, 201])
+        self.assertEqual({json.loads(response.content)["calls"] for response in responses}, {1})
+        self.assertEqual(sum(response.has_header("Idempotent-Replayed") for response in responses), 2)
+        self.assertEqual(models.IdempotencyKeyRecord.objects.count(), 1)
+
+
+class ICalendarTests(SimpleTestCase):
+    STAMP = datetime(2024, 4, 1, 6, 0, tzinfo=dt_timezone.utc)
+
+    def event(self, **fields):
+        row = {
+            "id": "lesson-1",
+            "subject": "Алгоритмы",
+            "lesson_type": "lecture",
+            "starts_at": datetime(2024, 4, 1, 7, 10, tzinfo=dt_timezone.utc),
+            "ends_at": datetime(2024, 4, 1, 8, 40, tzinfo=dt_timezone.utc),
+            **fields,
+        }
+        return render_event(row, uid_domain="example.org", stamp=self.STAMP)
+
+    def test_long_lines_are_folded_by_octets(self):
+        line = "SUMMARY:" + "Теория вероятностей и математическая статистика, " * 4
+        folded = fold_line(line)
+
+        physical = folded[: -len(CRLF)].split(CRLF)
+        self.assertGreater(len(physical), 1)
+        self.assertTrue(all(len(part.encode("utf-8")) <= 75 for part in physical))
+        self.assertTrue(all(part.startswith(" ") for part in physical[1:]))
+        self.assertEqual(folded.replace(CRLF + " ", "")[: -len(CRLF)], line)
+        self.assertEqual(fold_line("VERSION:2.0"), "VERSION:2.0" + CRLF)
+
+    def test_text_is_escaped(self):
+        self.assertEqual(escape_text("a;b,c\\d\r\ne\nf"), "a\\;b\\,c\\\\d\\ne\\nf")
+        self.assertIn("SUMMARY:Матанализ\\, поток 1\\;", self.event(subject="Матанализ, поток 1;"))
+
+    def test_url_with_line_breaks_is_dropped(self):
+        injected = self.event(links={"meeting_url": "https://meet.example.org/1\r\nATTENDEE:mailto:x@example.org"})
+        plain = self.event(links={"meeting_url": "https://meet.example.org/1"})
+
+        self.assertNotIn("ATTENDEE", injected)
+        self.assertNotIn("URL:", injected)
+        self.assertIn("URL:https://meet.example.org/1" + CRLF, plain)
+
+
+class ScheduleFeedTokenTests(SimpleTestCase):
+    def setUp(self):
+        self.profile = models.UserProfile(user_id="42", metadata={})
+        patcher = mock.patch(
+            "api.api.v1.views.schedule.resolve_profile",
+            side_effect=lambda user_id: self.profile if user_id == "42" else None,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_round_trip(self):
+        token = make_feed_token("group", "group-1", self.profile)
+
+        self.assertEqual(read_feed_token(token, "group"), ("group-1", self.profile))
+        self.assertIsNone(read_feed_token(token, "user"))
+        self.assertIsNone(read_feed_token(token[:-2] + "xx", "group"))
+        self.assertIsNone(read_feed_token(None, "group"))
+
+    def test_revoked_token_is_rejected(self):
+        token = make_feed_token("user", "42", self.profile)
+        self.profile.metadata = {FEED_TOKEN_VERSION_KEY: 1}
+
+        self.assertIsNone(read_feed_token(token, "user"))
+        self.assertEqual(read_feed_token(make_feed_token("user", "42", self.profile), "user"), ("42", self.profile))
+
+    def test_expired_token_is_rejected(self):
+        token = make_feed_token("user", "42", self.profile)
+
+        with override_settings(ICS_FEED_TOKEN_MAX_AGE=60), mock.patch(
+            "django.core.signing.time.time", return_value=time.time() + 120
+        ):
+            self.assertIsNone(read_feed_token(token, "user"))
+
+    def test_token_of_unknown_user_is_rejected(self):
+        self.profile.user_id = "43"
+        token = make_feed_token("user", "43", self.profile)
+
+        self.assertIsNone(read_feed_token(token, "user"))
+
+    def test_only_feed_routes_skip_init_data(self):
+        middleware = InitDataValidationMiddleware(lambda request: HttpResponse("ok"))
+        factory = RequestFactory()
+
+        self.assertEqual(middleware(factory.get("/api/v1/schedule/my.ics")).status_code, 200)
+        self.assertEqual(middleware(factory.get("/api/v1/schedule/groups/group-1.ics")).status_code, 200)
+        self.assertEqual(middleware(factory.get("/api/v1/events/x.ics")).status_code, 403)
+        self.assertEqual(middleware(factory.get("/api/v1/schedule/my")).status_code, 403)
+
+
+class _StubUniversityHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.client_ports.add(self.client_address[1])
+            status_code = server.statuses.pop(0) if server.statuses else 200
+        if server.delay:
+            time.sleep(server.delay)
+
+        parsed = urlparse(self.path)
+        group_id = parsed.path.split("/")[2]
+        params = parse_qs(parsed.query)
+        body = json.dumps(
+            {
+                "items": [
+                    {
+                        "subject": "Алгоритмы",
+                        "starts_at": f"{params['from'][0]}T10:10:00+03:00",
+                        "ends_at": f"{params['from'][0]}T11:40:00+03:00",
+                        "teacher": {"full_name": "Петров Б.Б."},
+                    },
+                    {
+                        "subject": "Матанализ",
+                        "starts_at": f"{params['from'][0]}T08:30:00+03:00",
+                        "ends_at": f"{params['from'][0]}T10:00:00+03:00",
+                        "teacher": {"full_name": "Иванова А.А."},
+                        "group": group_id,
+                    },
+                ]
+            }
+        ).encode()
+        try:
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент уже ушёл по таймауту
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpScheduleProviderTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubUniversityHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.client_ports = set()
+        self.server.statuses = []
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.provider = HttpScheduleProvider(
+            f"http://127.0.0.1:{self.server.server_port}",
+            read_timeout=0.5,
+            retries=2,
+            breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60),
+            sleep=lambda seconds: None,
+        )
+
+    def tearDown(self):
+        self.provider.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_week_sorts_items_and_reuses_connection(self):
+        first = self.provider.fetch_week("group-1", WEEK)
+        self.provider.fetch_week("group-1", WEEK)
+
+        self.assertEqual([item["subject"] for item in first.items], ["Матанализ", "Алгоритмы"])
+        self.assertEqual(first.items[0]["teacher"]["id"], "teacher-иванова-аа")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_transient_errors_are_retried(self):
+        self.server.statuses = [503, 502]
+
+        schedule = self.provider.fetch_week("group-1", WEEK)
+
+        self.assertEqual(len(schedule.items), 2)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(self.provider.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_breaker_opens_after_repeated_failures(self):
+        self.server.statuses = [503] * 3
+
+        with self.assertRaises(ScheduleProviderUnavailable):
+            self.provider.fetch_week("group-1", WEEK)
+        self.assertEqual(self.provider.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaisesMessage(ScheduleProviderUnavailable, "circuit_open"):
+            self.provider.fetch_week("group-1", WEEK)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_slow_upstream_times_out(self):
+        self.server.delay = 2
+        self.provider.retries = 0
+
+        started = time.monotonic()
+        with self.assertRaises(ScheduleProviderUnavailable):
+            self.provider.fetch_week("group-1", WEEK)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_concurrent_misses_are_coalesced(self):
+        self.server.delay = 0.2
+        source = CachedScheduleSource(self.provider, StaleWhileRevalidateCache(fresh_ttl=60, stale_ttl=600))
+        results = []
+
+        def load():
+            results.append(source.week("group-1", WEEK))
+
+        threads = [threading.Thread(target=load) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_stale_entry_is_served_while_revalidating(self):
+        now = [0.0]
+        cache = StaleWhileRevalidateCache(fresh_ttl=10, stale_ttl=100, timer=lambda: now[0])
+        source = CachedScheduleSource(self.provider, cache)
+        source.week("group-1", WEEK)
+
+        self.server.statuses = [503] * 3
+        now[0] = 50
+        stale = source.week("group-1", WEEK)
+
+        self.assertEqual(len(stale.items), 2)
+        deadline = time.monotonic() + 2
+        while len(self.server.requests) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(len(source.week("group-1", WEEK).items), 2)
+
+    def test_window_spans_weeks(self):
+        source = CachedScheduleSource(self.provider, StaleWhileRevalidateCache())
+
+        items = source.window(
+            "group-1",
+            datetime(2024, 4, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 4, 15, tzinfo=dt_timezone.utc),
+        )
+
+        self.assertEqual(len(items), 4)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_uncached_provider_window_matches_cached(self):
+        date_from = datetime(2024, 4, 1, tzinfo=dt_timezone.utc)
+        date_to = datetime(2024, 4, 15, tzinfo=dt_timezone.utc)
+
+        cached = CachedScheduleSource(self.provider, StaleWhileRevalidateCache()).window("group-1", date_from, date_to)
+
+        self.assertEqual(self.provider.window("group-1", date_from, date_to), cached)
+
+    def test_provider_must_implement_window(self):
+        class WeekOnlyProvider(ScheduleProvider):
+            def fetch_week(self, group_id, start):
+                return build_group_schedule(group_id, [])
+
+        with self.assertRaises(TypeError):
+            WeekOnlyProvider()
+
+
+class WeekSnapshotVersionTests(SimpleTestCase):
+    def test_snapshots_older_than_schedule_version_are_rebuilt(self):
+        weeks = [WEEK, WEEK + timedelta(days=7)]
+        stored = [
+            (snapshot_id("group-1", WEEK), [{"id": "fresh"}], 5),
+            (snapshot_id("group-1", weeks[1]), [{"id": "stale"}], 4),
+        ]
+        snapshots = mock.Mock()
+        snapshots.values_list.return_value = stored
+
+        with mock.patch.object(models.ScheduleWeekSnapshot.objects, "filter", return_value=snapshots), mock.patch(
+            "api.utils.schedule_snapshots.build_week_snapshots", return_value={weeks[1]: [{"id": "rebuilt"}]}
+        ) as build:
+            payloads = get_week_payloads("group-1", weeks, 5)
+
+        build.assert_called_once_with("group-1", [weeks[1]])
+        self.assertEqual(payloads, {WEEK: [{"id": "fresh"}], weeks[1]: [{"id": "rebuilt"}]})
+
+
+class ScheduleMyETagTests(SimpleTestCase):
+    def _get(self, source, **headers):
+        request = APIRequestFactory().get(
+            "/api/v1/schedule/my", {"from": "2024-04-01", "to": "2024-04-08", "group_id": "group-1"}, **headers
+        )
+        with mock.patch("api.api.v1.views.schedule.get_schedule_source", return_value=source):
+            return ScheduleMyView.as_view()(request)
+
+    def _source(self, version):
+        source = mock.Mock(source="fixtures")
+        source.version.return_value = version
+        source.window.return_value = []
+        return source
+
+    def test_matching_etag_returns_304_without_fetching(self):
+        source = self._source("v1")
+        first = self._get(source)
+        etag = first["ETag"]
+
+        cached = self._get(source, HTTP_IF_NONE_MATCH=etag)
+        strong = self._get(source, HTTP_IF_NONE_MATCH=etag[2:])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(first.data["meta"]["schedule_version"], etag[3:-1])
+        self.assertEqual((cached.status_code, strong.status_code), (304, 304))
+        self.assertEqual(cached["ETag"], etag)
+        self.assertEqual(source.window.call_count, 1)
+
+    def test_new_version_changes_etag(self):
+        etag = self._get(self._source("v1"))["ETag"]
+
+        response = self._get(self._source("v2"), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@skipUnless(connection.vendor == "postgresql", "версии расписания проверяются на схеме PostgreSQL")
+class ScheduleGroupETagTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        university = models.University.objects.create(id="etag-university", title="Университет", city="Москва")
+        cls.group = models.AcademicGroup.objects.create(id="etag-group", university=university, title="Группа")
+        cls.teacher = models.Teacher.objects.create(id="etag-teacher", full_name="Преподаватель")
+        cls.room = models.Classroom.objects.create(name="101")
+        starts_at = datetime(2024, 4, 2, 8, 30, tzinfo=dt_timezone.utc)
+        cls.lesson = models.Lesson.objects.create(
+            id="etag-lesson",
+            subject="Алгоритмы",
+            lesson_type="lecture",
+            starts_at=starts_at,
+            ends_at=starts_at + timedelta(minutes=90),
+            group=cls.group,
+            teacher=cls.teacher,
+            room=cls.room,
+        )
+
+    def _get(self, **headers):
+        request = APIRequestFactory().get(
+            "/api/v1/schedule/groups/etag-group", {"from": "2024-04-01", "to": "2024-04-03"}, **headers
+        )
+        return ScheduleGroupView.as_view()(request, group_id="etag-group")
+
+    def test_matching_etag_returns_304(self):
+        etag = self._get()["ETag"]
+
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_related_edits_change_etag(self):
+        edits = {
+            "lesson": lambda: models.Lesson.objects.get(id="etag-lesson").save(),
+            "group": lambda: models.AcademicGroup.objects.get(id="etag-group").save(),
+            "teacher": lambda: models.Teacher.objects.get(id="etag-teacher").save(),
+            "room": lambda: models.Classroom.objects.get(id=self.room.id).save(),
+        }
+        for name, edit in edits.items():
+            with self.subTest(name):
+                etag = self._get()["ETag"]
+                edit()
+                response = self._get(HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+
+class TeacherStubTests(SimpleTestCase):
+    ITEMS = [
+        {"id": "l1", "teacher": {"id": "t1", "full_name": "Иванов И. И."}},
+        {"id": "l2", "teacher": {"id": "t2"}},
+        {"id": "l3", "teacher": {"id": "t1", "full_name": "Иванов И. И."}},
+        {"id": "l4", "teacher": {}},
+    ]
+
+    def setUp(self):
+        clear_known_teachers()
+        self.addCleanup(clear_known_teachers)
+        lookup = mock.patch.object(models.Teacher.objects, "filter")
+        self.filter = lookup.start()
+        self.addCleanup(lookup.stop)
+        self.filter.return_value.values_list.return_value = ["t1"]
+        insert = mock.patch.object(models.Teacher.objects, "bulk_create")
+        self.bulk_create = insert.start()
+        self.addCleanup(insert.stop)
+
+    def test_only_missing_teachers_are_inserted(self):
+        self.assertEqual(ensure_teacher_stubs(self.ITEMS), 1)
+
+        self.assertEqual(set(self.filter.call_args.kwargs["id__in"]), {"t1", "t2"})
+        created = self.bulk_create.call_args.args[0]
+        self.assertEqual([(teacher.id, teacher.full_name) for teacher in created], [("t2", UNKNOWN_TEACHER)])
+        self.assertEqual(self.bulk_create.call_args.kwargs, {"ignore_conflicts": True})
+
+    def test_known_teachers_skip_the_database(self):
+        ensure_teacher_stubs(self.ITEMS)
+        self.filter.reset_mock()
+
+        self.assertEqual(ensure_teacher_stubs(self.ITEMS), 0)
+        self.filter.assert_not_called()
+
+    def test_deleted_teacher_is_checked_again(self):
+        ensure_teacher_stubs(self.ITEMS)
+        self.filter.reset_mock()
+        self.filter.return_value.values_list.return_value = []
+
+        forget_teacher("t1")
+
+        self.assertEqual(ensure_teacher_stubs(self.ITEMS), 1)
+        self.assertEqual(list(self.filter.call_args.kwargs["id__in"]), ["t1"])
+
+
+@skipUnless(connection.vendor == "postgresql", "заглушки проверяются на схеме PostgreSQL")
+class TeacherStubDeletionTests(TestCase):
+    def setUp(self):
+        clear_known_teachers()
+        self.addCleanup(clear_known_teachers)
+
+    def test_teacher_deleted_by_admin_is_recreated(self):
+        items = [{"id": "l1", "teacher": {"id": "t1", "full_name": "Иванов И. И."}}]
+        ensure_teacher_stubs(items)
+
+        models.Teacher.objects.get(id="t1").delete()
+
+        self.assertEqual(ensure_teacher_stubs(items), 1)
+        self.assertEqual(models.Teacher.objects.get(id="t1").metadata, {"source": "schedule_fixture"})
+
+
+class WholeScheduleProvider(ScheduleProvider):
+    """Как фикстуры: на любую неделю отдаёт всё расписание группы, окно собирает по неделям без обрезки."""
+
+    cacheable = False
+
+    def __init__(self, entries):
+        self.schedule = build_group_schedule("group-1", entries)
+
+    def fetch_week(self, group_id, start):
+        return self.schedule
+
+    def window(self, group_id, date_from, date_to):
+        items = []
+        for start in weeks_between(date_from, date_to):
+            items.extend(self.fetch_week(group_id, start).window(date_from, date_to))
+        return items
+
+
+class LessonSyncFetchTests(SimpleTestCase):
+    def test_remote_lessons_are_returned_once(self):
+        provider = WholeScheduleProvider(
+            [
+                {"id": "a", "subject": "Алгоритмы", "starts_at": "2024-04-02T08:30:00+00:00", "ends_at": "2024-04-02T10:00"},
+                {"id": "b", "subject": "Матанализ", "starts_at": "2024-04-16T08:30:00+00:00", "ends_at": "2024-04-16T10:00"},
+            ]
+        )
+
+        items = fetch_remote_lessons(
+            provider,
+            "group-1",
+            datetime(2024, 4, 1, tzinfo=dt_timezone.utc),
+            datetime(2024, 4, 29, tzinfo=dt_timezone.utc),
+        )
+
+        self.assertEqual([item["id"] for item in items], ["a", "b"])
+
+    def test_lesson_removed_from_feed_is_restored_with_same_remote_time(self):
+        remote_at = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        incoming = {"status": models.LESSON_STATUS_SCHEDULED, "updated_remote_at": remote_at}
+        removed = {
+            "status": models.LESSON_STATUS_CANCELED,
+            "cancel_info": {"reason": REMOVED_REASON},
+            "updated_remote_at": remote_at,
+        }
+
+        self.assertTrue(_changed(removed, incoming))
+        # Отмену университета с тем же временем изменения не трогаем
+        self.assertFalse(_changed({**removed, "cancel_info": {"reason": "holiday"}}, incoming))
+
+    def test_empty_feed_does_not_cancel_the_window(self):
+        row = {
+            "id": "a",
+            "group_id": "group-1",
+            "status": models.LESSON_STATUS_SCHEDULED,
+            "cancel_info": {},
+            "series": {},
+            "starts_at": datetime(2024, 4, 2, 8, 30, tzinfo=dt_timezone.utc),
+        }
+        lessons = mock.Mock()
+        lessons.values.side_effect = [[row], []]
+
+        with mock.patch.object(models.Lesson.objects, "filter", return_value=lessons):
+            result = sync_group(
+                WholeScheduleProvider([]),
+                "group-1",
+                datetime(2024, 4, 1, tzinfo=dt_timezone.utc),
+                datetime(2024, 4, 8, tzinfo=dt_timezone.utc),
+                dry_run=True,
+            )
+
+        self.assertEqual(result.canceled, 0)
+
+    def test_week_window_is_clipped_to_the_week(self):
+        start = date(2024, 4, 1)
+
+        date_from = datetime(2024, 3, 28, tzinfo=dt_timezone.utc)
+        date_to = datetime(2024, 4, 3, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(week_window(start, date_from, date_to), (datetime(2024, 4, 1, tzinfo=dt_timezone.utc), date_to))
+
+
+@skipUnless(connection.vendor == "postgresql", "синхронизация проверяется на схеме PostgreSQL")
+class LessonSyncRestoreTests(TestCase):
+    date_from = datetime(2024, 4, 1, tzinfo=dt_timezone.utc)
+    date_to = datetime(2024, 4, 8, tzinfo=dt_timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        university = models.University.objects.create(id="sync-university", title="Университет", city="Москва")
+        models.AcademicGroup.objects.create(id="group-1", university=university, title="Группа")
+
+    def _entry(self, lesson_id, day):
+        return {
+            "id": lesson_id,
+            "subject": "Алгоритмы",
+            "starts_at": f"2024-04-0{day}T08:30:00+00:00",
+            "ends_at": f"2024-04-0{day}T10:00:00+00:00",
+            "updated_at": "2024-03-01T00:00:00+00:00",
+        }
+
+    def _sync(self, *entries):
+        return sync_group(WholeScheduleProvider(list(entries)), "group-1", self.date_from, self.date_to)
+
+    def test_lesson_reappearing_in_feed_is_restored(self):
+        first, second = self._entry("a", 2), self._entry("b", 3)
+        self.assertEqual(self._sync(first, second).created, 2)
+
+        self.assertEqual(self._sync(second).canceled, 1)
+        lesson = models.Lesson.objects.get(id="a")
+        self.assertEqual(lesson.status, models.LESSON_STATUS_CANCELED)
+        self.assertEqual(lesson.cancel_info["reason"], REMOVED_REASON)
+
+        result = self._sync(first, second)
+
+        self.assertEqual((result.updated, result.unchanged), (1, 1))
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.status, models.LESSON_STATUS_SCHEDULED)
+        self.assertEqual(lesson.cancel_info, {})
+
+    def test_empty_feed_keeps_lessons(self):
+        self._sync(self._entry("a", 2))
+
+        self.assertEqual(self._sync().canceled, 0)
+        self.assertEqual(models.Lesson.objects.get(id="a").status, models.LESSON_STATUS_SCHEDULED)
+
+
+def _at(hour, minute=0):
+    return datetime(2024, 4, 1, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class ScheduleConflictTests(SimpleTestCase):
+    def test_overlaps_are_reported_per_resource(self):
+        intervals = LessonIntervals()
+        intervals.add("a", _at(8, 30), _at(10), room="r1", teacher="t1", group="g1")
+        intervals.add("b", _at(9, 30), _at(11), room="r1", teacher="t2", group="g2")
+        intervals.add("c", _at(10), _at(11, 30), room="r2", teacher="t1", group="g1")
+        intervals.add("d", _at(12), _at(13), room="r1", teacher="t1", group="g1")
+
+        conflicts = detect_conflicts(intervals)
+
+        self.assertEqual(
+            [(item.kind, item.resource, {item.first_id, item.second_id}) for item in conflicts],
+            [(KIND_ROOM, "r1", {"a", "b"})],
+        )
+        self.assertEqual((conflicts[0].overlap_from, conflicts[0].overlap_to), (_at(9, 30), _at(10)))
+
+    def test_long_lesson_overlaps_every_nested_one(self):
+        intervals = LessonIntervals()
+        intervals.add("long", _at(8), _at(18), teacher="t1")
+        for hour in (9, 11, 13):
+            intervals.add(f"short-{hour}", _at(hour), _at(hour, 45), teacher="t1")
+
+        conflicts = detect_conflicts(intervals)
+
+        self.assertEqual(len(conflicts), 3)
+        self.assertTrue(all(item.kind == KIND_TEACHER and "long" in (item.first_id, item.second_id) for item in conflicts))
+
+    def test_parallel_subgroups_do_not_conflict(self):
+        intervals = LessonIntervals()
+        intervals.add("lab-1", _at(8), _at(10), group="g1", subgroup="1")
+        intervals.add("lab-2", _at(8), _at(10), group="g1", subgroup="2")
+        intervals.add("lecture", _at(9), _at(11), group="g1")
+
+        conflicts = detect_conflicts(intervals)
+
+        self.assertEqual(
+            sorted(tuple(sorted((item.first_id, item.second_id))) for item in conflicts if item.kind == KIND_GROUP),
+            [("lab-1", "lecture"), ("lab-2", "lecture")],
+        )
+
+    def test_room_key_falls_back_to_snapshot(self):
+        self.assertEqual(room_key(None, {"name": "А-101 ", "campus": "Main"}), "main/а-101")
+        self.assertIsNone(room_key(None, {}))
+
+    def test_related_rooms_are_loaded_by_normalized_name(self):
+        touched = [("l1", _at(9), _at(10), None, {"name": " А-101\t", "campus": "Main"}, None, None, {})]
+        active = mock.Mock()
+        active.filter.return_value.order_by.return_value.values_list.return_value = touched
+
+        with mock.patch("api.utils.schedule_conflicts._active_lessons", return_value=active), mock.patch(
+            "api.utils.schedule_conflicts.load_intervals", return_value=LessonIntervals.from_rows([])
+        ) as load:
+            conflicts_for_lessons(["l1"])
+
+        lookups = [child for child in load.call_args.args[2].children if isinstance(child, In)]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(lookups[0].rhs, ["а-101"])
+
+
+def _room(room_id, name, capacity, building="Главный корпус"):
+    return RoomInfo(
+        id=room_id,
+        name=name,
+        building=building,
+        campus_id="campus-1",
+        campus_title="Главный корпус",
+        capacity=capacity,
+        payload={"id": room_id},
+    )
+
+
+class RoomOccupancyIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = RoomOccupancyIndex()
+        self.index.set_rooms(
+            [_room("r101", "Аудитория 101", 30), _room("r204", "Лаборатория 204", 15), _room("r312", "Аудитория 312", 120)]
+        )
+        self.index.covered_from, self.index.covered_to = _at(0), _at(23)
+
+    def _free(self, start, end, **filters):
+        return [room.id for room in self.index.free_rooms(start, end, **filters)]
+
+    def test_busy_rooms_are_excluded(self):
+        self.index.apply("l1", _at(8, 30), _at(10), "r101", {}, models.LESSON_STATUS_SCHEDULED)
+        snapshot = {"name": "Аудитория 312", "campus": "Главный корпус"}
+        self.index.apply("l2", _at(10, 10), _at(11, 40), None, snapshot, models.LESSON_STATUS_SCHEDULED)
+
+        self.assertEqual(self._free(_at(9), _at(9, 30)), ["r312", "r204"])
+        self.assertEqual(self._free(_at(10), _at(10, 10)), ["r101", "r312", "r204"])
+        self.assertEqual(self._free(_at(11), _at(12)), ["r101", "r204"])
+
+    def test_long_lesson_is_found_behind_short_ones(self):
+        self.index.apply("long", _at(8), _at(18), "r204", {}, models.LESSON_STATUS_SCHEDULED)
+        self.index.apply("short", _at(9), _at(9, 30), "r204", {}, models.LESSON_STATUS_SCHEDULED)
+
+        self.assertNotIn("r204", self._free(_at(15), _at(16)))
+
+    def test_incremental_updates(self):
+        self.index.apply("l1", _at(8, 30), _at(10), "r101", {}, models.LESSON_STATUS_SCHEDULED)
+        self.assertNotIn("r101", self._free(_at(9), _at(9, 30)))
+
+        self.index.apply("l1", _at(12), _at(13), "r101", {}, models.LESSON_STATUS_SCHEDULED)
+        self.assertIn("r101", self._free(_at(9), _at(9, 30)))
+        self.assertNotIn("r101", self._free(_at(12), _at(12, 30)))
+
+        self.index.apply("l1", _at(12), _at(13), "r101", {}, models.LESSON_STATUS_CANCELED)
+        self.assertIn("r101", self._free(_at(12), _at(12, 30)))
+
+    def test_series_rooms_are_busy_outside_the_index(self):
+        later = _at(9) + timedelta(days=30)
+        occurrence_lesson = models.Lesson(
+            id="series-1@2024-05-01",
+            starts_at=later,
+            ends_at=later + timedelta(minutes=90),
+            room_id="r204",
+            room_snapshot={},
+        )
+        occupancy = mock.Mock()
+        occupancy.ensure_fresh.return_value = self.index
+        lessons = mock.MagicMock()
+        lessons.exclude.return_value.filter.return_value.order_by.return_value.values_list.return_value = []
+
+        with mock.patch("api.utils.room_occupancy.get_room_occupancy", return_value=occupancy), mock.patch.object(
+            models.Lesson, "objects", lessons
+        ), mock.patch("api.utils.room_occupancy.series_lessons", return_value=[occurrence_lesson]):
+            free = [room.id for room in find_free_rooms(later + timedelta(minutes=30), later + timedelta(hours=1))]
+
+        self.assertEqual(free, ["r101", "r312"])
+
+    def test_empty_rebuild_still_enables_delta_refresh(self):
+        lessons = mock.MagicMock()
+        rebuild_rows = lessons.exclude.return_value.filter.return_value.order_by.return_value.values_list.return_value
+        rebuild_rows.iterator.return_value = []
+        soon = datetime.now(dt_timezone.utc) + timedelta(hours=1)
+        changed = ("l1", soon, soon + timedelta(minutes=90), "r101", {}, models.LESSON_STATUS_SCHEDULED, {}, soon)
+        lessons.filter.return_value.order_by.return_value.values_list.return_value = [changed]
+        series = mock.MagicMock()
+        series.filter.return_value.exists.return_value = False
+        occupancy = LiveRoomOccupancy(timer=lambda: 0.0)
+
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(mock.patch.object(models.Lesson, "objects", lessons))
+            stack.enter_context(mock.patch.object(models.LessonSeries, "objects", series))
+            stack.enter_context(mock.patch("api.utils.room_occupancy.load_rooms", return_value=[]))
+            stack.enter_context(mock.patch("api.utils.room_occupancy.series_lessons", return_value=[]))
+            occupancy.rebuild()
+            self.assertIsNotNone(occupancy.synced_at)
+            self.assertEqual(occupancy.index.lessons, {})
+
+            occupancy.refresh()
+
+        self.assertIn("l1", occupancy.index.lessons)
+
+    def test_filters(self):
+        self.assertEqual(self._free(_at(9), _at(10), min_capacity=100), ["r312"])
+        self.assertEqual(self._free(_at(9), _at(10), building="другой корпус"), [])
+        self.assertEqual(self._free(_at(9), _at(10), campus_id="campus-2"), [])
+
+
+class FreeSlotBitsetTests(SimpleTestCase):
+    def test_busy_mask_rounds_to_whole_slots(self):
+        mask = busy_mask(WEEK, [(_at(8, 30), _at(10)), (_at(10, 10), _at(11, 40))])
+
+        # 10:00–10:10 попадает в слот 10:00–10:15, поэтому перерыв не виден
+        self.assertEqual(list(iter_runs(mask)), [(34, 47)])
+
+    def test_common_free_windows_of_many_participants(self):
+        participants = [busy_mask(WEEK, [(_at(8 + index % 3), _at(9 + index % 3))]) for index in range(300)]
+        busy = 0
+        for mask in participants:
+            busy |= mask
+        allowed = allowed_mask(
+            WEEK,
+            _at(0),
+            _at(0) + timedelta(days=1),
+            time_zone=dt_timezone.utc,
+            day_start=clock(8, 0),
+            day_end=clock(14, 0),
+            weekdays=range(7),
+        )
+
+        windows = [(_at(0) + first * SLOT, _at(0) + last * SLOT) for first, last in iter_runs(allowed & ~busy)]
+
+        self.assertEqual(windows, [(_at(11), _at(14))])
+
+    def test_allowed_mask_respects_local_hours_and_weekdays(self):
+        moscow = ZoneInfo("Europe/Moscow")
+        allowed = allowed_mask(
+            WEEK,
+            _at(0),
+            _at(0) + timedelta(days=7),
+            time_zone=moscow,
+            day_start=clock(9, 0),
+            day_end=clock(18, 0),
+            weekdays=[0, 2],
+        )
+
+        runs = list(iter_runs(allowed))
+        self.assertEqual(len(runs), 2)
+        self.assertEqual(_at(0) + runs[0][0] * SLOT, datetime(2024, 4, 1, 6, tzinfo=dt_timezone.utc))
+        self.assertEqual(_at(0) + runs[1][1] * SLOT, datetime(2024, 4, 3, 15, tzinfo=dt_timezone.utc))
+
+
+    def test_teacher_masks_expire_with_any_schedule_version(self):
+        lessons = mock.MagicMock()
+        rows = lessons.exclude.return_value.filter.return_value.filter.return_value.order_by.return_value.values_list
+        rows.side_effect = [[("group-1", "teacher-1", _at(9), _at(10))], [("group-1", "teacher-1", _at(12), _at(13))]]
+        self.addCleanup(clear_busy_cache)
+        clear_busy_cache()
+
+        with mock.patch.object(models.Lesson, "objects", lessons), mock.patch(
+            "api.utils.free_slots.series_lessons", return_value=[]
+        ), mock.patch("api.utils.free_slots._schedule_epoch", side_effect=[7, 7, 8]):
+            first = week_busy_masks([], ["teacher-1"], WEEK)
+            cached = week_busy_masks([], ["teacher-1"], WEEK)
+            # Синхронизация увеличила версию какой-то группы без сигналов Lesson
+            synced = week_busy_masks([], ["teacher-1"], WEEK)
+
+        self.assertEqual(rows.call_count, 2)
+        self.assertEqual(cached, first)
+        self.assertEqual(synced[("teacher", "teacher-1")], busy_mask(WEEK, [(_at(12), _at(13))]))
+
+
+class LessonSeriesExpansionTests(SimpleTestCase):
+    def _series(self, **overrides):
+        fields = {
+            "id": "algo-lecture",
+            "subject": "Алгоритмы",
+            "lesson_type": "lecture",
+            "group_id": "group-1",
+            "starts_on": date(2024, 2, 5),
+            "until": date(2024, 5, 31),
+            "weekdays": [0, 3],
+            "start_time": clock(10, 10),
+            "duration_minutes": 90,
+            "time_zone": "Europe/Moscow",
+        }
+        fields.update(overrides)
+        return models.LessonSeries(**fields)
+
+    def test_weekly_days_within_window(self):
+        days = list(occurrence_days(self._series(), date(2024, 4, 1), date(2024, 4, 14)))
+
+        self.assertEqual(days, [date(2024, 4, 1), date(2024, 4, 4), date(2024, 4, 8), date(2024, 4, 11)])
+
+    def test_every_other_week_counts_from_series_start(self):
+        series = self._series(weekdays=[0], interval_weeks=2)
+
+        days = list(occurrence_days(series, date(2024, 4, 1), date(2024, 4, 30)))
+
+        self.assertEqual(days, [date(2024, 4, 1), date(2024, 4, 15), date(2024, 4, 29)])
+
+    def test_series_bounds_are_respected(self):
+        series = self._series(until=date(2024, 2, 10))
+
+        days = list(occurrence_days(series, date(2024, 1, 1), date(2024, 3, 1)))
+
+        self.assertEqual(days, [date(2024, 2, 5), date(2024, 2, 8)])
+
+    def test_occurrence_uses_local_time(self):
+        lesson = occurrence(self._series(), date(2024, 4, 1))
+
+        self.assertEqual(lesson.id, "algo-lecture@2024-04-01")
+        self.assertEqual(lesson.starts_at, datetime(2024, 4, 1, 7, 10, tzinfo=dt_timezone.utc))
+        self.assertEqual(lesson.ends_at, datetime(2024, 4, 1, 8, 40, tzinfo=dt_timezone.utc))
+        self.assertEqual(lesson.series, {"id": "algo-lecture", "occurrence": "2024-04-01"})
+        self.assertEqual(lesson.group_id, "group-1")
+
+    def test_series_weeks_cover_the_term(self):
+        weeks = series_weeks("group-1", date(2024, 2, 5), date(2024, 2, 18))
+
+        self.assertEqual(
+            sorted(week for _, week in weeks),
+            [date(2024, 1, 29), date(2024, 2, 5), date(2024, 2, 12), date(2024, 2, 19)],
+        )
+
+
+class ScheduleChangeFeedTests(SimpleTestCase):
+    NOW = datetime(2024, 4, 1, 9, 0, tzinfo=dt_timezone.utc)
+
+    def _state(self, **overrides):
+        state = {
+            "subject": "Алгоритмы",
+            "starts_at": datetime(2024, 4, 2, 7, 10, tzinfo=dt_timezone.utc),
+            "ends_at": datetime(2024, 4, 2, 8, 40, tzinfo=dt_timezone.utc),
+            "status": models.LESSON_STATUS_SCHEDULED,
+            "format": "offline",
+            "room_snapshot": {"name": "101"},
+            "teacher_id": "teacher-1",
+        }
+        state.update(overrides)
+        return state
+
+    def test_classify_kinds(self):
+        old = self._state()
+        moved = self._state(starts_at=old["starts_at"] + timedelta(days=1), ends_at=old["ends_at"] + timedelta(days=1))
+        canceled = self._state(status=models.LESSON_STATUS_CANCELED)
+
+        self.assertEqual(classify(None, old), models.ScheduleChange.KIND_CREATED)
+        self.assertEqual(classify(old, moved), models.ScheduleChange.KIND_RESCHEDULED)
+        self.assertEqual(classify(old, canceled), models.ScheduleChange.KIND_CANCELED)
+        self.assertEqual(classify(canceled, old), models.ScheduleChange.KIND_RESTORED)
+        self.assertEqual(classify(old, self._state(room_snapshot={"name": "202"})), models.ScheduleChange.KIND_UPDATED)
+        # Переименование предмета и неотслеживаемые поля событием не считаются
+        self.assertIsNone(classify(old, self._state(subject="Алгоритмы и структуры данных", notes="x")))
+
+    def test_past_and_distant_lessons_are_skipped(self):
+        past = self._state(starts_at=self.NOW - timedelta(days=1))
+        distant = self._state(starts_at=self.NOW + timedelta(days=60))
+
+        self.assertIsNone(build_change(models.ScheduleChange.KIND_CANCELED, "l1", "g1", past, past, now=self.NOW))
+        self.assertIsNone(build_change(models.ScheduleChange.KIND_CREATED, "l1", "g1", distant, now=self.NOW))
+        self.assertIsNotNone(build_change(models.ScheduleChange.KIND_CANCELED, "l1", "g1", distant, distant, now=self.NOW))
+
+    def test_reschedule_keeps_previous_start(self):
+        old = self._state()
+        new = self._state(starts_at=old["starts_at"] + timedelta(hours=2))
+
+        change = build_change(classify(old, new), "l1", "g1", new, old, now=self.NOW)
+
+        self.assertEqual(change.previous_starts_at, old["starts_at"])
+        self.assertEqual(change.payload["previous"], {"starts_at": "2024-04-02T07:10:00+00:00"})
+
+    def test_message_collapses_events_of_one_lesson(self):
+        old = self._state()
+        moved = self._state(starts_at=old["starts_at"] + timedelta(hours=2))
+        first = build_change(classify(old, moved), "l1", "g1", moved, old, now=self.NOW)
+        second = build_change(models.ScheduleChange.KIND_CANCELED, "l1", "g1", moved, moved, now=self.NOW)
+        other = build_change(models.ScheduleChange.KIND_CREATED, "l2", "g1", self._state(subject="Физика"), now=self.NOW)
+        for index, change in enumerate((first, other, second), start=1):
+            change.id = index
+
+        message = render_message([first, other, second], "Europe/Moscow")
+
+        self.assertEqual([item["lesson_id"] for item in message["items"]], ["l2", "l1"])
+        self.assertIn("• Алгоритмы, 02.04 12:10 — отменено", message["text"])
+        self.assertIn("• Физика, 02.04 10:10 — добавлено", message["text"])
+
+    def test_notification_opt_out(self):
+        self.assertTrue(wants_schedule_notifications({}))
+        self.assertTrue(wants_schedule_notifications({"notifications": {"schedule_changes": True}}))
+        self.assertFalse(wants_schedule_notifications({"notifications": {"schedule_changes": False}}))
+
+    def test_changes_cursor_follows_commit_order(self):
+        settled = mock.MagicMock()
+        page = settled.filter.return_value.order_by.return_value.values.return_value
+        page.__getitem__.return_value = [
+            {"id": 12, "kind": "created", "xact_id": 900},
+            {"id": 7, "kind": "canceled", "xact_id": 901},
+        ]
+        since = encode_cursor([900, 11], salt=CHANGES_CURSOR_SALT)
+
+        with mock.patch("api.utils.schedule_changes._settled_changes", return_value=settled) as changes:
+            rows, cursor, has_more = changes_page("g1", since, 1)
+
+        changes.assert_called_once_with("g1")
+        settled.filter.assert_called_once_with(after(("xact_id", "id"), [900, 11]))
+        settled.filter.return_value.order_by.assert_called_once_with("xact_id", "id")
+        # id 7 зафиксирован позже id 12 и идёт после него
+        self.assertEqual(rows, [{"id": 12, "kind": "created"}])
+        self.assertEqual(decode_cursor(cursor, salt=CHANGES_CURSOR_SALT, size=2), [900, 12])
+        self.assertTrue(has_more)
+
+    def test_empty_page_keeps_the_cursor(self):
+        settled = mock.MagicMock()
+        settled.filter.return_value.order_by.return_value.values.return_value.__getitem__.return_value = []
+        since = encode_cursor([900, 11], salt=CHANGES_CURSOR_SALT)
+
+        with mock.patch("api.utils.schedule_changes._settled_changes", return_value=settled):
+            rows, cursor, has_more = changes_page("g1", since, 100)
+            with self.assertRaises(InvalidCursor):
+                changes_page("g1", encode_cursor([900, 11], salt="other"), 100)
+
+        self.assertEqual((rows, has_more), ([], False))
+        self.assertEqual(decode_cursor(cursor, salt=CHANGES_CURSOR_SALT, size=2), [900, 11])
+
+
+@skipUnless(connection.vendor == "postgresql", "порядок фиксации берётся из снимка PostgreSQL")
+class ScheduleChangeCursorTests(TransactionTestCase):
+    def _change(self, lesson_id):
+        return models.ScheduleChange.objects.create(group_id="g1", lesson_id=lesson_id, kind=models.ScheduleChange.KIND_CREATED)
+
+    def test_change_committed_late_is_not_skipped(self):
+        cursor = current_changes_cursor("g1")
+        inserted, release = threading.Event(), threading.Event()
+
+        def slow_sync():
+            try:
+                with transaction.atomic():
+                    self._change("slow")
+                    inserted.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_sync)
+        thread.start()
+        inserted.wait(10)
+        fast = self._change("fast")
+        try:
+            rows, cursor_during, _ = changes_page("g1", cursor, 100)
+            # Событие с большим id уже зафиксировано, но курсор не уходит за незавершённую транзакцию
+            self.assertEqual(rows, [])
+            self.assertEqual(cursor_during, cursor)
+        finally:
+            release.set()
+            thread.join(10)
+
+        rows, _, _ = changes_page("g1", cursor_during, 100)
+
+        slow = models.ScheduleChange.objects.get(lesson_id="slow")
+        self.assertLess(slow.id, fast.id)
+        self.assertEqual([row["lesson_id"] for row in rows], ["slow", "fast"])
+
+
+class KeysetCursorTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        token = encode_cursor([datetime(2024, 4, 1, 9, 0, tzinfo=dt_timezone.utc), "event-1"], salt="test")
+
+        self.assertEqual(decode_cursor(token, salt="test", size=2), ["2024-04-01T09:00:00+00:00", "event-1"])
+
+    def test_tampered_or_foreign_cursor_is_rejected(self):
+        token = encode_cursor(["Алгоритмы", "course-1"], salt="test")
+
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token[:-2] + "xx", salt="test", size=2)
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, salt="other", size=2)
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token, salt="test", size=1)
+
+    def test_after_is_lexicographic(self):
+        condition = after(("title", "id"), ["Алгоритмы", "course-1"])
+
+        self.assertEqual(
+            condition,
+            Q(title__gt="Алгоритмы") | (Q(id__gt="course-1") & Q(title="Алгоритмы")),
+        )
+
+    def test_paginator_limits(self):
+        paginator = KeysetPaginator(("starts_at", "id"), salt="test", default_limit=20, max_limit=100)
+
+        self.assertEqual(paginator.limit({}), 20)
+        self.assertEqual(paginator.limit({"limit": "500"}), 100)
+        self.assertEqual(paginator.limit({"limit": "0"}), 1)
+        with self.assertRaises(ValueError):
+            paginator.limit({"limit": "много"})
+
+    def test_catalog_filters_are_normalized(self):
+        filters = catalog_filters({"term": "2024-fall", "language": "", "digital_faculty": "TRUE", "limit": "10"})
+
+        self.assertEqual(filters, (("term", "2024-fall"), ("digital_faculty", "true")))
+
+    def test_catalog_uses_shared_limit_parser(self):
+        paginator = ElectiveCatalogView.keyset
+
+        self.assertEqual(paginator.limit({}), 50)
+        self.assertEqual(paginator.limit({"limit": "100000"}), settings.ELECTIVE_CATALOG_MAX_LIMIT)
+        # Неверный limit отклоняется до запросов к базе, как в остальных списках
+        with self.assertRaises(ValueError):
+            render_catalog_page((), {"limit": "много"}, paginator=paginator, serializer_class=None)
+
+
+class ElectiveAllocationTests(SimpleTestCase):
+    ENROLLED = models.ENROLLMENT_STATUS_ENROLLED
+    WAITLISTED = models.ENROLLMENT_STATUS_WAITLISTED
+    REJECTED = models.ENROLLMENT_STATUS_REJECTED
+
+    def _allocate(self, requests, **overrides):
+        options = {
+            "free_seats": {"ai": 1, "law": 2},
+            "held_seats": {},
+            "waitlist_tail": {},
+            "seats_per_student": 1,
+            # Жребий задан явно: a < b < c
+            "tie_breaker": {"a": 1, "b": 2, "c": 3}.get,
+        }
+        options.update(overrides)
+        users, courses, priorities = zip(*requests)
+        return allocate(users, courses, priorities, **options)
+
+    def test_priority_rounds_and_lottery(self):
+        decisions = self._allocate(
+            [("b", "ai", 1), ("a", "ai", 1), ("a", "law", 2), ("b", "law", 2), ("c", "law", 1)]
+        )
+
+        self.assertEqual(
+            decisions,
+            [
+                (self.WAITLISTED, 1),
+                (self.ENROLLED, None),
+                (self.REJECTED, None),
+                (self.ENROLLED, None),
+                (self.ENROLLED, None),
+            ],
+        )
+
+    def test_existing_seats_and_waitlist_are_respected(self):
+        decisions = self._allocate(
+            [("a", "ai", 1), ("b", "ai", 1), ("c", "law", None)],
+            free_seats={"ai": 0, "law": None},
+            held_seats={"c": 1},
+            waitlist_tail={"ai": 4},
+        )
+
+        self.assertEqual(decisions, [(self.WAITLISTED, 5), (self.WAITLISTED, 6), (self.REJECTED, None)])
+
+    def test_lottery_is_deterministic_per_term(self):
+        self.assertEqual(lottery_key("2024-fall", "", "user-1"), lottery_key("2024-fall", "", "user-1"))
+        self.assertNotEqual(lottery_key("2024-fall", "", "user-1"), lottery_key("2025-spring", "", "user-1"))
+
+    def test_course_capacity(self):
+        self.assertEqual(course_capacity({"total": 120}), 120)
+        self.assertEqual(course_capacity({"total": "30"}), 30)
+        self.assertIsNone(course_capacity({}))
+        self.assertIsNone(course_capacity({"total": "много"}))
+
+
+class RatingRollupTests(SimpleTestCase):
+    def _rollup(self, teacher_id, ratings, tags=None):
+        return models.TeacherRatingRollup(
+            teacher_id=teacher_id,
+            course_id="course-algo",
+            period="2024",
+            count=len(ratings),
+            rating_sum=sum(ratings),
+            rating_squares=sum(rating * rating for rating in ratings),
+            tags=tags or {},
+        )
+
+    def test_only_accepted_feedback_counts(self):
+        values = {
+            "teacher_id": "teacher-1",
+            "course_id": "course-algo",
+            "period": "2024",
+            "rating": 4,
+            "tags": ["практика", "практика", ""],
+            "status": models.TeacherFeedback.STATUS_ACCEPTED,
+        }
+
+        state = feedback_state(values)
+
+        self.assertEqual(state.key, ("teacher-1", "course-algo", "2024"))
+        self.assertEqual(state.tags, ("практика", "практика"))
+        self.assertIsNone(feedback_state({**values, "status": models.TeacherFeedback.STATUS_PENDING}))
+
+    def test_summary_combines_rollups(self):
+        rollups = [
+            self._rollup("teacher-1", [5, 5, 4], {"практика": 2}),
+            self._rollup("teacher-2", [3], {"практика": 1, "структура курса": 1}),
+        ]
+
+        summary = summarize(rollups)
+
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["avg"], 4.25)
+        self.assertEqual(summary["stddev"], 0.83)
+        self.assertEqual(summary["tags"], {"практика": 3, "структура курса": 1})
+        self.assertEqual(summarize_by_teacher(rollups)["teacher-2"]["avg"], 3.0)
+        self.assertIsNone(summarize([]))
+
+
+class AdmissionsFacetTests(SimpleTestCase):
+    def test_request_filters_are_normalized(self):
+        filters = request_filters(
+            {"level": "bachelor", "format": "", "has_budget": "TRUE", "cursor": "abc"}, PROGRAM_FILTER_PARAMS
+        )
+
+        self.assertEqual(filters, (("level", "bachelor"), ("has_budget", "true")))
+
+    def test_facet_ignores_its_own_filter(self):
+        filters = (("level", "bachelor"), ("format", "online"))
+
+        where = str(program_queryset(filters, exclude="level").query).split("WHERE", 1)[1]
+
+        self.assertIn("online", where)
+        self.assertNotIn("bachelor", where)
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN-проверки рассчитаны на PostgreSQL")
+class LessonQueryPlanTests(TestCase):
+    """Горячие запросы расписания должны идти по индексам и без сортировки."""
+
+    GROUPS = 40
+    TEACHERS = 60
+    LESSONS_PER_GROUP = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        university = models.University.objects.create(id="plan-university", title="Университет", city="Москва")
+        groups = [
+            models.AcademicGroup(id=f"plan-group-{index}", university=university, title=f"Группа {index}")
+            for index in range(cls.GROUPS)
+        ]
+        models.AcademicGroup.objects.bulk_create(groups)
+        teachers = [models.Teacher(id=f"plan-teacher-{index}", full_name=f"Преподаватель {index}") for index in range(cls.TEACHERS)]
+        models.Teacher.objects.bulk_create(teachers)
+
+        start = datetime(2024, 9, 2, 8, 30, tzinfo=dt_timezone.utc)
+        lessons = []
+        for group_index, group in enumerate(groups):
+            for lesson_index in range(cls.LESSONS_PER_GROUP):
+                starts_at = start + timedelta(hours=4 * lesson_index + group_index % 4)
+                lessons.append(
+                    models.Lesson(
+                        id=f"plan-{group_index}-{lesson_index}",
+                        subject="Предмет",
+                        lesson_type="lecture",
+                        starts_at=starts_at,
+                        ends_at=starts_at + timedelta(minutes=90),
+                        format="offline" if lesson_index % 3 else "online",
+                        group=group,
+                        teacher=teachers[(group_index + lesson_index) % cls.TEACHERS],
+                        status=models.LESSON_STATUS_CANCELED if lesson_index % 10 == 0 else models.LESSON_STATUS_SCHEDULED,
+                    )
+                )
+        models.Lesson.objects.bulk_create(lessons, batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE api_lesson")
+
+        cls.date_from = datetime(2024, 10, 1, tzinfo=dt_timezone.utc)
+        cls.date_to = datetime(2024, 10, 8, tzinfo=dt_timezone.utc)
+
+    def assertIndexPlan(self, queryset, *index_names):
+        plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+        nodes = list(_plan_nodes(plan))
+        node_types = [node["Node Type"] for node in nodes]
+        self.assertNotIn("Seq Scan", node_types, msg=json.dumps(plan, indent=2))
+        self.assertFalse(any("Sort" in node_type for node_type in node_types), msg=json.dumps(plan, indent=2))
+        used = {node.get("Index Name") for node in nodes} & set(index_names)
+        self.assertTrue(used, msg=json.dumps(plan, indent=2))
+
+    def _group_week(self):
+        return models.Lesson.objects.filter(
+            group_id="plan-group-7",
+            starts_at__gte=self.date_from,
+            starts_at__lt=self.date_to,
+        )
+
+    def test_group_schedule_uses_partial_index(self):
+        queryset = self._group_week().exclude(status=models.LESSON_STATUS_CANCELED).order_by("starts_at")
+        self.assertIndexPlan(queryset, "api_lesson_group_active_idx")
+
+    def test_group_schedule_with_filters_uses_partial_index(self):
+        queryset = (
+            self._group_week()
+            .exclude(status=models.LESSON_STATUS_CANCELED)
+            .filter(format="offline", teacher_id="plan-teacher-3")
+            .order_by("starts_at")
+        )
+        # Оба индекса селективны, планировщик вправе выбрать любой из них
+        self.assertIndexPlan(queryset, "api_lesson_group_active_idx", "api_lesson_teacher_starts_idx")
+
+    def test_group_schedule_with_canceled_uses_group_index(self):
+        queryset = self._group_week().order_by("starts_at")
+        self.assertIndexPlan(queryset, "api_lesson_group_starts_idx")
+
+    def test_teacher_schedule_uses_teacher_index(self):
+        queryset = models.Lesson.objects.filter(
+            teacher_id="plan-teacher-11",
+            starts_at__gte=self.date_from,
+            starts_at__lt=self.date_to,
+        ).order_by("starts_at")
+        self.assertIndexPlan(queryset, "api_lesson_teacher_starts_idx")
+
+    def test_series_replacements_use_series_index(self):
+        self.assertIndexPlan(replacement_rows(["plan-series-1", "plan-series-2"]), "api_lesson_series_idx")
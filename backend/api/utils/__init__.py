@@ -1,4 +1,7 @@
 from .init_data import (  # noqa: F401
+    InitDataContext,
+    build_init_data_context,
+    get_request_init_data,
     get_tg_id_from_headers,
     parse_init_data_payload,
     validate_init_data,
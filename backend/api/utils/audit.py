@@ -1,7 +1,200 @@
-from typing import Any, Dict, Optional
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from .. import models
 
+logger = logging.getLogger(__name__)
+
+
+def spool_path() -> Path:
+    return Path(getattr(settings, "AUDIT_LOG_SPOOL_PATH", "audit_spool.jsonl"))
+
+
+def _entry_to_record(entry: models.AuditLogEntry) -> Dict[str, Any]:
+    return {
+        "id": str(entry.id),
+        "user_id": str(entry.user_id) if entry.user_id else None,
+        "action": entry.action,
+        "resource": entry.resource,
+        "request_id": entry.request_id,
+        "idempotency_key": entry.idempotency_key,
+        "scope": entry.scope,
+        "metadata": entry.metadata,
+        "ip_address": entry.ip_address,
+        "user_agent": entry.user_agent,
+        "performed_at": entry.performed_at.isoformat() if entry.performed_at else None,
+    }
+
+
+def _record_to_entry(record: Dict[str, Any]) -> models.AuditLogEntry:
+    return models.AuditLogEntry(
+        id=uuid.UUID(record["id"]),
+        user_id=record.get("user_id"),
+        action=record.get("action") or "",
+        resource=record.get("resource") or "",
+        request_id=record.get("request_id") or "",
+        idempotency_key=record.get("idempotency_key") or "",
+        scope=record.get("scope") or "",
+        metadata=record.get("metadata") or {},
+        ip_address=record.get("ip_address"),
+        user_agent=record.get("user_agent") or "",
+        performed_at=parse_datetime(record.get("performed_at") or "") or timezone.now(),
+    )
+
+
+def spill_to_spool(entries: Iterable[models.AuditLogEntry]) -> int:
+    """Дописать записи в локальный append-only файл, если БД недоступна."""
+    path = spool_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with path.open("a", encoding="utf-8") as spool:
+        for entry in entries:
+            spool.write(json.dumps(_entry_to_record(entry), ensure_ascii=False, default=str))
+            spool.write("\n")
+            count += 1
+        spool.flush()
+        os.fsync(spool.fileno())
+    return count
+
+
+def read_spool(path: Path) -> List[models.AuditLogEntry]:
+    entries: List[models.AuditLogEntry] = []
+    with path.open("r", encoding="utf-8") as spool:
+        for line_number, line in enumerate(spool, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(_record_to_entry(json.loads(line)))
+            except (ValueError, KeyError, TypeError) as exc:
+                logger.error("Пропущена повреждённая строка %s в %s: %s", line_number, path, exc)
+    return entries
+
+
+class AuditLogBuffer:
+    """
+    Буфер записей аудита в памяти воркера.
+
+    Записи сбрасываются в БД одним bulk_create, когда набирается пачка или
+    срабатывает таймер, а также при остановке процесса. Если БД недоступна
+    или очередь дорастает до max_pending, записи уходят в spool-файл,
+    который переигрывает команда replay_audit_spool.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 2.0, max_pending: int = 10000):
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_interval = float(flush_interval)
+        self.max_pending = max(int(max_pending), self.batch_size)
+        self._pending: Deque[models.AuditLogEntry] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def enqueue(self, entry: models.AuditLogEntry) -> None:
+        self._ensure_worker()
+        with self._lock:
+            self._pending.append(entry)
+            size = len(self._pending)
+        if size >= self.batch_size:
+            self._wakeup.set()
+        if size >= self.max_pending:
+            # Воркер не успевает: очередь уходит в spool одной записью в файл,
+            # а не синхронным сбросом в БД из потока запроса
+            self.spill()
+
+    def spill(self) -> int:
+        """Переложить все накопленные записи в spool-файл. Возвращает их число."""
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+        if not batch:
+            return 0
+        logger.warning("Очередь аудита переполнена, %s записей отложено в spool.", len(batch))
+        try:
+            return spill_to_spool(batch)
+        except OSError:
+            logger.exception("Spool аудита недоступен, %s записей потеряно.", len(batch))
+            return 0
+
+    def flush(self) -> int:
+        """Сбросить все накопленные записи. Возвращает число записей, ушедших в БД."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return written
+                try:
+                    models.AuditLogEntry.objects.bulk_create(batch, batch_size=self.batch_size)
+                    written += len(batch)
+                except DatabaseError as exc:
+                    logger.error("Не удалось записать %s записей аудита, пишем в spool: %s", len(batch), exc)
+                    try:
+                        spill_to_spool(batch)
+                    except OSError:
+                        logger.exception("Spool аудита недоступен, %s записей потеряно.", len(batch))
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def _ensure_worker(self) -> None:
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            # После fork поток родителя в дочернем процессе не существует
+            self._worker_pid = pid
+            self._stopped.clear()
+            self._worker = threading.Thread(target=self._run, name="audit-log-flusher", daemon=True)
+            self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ошибка фонового сброса аудита.")
+            finally:
+                close_old_connections()
+
+
+audit_buffer = AuditLogBuffer(
+    batch_size=getattr(settings, "AUDIT_LOG_BATCH_SIZE", 100),
+    flush_interval=getattr(settings, "AUDIT_LOG_FLUSH_INTERVAL", 2.0),
+    max_pending=getattr(settings, "AUDIT_LOG_MAX_PENDING", 10000),
+)
+atexit.register(audit_buffer.stop)
+
 
 def write_audit_log(
     *,
@@ -14,8 +207,13 @@ def write_audit_log(
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
 ) -> models.AuditLogEntry:
-    """Создать запись аудита."""
-    return models.AuditLogEntry.objects.create(
+    """
+    Создать запись аудита.
+
+    По умолчанию запись ставится в буфер и пишется в БД асинхронно;
+    при AUDIT_LOG_BUFFERED = False — синхронно, как раньше.
+    """
+    entry = models.AuditLogEntry(
         user=user,
         action=action,
         resource=resource,
@@ -23,6 +221,11 @@ def write_audit_log(
         idempotency_key=idempotency_key or "",
         metadata=metadata or {},
         ip_address=ip_address,
-        user_agent=user_agent or "",
+        user_agent=(user_agent or "")[:255],
+        performed_at=timezone.now(),
     )
-
+    if not getattr(settings, "AUDIT_LOG_BUFFERED", True):
+        entry.save(force_insert=True)
+        return entry
+    audit_buffer.enqueue(entry)
+    return entry
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import gzip
+import re
+from datetime import date, datetime, time, timezone as dt_timezone
+from pathlib import Path
+from typing import List, Tuple
+
+from django.db import connection as default_connection, transaction
+
+from .. import models
+
+AUDIT_TABLE = models.AuditLogEntry._meta.db_table
+PARTITION_PREFIX = f"{AUDIT_TABLE}_p"
+DEFAULT_PARTITION = f"{AUDIT_TABLE}_default"
+
+_PARTITION_RE = re.compile(rf"^{re.escape(PARTITION_PREFIX)}(\d{{4}})_(\d{{2}})$")
+
+
+class AuditPartitioningUnavailable(Exception):
+    """Таблица аудита не партиционирована (или БД не PostgreSQL)."""
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + (value.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def _bound(month: date) -> datetime:
+    return datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(connection=default_connection) -> bool:
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT 1
+            FROM pg_partitioned_table pt
+            JOIN pg_class c ON c.oid = pt.partrelid
+            WHERE c.relname = %s AND c.relnamespace = to_regnamespace(current_schema())
+            """,
+            [AUDIT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def _require_partitioned(connection) -> None:
+    if not is_partitioned(connection):
+        raise AuditPartitioningUnavailable(f"Таблица {AUDIT_TABLE} не партиционирована.")
+
+
+def list_partitions(connection=default_connection) -> List[Tuple[str, date]]:
+    """Месячные партиции аудита в порядке возрастания месяца."""
+    _require_partitioned(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = %s AND parent.relnamespace = to_regnamespace(current_schema())
+            """,
+            [AUDIT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def ensure_partition(month: date, connection=default_connection) -> bool:
+    """
+    Создать партицию за месяц, если её ещё нет.
+
+    Строки этого месяца, успевшие попасть в DEFAULT-партицию, переносятся
+    в новую партицию — иначе PostgreSQL не даст её создать.
+    """
+    _require_partitioned(connection)
+    month = month_start(month)
+    name = partition_name(month)
+    if any(existing == name for existing, _ in list_partitions(connection)):
+        return False
+
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(AUDIT_TABLE)} DETACH PARTITION {qn(DEFAULT_PARTITION)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} PARTITION OF {qn(AUDIT_TABLE)} FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {qn(DEFAULT_PARTITION)}
+                WHERE performed_at >= %s AND performed_at < %s
+                RETURNING *
+            )
+            INSERT INTO {qn(name)} SELECT * FROM moved
+            """,
+            [lower, upper],
+        )
+        cursor.execute(f"ALTER TABLE {qn(AUDIT_TABLE)} ATTACH PARTITION {qn(DEFAULT_PARTITION)} DEFAULT")
+    return True
+
+
+def archive_partition(name: str, directory: Path, connection=default_connection) -> Tuple[Path, int]:
+    """Выгрузить партицию в сжатый JSONL. Возвращает путь к архиву и число строк."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{name}.jsonl.gz"
+    qn = connection.ops.quote_name
+    rows = 0
+    with transaction.atomic(using=connection.alias):
+        cursor = connection.chunked_cursor()
+        try:
+            cursor.execute(f"SELECT row_to_json(t)::text FROM {qn(name)} t ORDER BY performed_at")
+            with gzip.open(path, "wt", encoding="utf-8") as archive:
+                while True:
+                    chunk = cursor.fetchmany(2000)
+                    if not chunk:
+                        break
+                    for (line,) in chunk:
+                        archive.write(line)
+                        archive.write("\n")
+                    rows += len(chunk)
+        finally:
+            cursor.close()
+    return path, rows
+
+
+def drop_partition(name: str, connection=default_connection) -> None:
+    """Отсоединить и удалить партицию — без DELETE и раздувания таблицы."""
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(AUDIT_TABLE)} DETACH PARTITION {qn(name)}")
+        cursor.execute(f"DROP TABLE {qn(name)}")
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+# Заявки без приоритета рассматриваются после всех с приоритетом
+NO_PRIORITY = 1 << 15
+
+Decision = Tuple[str, Optional[int]]
+
+
+@dataclass
+class AllocationResult:
+    enrolled: int = 0
+    waitlisted: int = 0
+    rejected: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.enrolled + self.waitlisted + self.rejected
+
+
+def lottery_key(term: str, seed: str, user_id: str) -> int:
+    """
+    Жребий студента внутри одного приоритета: детерминированный (повторный
+    запуск даёт тот же результат) и не зависящий от времени подачи заявки.
+    Один и тот же для всех курсов студента.
+    """
+    digest = hashlib.sha256(f"{term}\x00{seed}\x00{user_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def course_capacity(quota: Optional[Mapping]) -> Optional[int]:
+    """Всего мест по AcademicCourse.quota ({"total": N}); None — без ограничения."""
+    total = (quota or {}).get("total")
+    try:
+        return max(int(total), 0) if total is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def allocate(
+    user_ids: Sequence[str],
+    course_ids: Sequence[str],
+    priorities: Sequence[Optional[int]],
+    *,
+    free_seats: Mapping[str, Optional[int]],
+    held_seats: Mapping[str, int],
+    waitlist_tail: Mapping[str, int],
+    seats_per_student: int,
+    tie_breaker: Callable[[str], int],
+) -> List[Decision]:
+    """
+    Распределить заявки одним проходом: (статус, место в листе ожидания) для каждой.
+
+    Заявки (параллельные массивы) сортируются по (приоритет, жребий студента,
+    курс) — O(n log n) — и рассматриваются раундами приоритетов: сначала все
+    первые приоритеты, затем вторые и т. д. Студент, уже получивший
+    seats_per_student мест, по остальным заявкам получает отказ; если мест
+    на курсе нет — встаёт в конец листа ожидания.
+    """
+    size = len(user_ids)
+    lottery: Dict[str, int] = {}
+    for user_id in user_ids:
+        if user_id not in lottery:
+            lottery[user_id] = tie_breaker(user_id)
+    order = sorted(
+        range(size),
+        key=lambda index: (
+            priorities[index] if priorities[index] is not None else NO_PRIORITY,
+            lottery[user_ids[index]],
+            course_ids[index],
+        ),
+    )
+
+    remaining = dict(free_seats)
+    held = dict(held_seats)
+    tail = dict(waitlist_tail)
+    decisions: List[Decision] = [(models.ENROLLMENT_STATUS_PENDING, None)] * size
+    for index in order:
+        user_id, course_id = user_ids[index], course_ids[index]
+        if held.get(user_id, 0) >= seats_per_student:
+            decisions[index] = (models.ENROLLMENT_STATUS_REJECTED, None)
+            continue
+        seats = remaining.get(course_id)
+        if seats is None or seats > 0:
+            if seats is not None:
+                remaining[course_id] = seats - 1
+            held[user_id] = held.get(user_id, 0) + 1
+            decisions[index] = (models.ENROLLMENT_STATUS_ENROLLED, None)
+            continue
+        tail[course_id] = tail.get(course_id, 0) + 1
+        decisions[index] = (models.ENROLLMENT_STATUS_WAITLISTED, tail[course_id])
+    return decisions
+
+
+def allocate_term(
+    term: str,
+    *,
+    seats_per_student: Optional[int] = None,
+    seed: str = "",
+    dry_run: bool = False,
+    batch_size: int = 1000,
+) -> AllocationResult:
+    """
+    Распределить все заявки pending семестра.
+
+    Уже зачисленные занимают места курса и лимит студента, лист ожидания
+    продолжается после существующих позиций. Заявки блокируются на время
+    распределения, поэтому параллельный запуск дождётся первого.
+    """
+    if seats_per_student is None:
+        seats_per_student = getattr(settings, "ELECTIVE_SEATS_PER_STUDENT", 1)
+    now = timezone.now()
+    result = AllocationResult()
+    with transaction.atomic():
+        pending = list(
+            models.ElectiveEnrollment.objects.select_for_update()
+            .filter(term=term, status=models.ENROLLMENT_STATUS_PENDING)
+            .order_by("id")
+            .only("id", "user_id", "course_id", "priority", "quota_snapshot", "timestamps")
+        )
+        if not pending:
+            return result
+
+        course_ids = sorted({enrollment.course_id for enrollment in pending})
+        quotas = dict(models.AcademicCourse.objects.filter(id__in=course_ids).values_list("id", "quota"))
+        term_rows = models.ElectiveEnrollment.objects.filter(term=term).order_by()
+        enrolled_counts = dict(
+            term_rows.filter(course_id__in=course_ids, status=models.ENROLLMENT_STATUS_ENROLLED)
+            .values_list("course_id")
+            .annotate(total=Count("id"))
+        )
+        held_seats = dict(
+            term_rows.filter(status=models.ENROLLMENT_STATUS_ENROLLED)
+            .values_list("user_id")
+            .annotate(total=Count("id"))
+        )
+        waitlist_tail = dict(
+            term_rows.filter(course_id__in=course_ids, status=models.ENROLLMENT_STATUS_WAITLISTED)
+            .values_list("course_id")
+            .annotate(last=Max("waitlist_position"))
+        )
+
+        capacity = {course_id: course_capacity(quotas.get(course_id)) for course_id in course_ids}
+        free_seats = {
+            course_id: None if total is None else max(total - enrolled_counts.get(course_id, 0), 0)
+            for course_id, total in capacity.items()
+        }
+        decisions = allocate(
+            [str(enrollment.user_id) for enrollment in pending],
+            [enrollment.course_id for enrollment in pending],
+            [enrollment.priority for enrollment in pending],
+            free_seats=free_seats,
+            held_seats={str(user_id): total for user_id, total in held_seats.items()},
+            waitlist_tail={course_id: last or 0 for course_id, last in waitlist_tail.items()},
+            seats_per_student=max(seats_per_student, 1),
+            tie_breaker=lambda user_id: lottery_key(term, seed, user_id),
+        )
+
+        for enrollment, (status, position) in zip(pending, decisions):
+            enrollment.status = status
+            enrollment.waitlist_position = position
+            enrollment.quota_snapshot = {
+                "total": capacity[enrollment.course_id],
+                "enrolled_before": enrolled_counts.get(enrollment.course_id, 0),
+                "allocated_at": now.isoformat(),
+            }
+            enrollment.timestamps = {**(enrollment.timestamps or {}), "allocated_at": now.isoformat()}
+            enrollment.updated_at = now
+            if status == models.ENROLLMENT_STATUS_ENROLLED:
+                result.enrolled += 1
+            elif status == models.ENROLLMENT_STATUS_WAITLISTED:
+                result.waitlisted += 1
+            else:
+                result.rejected += 1
+
+        if not dry_run:
+            models.ElectiveEnrollment.objects.bulk_update(
+                pending,
+                ["status", "waitlist_position", "quota_snapshot", "timestamps", "updated_at"],
+                batch_size=batch_size,
+            )
+    logger.info(
+        "Распределение элективов %s: зачислено %s, в листе ожидания %s, отказано %s",
+        term,
+        result.enrolled,
+        result.waitlisted,
+        result.rejected,
+    )
+    return result
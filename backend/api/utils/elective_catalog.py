@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Max, QuerySet
+from django.utils import timezone
+
+from .. import models
+from .cache import TTLCache
+from .keyset import KeysetPaginator
+
+CATALOG_ORDERING = ("title", "id")
+CURSOR_SALT = "api.elective_catalog"
+FILTER_PARAMS = ("term", "department", "digital_faculty", "lesson_format", "language")
+
+Filters = Tuple[Tuple[str, str], ...]
+
+# Готовые страницы каталога: ключ содержит фильтры, курсор и версию выборки
+# (max(updated_at), count), поэтому изменения в других воркерах видны сразу,
+# а TTL только ограничивает память под редкие страницы.
+_page_cache: TTLCache[Dict[str, Any]] = TTLCache(
+    maxsize=getattr(settings, "ELECTIVE_CATALOG_CACHE_SIZE", 512),
+    ttl=getattr(settings, "ELECTIVE_CATALOG_CACHE_TTL", 300),
+)
+
+
+def catalog_filters(params: Mapping[str, str]) -> Filters:
+    """Нормализованный набор фильтров запроса — часть ключа кэша."""
+    filters = []
+    for name in FILTER_PARAMS:
+        value = params.get(name)
+        if value is None or (value == "" and name != "digital_faculty"):
+            continue
+        if name == "digital_faculty":
+            value = "true" if value.lower() == "true" else "false"
+        filters.append((name, value))
+    return tuple(filters)
+
+
+def catalog_queryset(filters: Filters) -> QuerySet:
+    values = dict(filters)
+    queryset = models.AcademicCourse.objects.filter(kind=models.COURSE_KIND_ELECTIVE)
+    if "term" in values:
+        queryset = queryset.filter(term=values["term"])
+    if "department" in values:
+        queryset = queryset.filter(department_id=values["department"])
+    if "digital_faculty" in values:
+        queryset = queryset.filter(digital_faculty=values["digital_faculty"] == "true")
+    if "lesson_format" in values:
+        queryset = queryset.filter(format__icontains=values["lesson_format"])
+    if "language" in values:
+        queryset = queryset.filter(language=values["language"])
+    return queryset
+
+
+def catalog_version(queryset: QuerySet) -> Tuple[Optional[str], int]:
+    """
+    Версия выборки одним агрегатом: любое изменение курса, его кафедры
+    или преподавателей обновляет updated_at (см. сигналы), удаление — count.
+    """
+    version = queryset.order_by().aggregate(changed_at=Max("updated_at"), total=Count("id"))
+    changed_at = version["changed_at"]
+    return (changed_at.isoformat() if changed_at else None), version["total"]
+
+
+def render_catalog_page(
+    filters: Filters,
+    params: Mapping[str, str],
+    *,
+    paginator: KeysetPaginator,
+    serializer_class,
+) -> Dict[str, Any]:
+    """
+    Страница каталога элективов: items и next_cursor.
+
+    Курсы загружаются с кафедрой (select_related), преподавателями и агрегатами
+    отзывов (prefetch_related) — четыре запроса на страницу вместо 1 + 3N.
+    Представление не зависит от пользователя, поэтому страница кэшируется
+    общей для всех. Неверные ?cursor=/?limit= поднимают ValueError
+    (в том числе InvalidCursor), как KeysetPaginator.paginate.
+    """
+    limit = paginator.limit(params)
+    queryset = catalog_queryset(filters)
+    key = (paginator.salt, filters, params.get("cursor") or "", limit, catalog_version(queryset))
+    page = _page_cache.get(key)
+    if page is not None:
+        return page
+
+    queryset = queryset.select_related("department").prefetch_related("teachers", "rating_rollups")
+    courses, next_cursor = paginator.paginate(queryset, params)
+    page = {
+        "items": list(serializer_class(courses, many=True).data),
+        "next_cursor": next_cursor,
+    }
+    _page_cache.set(key, page)
+    return page
+
+
+def touch_courses(queryset: QuerySet) -> None:
+    """Сдвинуть updated_at курсов, чтобы сменилась версия каталога."""
+    queryset.update(updated_at=timezone.now())
+
+
+def clear_catalog_cache() -> None:
+    _page_cache.clear()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import Count, F, Q, QuerySet
+from django.utils import timezone
+
+from .. import models
+from .cache import TTLCache
+
+CATALOG_PROGRAMS = "programs"
+CATALOG_OPEN_DAYS = "open_days"
+
+PROGRAM_FILTER_PARAMS = ("university_id", "level", "format", "department", "duration", "has_budget")
+OPEN_DAY_FILTER_PARAMS = ("university_id", "program_id", "type", "city", "date_from", "date_to")
+BOOLEAN_PARAMS = frozenset({"has_budget"})
+
+Filters = Tuple[Tuple[str, str], ...]
+
+# Фасеты по версии справочника: запись Program/Department/OpenDayEvent увеличивает
+# версию в CatalogVersion (сигналы), и старые записи кэша просто перестают читаться.
+_facet_cache: TTLCache[Dict[str, List[Dict[str, Any]]]] = TTLCache(
+    maxsize=getattr(settings, "ADMISSIONS_FACETS_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "ADMISSIONS_FACETS_CACHE_TTL", 600),
+)
+
+
+def bump_catalog_versions(names: Iterable[str]) -> None:
+    now = timezone.now()
+    for name in sorted(set(names)):
+        updated = models.CatalogVersion.objects.filter(name=name).update(version=F("version") + 1, changed_at=now)
+        if not updated:
+            models.CatalogVersion.objects.bulk_create(
+                [models.CatalogVersion(name=name, version=1, changed_at=now)],
+                ignore_conflicts=True,
+            )
+
+
+def catalog_versions(names: Sequence[str]) -> Tuple[int, ...]:
+    versions = dict(models.CatalogVersion.objects.filter(name__in=names).values_list("name", "version"))
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def request_filters(params: Mapping[str, str], names: Sequence[str]) -> Filters:
+    """Нормализованные фильтры запроса — часть ключа кэша."""
+    filters = []
+    for name in names:
+        value = params.get(name)
+        if name in BOOLEAN_PARAMS:
+            if value is not None:
+                filters.append((name, "true" if value.lower() == "true" else "false"))
+        elif value:
+            filters.append((name, value))
+    return tuple(filters)
+
+
+def program_queryset(filters: Filters, *, exclude: Optional[str] = None) -> QuerySet:
+    """Программы с фильтрами каталога; exclude — фильтр, который не применять (для его же фасета)."""
+    values = {name: value for name, value in filters if name != exclude}
+    queryset = models.Program.objects.all()
+    if "university_id" in values:
+        queryset = queryset.filter(university_id=values["university_id"])
+    if "level" in values:
+        queryset = queryset.filter(level=values["level"])
+    if "format" in values:
+        queryset = queryset.filter(format=values["format"])
+    if "department" in values:
+        queryset = queryset.filter(department_id=values["department"])
+    if "duration" in values:
+        queryset = queryset.filter(duration_years=values["duration"])
+    if "has_budget" in values:
+        queryset = queryset.filter(has_budget=values["has_budget"] == "true")
+    return queryset
+
+
+def open_day_queryset(filters: Filters, *, exclude: Optional[str] = None) -> QuerySet:
+    values = {name: value for name, value in filters if name != exclude}
+    queryset = models.OpenDayEvent.objects.all()
+    if "university_id" in values:
+        queryset = queryset.filter(university_id=values["university_id"])
+    if "program_id" in values:
+        queryset = queryset.filter(programs__id=values["program_id"])
+    if "type" in values:
+        queryset = queryset.filter(type=values["type"])
+    if "city" in values:
+        queryset = queryset.filter(Q(city__iexact=values["city"]))
+    if "date_from" in values:
+        queryset = queryset.filter(date__gte=values["date_from"])
+    if "date_to" in values:
+        queryset = queryset.filter(date__lte=values["date_to"])
+    return queryset
+
+
+def _counts(queryset: QuerySet, field: str) -> List[Tuple[Any, int]]:
+    # distinct — фильтр по programs__id размножает строки событий
+    return list(
+        queryset.order_by()
+        .values_list(field)
+        .annotate(total=Count("id", distinct=True))
+        .order_by(field)
+    )
+
+
+def _program_facets(filters: Filters) -> Dict[str, List[Dict[str, Any]]]:
+    department_counts = dict(_counts(program_queryset(filters, exclude="department"), "department_id"))
+    return {
+        "levels": [
+            {"value": value, "count": total}
+            for value, total in _counts(program_queryset(filters, exclude="level"), "level")
+        ],
+        "formats": [
+            {"value": value, "count": total}
+            for value, total in _counts(program_queryset(filters, exclude="format"), "format")
+        ],
+        # Кафедры показываются все, в том числе без программ
+        "departments": [
+            {"id": department_id, "title": title, "count": department_counts.get(department_id, 0)}
+            for department_id, title in models.Department.objects.order_by("title").values_list("id", "title")
+        ],
+    }
+
+
+def _open_day_facets(filters: Filters) -> Dict[str, List[Dict[str, Any]]]:
+    return {
+        "types": [
+            {"value": value, "count": total}
+            for value, total in _counts(open_day_queryset(filters, exclude="type"), "type")
+        ],
+        "cities": [
+            {"value": value, "count": total}
+            for value, total in _counts(open_day_queryset(filters, exclude="city").exclude(city=""), "city")
+        ],
+    }
+
+
+def _cached(
+    name: str,
+    versions: Sequence[str],
+    filters: Filters,
+    build: Callable[[Filters], Dict[str, List[Dict[str, Any]]]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    key = (name, catalog_versions(versions), filters)
+    facets = _facet_cache.get(key)
+    if facets is None:
+        facets = build(filters)
+        _facet_cache.set(key, facets)
+    return facets
+
+
+def program_facets(filters: Filters = ()) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Значения фильтров каталога программ с количеством программ.
+
+    Без фильтров — по всему каталогу; с фильтрами счётчик каждого фасета
+    учитывает все остальные применённые фильтры, кроме своего.
+    """
+    return _cached(CATALOG_PROGRAMS, (CATALOG_PROGRAMS,), filters, _program_facets)
+
+
+def open_day_facets(filters: Filters = ()) -> Dict[str, List[Dict[str, Any]]]:
+    # Фильтр по программе зависит и от каталога программ
+    return _cached(CATALOG_OPEN_DAYS, (CATALOG_OPEN_DAYS, CATALOG_PROGRAMS), filters, _open_day_facets)
+
+
+def clear_facet_cache() -> None:
+    _facet_cache.clear()
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from .. import models
+from .cache import TTLCache
+from .lesson_series import series_lessons
+from .schedule_snapshots import week_of
+
+SLOT = timedelta(minutes=15)
+SLOT_SECONDS = int(SLOT.total_seconds())
+SLOTS_PER_WEEK = 7 * 24 * 4
+FULL_WEEK = (1 << SLOTS_PER_WEEK) - 1
+
+KIND_GROUP = "group"
+KIND_TEACHER = "teacher"
+
+Participant = Tuple[str, str]
+
+# Занятость недели: int-битсет из 672 бит, бит i — i-й 15-минутный слот с понедельника 00:00 UTC.
+# Ключ группы содержит версию расписания и устаревает сам. У преподавателей своей версии
+# нет: их ключ содержит сумму версий всех групп, которая растёт с каждым изменением
+# расписания, поэтому устаревает и после синхронизации (bulk-операции без сигналов),
+# и в других воркерах.
+_busy_cache: TTLCache[int] = TTLCache(
+    maxsize=getattr(settings, "FREE_SLOTS_CACHE_SIZE", 20000),
+    ttl=getattr(settings, "FREE_SLOTS_CACHE_TTL", 300),
+)
+
+
+def week_bounds(week: date) -> datetime:
+    return datetime.combine(week, time.min, dt_timezone.utc)
+
+
+def slot_span(week: date, starts_at: datetime, ends_at: datetime) -> Optional[Tuple[int, int]]:
+    """Слоты недели [first, last), которые задевает интервал; None — если не задевает."""
+    origin = int(week_bounds(week).timestamp())
+    first = (int(starts_at.timestamp()) - origin) // SLOT_SECONDS
+    last = -((origin - int(ends_at.timestamp())) // SLOT_SECONDS)
+    first, last = max(first, 0), min(last, SLOTS_PER_WEEK)
+    if first >= last:
+        return None
+    return first, last
+
+
+def span_mask(first: int, last: int) -> int:
+    return ((1 << (last - first)) - 1) << first
+
+
+def busy_mask(week: date, intervals: Iterable[Tuple[datetime, datetime]]) -> int:
+    mask = 0
+    for starts_at, ends_at in intervals:
+        span = slot_span(week, starts_at, ends_at)
+        if span:
+            mask |= span_mask(*span)
+    return mask
+
+
+def _group_versions(group_ids: Sequence[str]) -> Dict[str, int]:
+    versions = dict(
+        models.ScheduleVersion.objects.filter(group_id__in=group_ids).values_list("group_id", "version")
+    )
+    return {group_id: versions.get(group_id, 0) for group_id in group_ids}
+
+
+def _schedule_epoch() -> int:
+    """
+    Версия записей преподавателей: сумма версий групп.
+
+    Не время изменения — долгая транзакция может зафиксировать более раннее
+    changed_at, а каждое увеличение версии сумму меняет.
+    """
+    return models.ScheduleVersion.objects.aggregate(total=Sum("version"))["total"] or 0
+
+
+def week_busy_masks(group_ids: Sequence[str], teacher_ids: Sequence[str], week: date) -> Dict[Participant, int]:
+    """
+    Битсеты занятости участников на неделю.
+
+    Промахи кэша добираются одним запросом по всем участникам сразу.
+    """
+    versions = _group_versions(group_ids)
+    keys: Dict[Participant, tuple] = {}
+    for group_id in group_ids:
+        keys[(KIND_GROUP, group_id)] = (KIND_GROUP, group_id, week, versions[group_id])
+    epoch = _schedule_epoch() if teacher_ids else 0
+    for teacher_id in teacher_ids:
+        keys[(KIND_TEACHER, teacher_id)] = (KIND_TEACHER, teacher_id, week, epoch)
+
+    masks: Dict[Participant, int] = {}
+    missing: List[Participant] = []
+    for participant, key in keys.items():
+        mask = _busy_cache.get(key)
+        if mask is None:
+            missing.append(participant)
+        else:
+            masks[participant] = mask
+    if not missing:
+        return masks
+
+    missing_groups = [value for kind, value in missing if kind == KIND_GROUP]
+    missing_teachers = [value for kind, value in missing if kind == KIND_TEACHER]
+    lower, upper = week_bounds(week), week_bounds(week) + timedelta(days=7)
+    participants = Q(group_id__in=missing_groups) | Q(teacher_id__in=missing_teachers)
+    rows = list(
+        models.Lesson.objects.exclude(status=models.LESSON_STATUS_CANCELED)
+        .filter(starts_at__lt=upper, ends_at__gt=lower)
+        .filter(participants)
+        .order_by()
+        .values_list("group_id", "teacher_id", "starts_at", "ends_at")
+    )
+    rows.extend(
+        (lesson.group_id, lesson.teacher_id, lesson.starts_at, lesson.ends_at)
+        for lesson in series_lessons(lower - timedelta(days=1), upper, extra=participants)
+    )
+    fresh: Dict[Participant, int] = {participant: 0 for participant in missing}
+    wanted_groups, wanted_teachers = set(missing_groups), set(missing_teachers)
+    for group_id, teacher_id, starts_at, ends_at in rows:
+        span = slot_span(week, starts_at, ends_at)
+        if not span:
+            continue
+        bits = span_mask(*span)
+        if group_id in wanted_groups:
+            fresh[(KIND_GROUP, group_id)] |= bits
+        if teacher_id in wanted_teachers:
+            fresh[(KIND_TEACHER, teacher_id)] |= bits
+
+    for participant, mask in fresh.items():
+        _busy_cache.set(keys[participant], mask)
+    masks.update(fresh)
+    return masks
+
+
+def clear_busy_cache() -> None:
+    _busy_cache.clear()
+
+
+def allowed_mask(
+    week: date,
+    date_from: datetime,
+    date_to: datetime,
+    *,
+    time_zone: ZoneInfo,
+    day_start: time,
+    day_end: time,
+    weekdays: Iterable[int],
+) -> int:
+    """Слоты недели, целиком лежащие в [date_from, date_to) и в рабочих часах часового пояса."""
+    weekdays = set(weekdays)
+    origin = int(week_bounds(week).timestamp())
+    lower = max(int(date_from.timestamp()), origin)
+    upper = min(int(date_to.timestamp()), origin + SLOTS_PER_WEEK * SLOT_SECONDS)
+    mask = 0
+    # Неделя в UTC захватывает соседние локальные дни
+    for offset in range(-1, 8):
+        day = week + timedelta(days=offset)
+        if day.weekday() not in weekdays:
+            continue
+        starts = max(int(datetime.combine(day, day_start, time_zone).timestamp()), lower)
+        ends = min(int(datetime.combine(day, day_end, time_zone).timestamp()), upper)
+        first = -((origin - starts) // SLOT_SECONDS)
+        last = (ends - origin) // SLOT_SECONDS
+        if first < last:
+            mask |= span_mask(first, last)
+    return mask
+
+
+def iter_runs(mask: int) -> Iterator[Tuple[int, int]]:
+    """Максимальные отрезки единичных битов [first, last) по возрастанию."""
+    while mask:
+        first = (mask & -mask).bit_length() - 1
+        shifted = mask >> first
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        yield first, first + length
+        mask &= ~span_mask(first, first + length)
+
+
+def find_common_free_slots(
+    group_ids: Sequence[str],
+    teacher_ids: Sequence[str],
+    date_from: datetime,
+    date_to: datetime,
+    *,
+    duration: timedelta,
+    time_zone: ZoneInfo,
+    day_start: time = time(8, 0),
+    day_end: time = time(21, 0),
+    weekdays: Iterable[int] = range(6),
+    limit: int = 50,
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Окна не короче duration, в которые свободны все группы и преподаватели.
+
+    Занятость участников объединяется OR по битсетам недели, свободные
+    слоты — единичные биты ~busy & allowed.
+    """
+    weekdays = tuple(weekdays)
+    runs: List[Tuple[datetime, datetime]] = []
+    week = week_of(date_from)
+    while week_bounds(week) < date_to:
+        busy = 0
+        for mask in week_busy_masks(group_ids, teacher_ids, week).values():
+            busy |= mask
+        allowed = allowed_mask(
+            week, date_from, date_to, time_zone=time_zone, day_start=day_start, day_end=day_end, weekdays=weekdays
+        )
+        origin = week_bounds(week)
+        for first, last in iter_runs(allowed & ~busy & FULL_WEEK):
+            starts_at, ends_at = origin + first * SLOT, origin + last * SLOT
+            # Окно через полночь понедельника (UTC) склеиваем с концом прошлой недели
+            if runs and runs[-1][1] == starts_at:
+                starts_at = runs.pop()[0]
+            runs.append((starts_at, ends_at))
+        week += timedelta(days=7)
+    return [run for run in runs if run[1] - run[0] >= duration][:limit]
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .. import models
+
+CRLF = "\r\n"
+PRODID = "-//MAX University//Schedule//RU"
+
+# Поля Lesson, которых достаточно для VEVENT (без сериализатора и лишних JOIN)
+LESSON_FEED_FIELDS = (
+    "id",
+    "subject",
+    "lesson_type",
+    "starts_at",
+    "ends_at",
+    "format",
+    "status",
+    "notes",
+    "links",
+    "room_snapshot",
+    "room__name",
+    "room__building",
+    "teacher__full_name",
+    "teacher_snapshot",
+    "updated_at",
+)
+
+
+def escape_text(value: Any) -> str:
+    text = str(value or "")
+    return (
+        text.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def safe_uri(value: Any) -> Optional[str]:
+    """
+    Значение для URI-свойства (URL). Оно не экранируется, поэтому ссылка
+    с управляющими символами (CR/LF) отбрасывается, чтобы не дописать в
+    календарь чужие строки.
+    """
+    text = str(value or "").strip()
+    if not text or any(ord(char) < 0x20 or ord(char) == 0x7F for char in text):
+        return None
+    return text
+
+
+def fold_line(line: str) -> str:
+    """Перенос строк длиннее 75 октетов (RFC 5545, 3.1)."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + CRLF
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Не разрываем многобайтовый символ UTF-8
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74
+    return (CRLF + " ").join(parts) + CRLF
+
+
+def format_datetime(value: datetime) -> str:
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _location(row: Dict[str, Any]) -> str:
+    if row.get("room__name"):
+        return ", ".join(part for part in (row["room__name"], row.get("room__building")) if part)
+    snapshot = row.get("room_snapshot") or {}
+    return ", ".join(part for part in (snapshot.get("name"), snapshot.get("campus")) if part)
+
+
+def _teacher(row: Dict[str, Any]) -> str:
+    return row.get("teacher__full_name") or (row.get("teacher_snapshot") or {}).get("full_name") or ""
+
+
+def render_event(row: Dict[str, Any], *, uid_domain: str, stamp: datetime) -> str:
+    """VEVENT для строки Lesson.objects.values(*LESSON_FEED_FIELDS)."""
+    description = [row.get("lesson_type") or ""]
+    teacher = _teacher(row)
+    if teacher:
+        description.append(teacher)
+    if row.get("notes"):
+        description.append(row["notes"])
+
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{escape_text(row['id'])}@{uid_domain}",
+        f"DTSTAMP:{format_datetime(stamp)}",
+        f"DTSTART:{format_datetime(row['starts_at'])}",
+        f"DTEND:{format_datetime(row['ends_at'])}",
+        f"SUMMARY:{escape_text(row['subject'])}",
+        f"DESCRIPTION:{escape_text(chr(10).join(part for part in description if part))}",
+    ]
+    location = _location(row)
+    if location:
+        lines.append(f"LOCATION:{escape_text(location)}")
+    links = row.get("links") if isinstance(row.get("links"), dict) else {}
+    url = safe_uri(next((links[key] for key in ("meeting_url", "online", "url") if links.get(key)), None))
+    if url:
+        lines.append(f"URL:{url}")
+    if row.get("updated_at"):
+        lines.append(f"LAST-MODIFIED:{format_datetime(row['updated_at'])}")
+    lines.append("STATUS:CANCELLED" if row.get("status") == models.LESSON_STATUS_CANCELED else "STATUS:CONFIRMED")
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines)
+
+
+def iter_calendar(
+    rows: Iterable[Dict[str, Any]],
+    *,
+    name: str,
+    uid_domain: str,
+    stamp: datetime,
+    refresh_interval: Optional[str] = "PT1H",
+    chunk_size: int = 32 * 1024,
+) -> Iterator[bytes]:
+    """Календарь по частям: заголовок, по одному VEVENT на строку, окончание."""
+    header = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+        "X-WR-TIMEZONE:UTC",
+    ]
+    if refresh_interval:
+        header.append(f"REFRESH-INTERVAL;VALUE=DURATION:{refresh_interval}")
+        header.append(f"X-PUBLISHED-TTL:{refresh_interval}")
+    buffer = ["".join(fold_line(line) for line in header)]
+    size = len(buffer[0])
+    for row in rows:
+        event = render_event(row, uid_domain=uid_domain, stamp=stamp)
+        buffer.append(event)
+        size += len(event)
+        # Отдаём сокету куски разумного размера, а не по событию
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    buffer.append(fold_line("END:VCALENDAR"))
+    yield "".join(buffer).encode("utf-8")
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .. import models
+
+IDEMPOTENCY_HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 64
+MAX_SCOPE_LENGTH = models.IdempotencyKeyRecord._meta.get_field("scope").max_length
+
+
+def key_ttl() -> timedelta:
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+
+def record_key(user_id: str, raw_key: str) -> str:
+    """Ключ хранилища: один и тот же Idempotency-Key у разных пользователей не пересекается."""
+    return hashlib.sha256(f"{user_id}\x00{raw_key}".encode()).hexdigest()
+
+
+def request_scope(method: str, path: str) -> str:
+    """Метод и путь запроса; длинный путь укорачивается с хэшем, чтобы влезть в поле scope."""
+    scope = f"{method} {path}"
+    if len(scope) <= MAX_SCOPE_LENGTH:
+        return scope
+    digest = hashlib.sha256(scope.encode()).hexdigest()[:16]
+    return f"{scope[: MAX_SCOPE_LENGTH - len(digest) - 1]}~{digest}"
+
+
+def request_hash(method: str, path: str, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(method.encode())
+    digest.update(b"\x00")
+    digest.update(path.encode())
+    digest.update(b"\x00")
+    digest.update(body or b"")
+    return digest.hexdigest()
+
+
+@contextmanager
+def advisory_lock(key: str) -> Iterator[None]:
+    """
+    Сессионная advisory-блокировка PostgreSQL по ключу.
+
+    Параллельные повторы одного запроса выстраиваются в очередь: второй
+    дождётся, пока первый сохранит ответ, и получит его копию.
+    """
+    if connection.vendor != "postgresql":
+        yield
+        return
+
+    lock_id = int.from_bytes(bytes.fromhex(key)[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", [lock_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+def find_record(key: str) -> Optional[models.IdempotencyKeyRecord]:
+    return models.IdempotencyKeyRecord.objects.filter(key=key, expires_at__gt=timezone.now()).first()
+
+
+def store_record(
+    *,
+    key: str,
+    scope: str,
+    request_hash_value: str,
+    status_code: int,
+    payload,
+    metadata: Optional[dict] = None,
+) -> models.IdempotencyKeyRecord:
+    # Просроченная запись с тем же ключом могла ещё не попасть под очистку
+    record, _ = models.IdempotencyKeyRecord.objects.update_or_create(
+        key=key,
+        defaults={
+            "scope": scope,
+            "request_hash": request_hash_value,
+            "response_payload": payload,
+            "status_code": status_code,
+            "expires_at": timezone.now() + key_ttl(),
+            "metadata": metadata or {},
+        },
+    )
+    return record
+
+
+def decode_payload(content: bytes):
+    """Тело JSON-ответа для сохранения; ValueError, если это не JSON."""
+    return json.loads(content.decode("utf-8"))
+
+
+def purge_expired(batch_size: int = 1000) -> int:
+    """Удалить просроченные ключи пачками по индексу expires_at."""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        with transaction.atomic():
+            ids = list(
+                models.IdempotencyKeyRecord.objects.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += models.IdempotencyKeyRecord.objects.filter(id__in=ids).delete()[0]
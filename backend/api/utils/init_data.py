@@ -1,28 +1,71 @@
 from __future__ import annotations
 
 import hashlib
-import hmac
 import json
 import logging
+from dataclasses import dataclass, field
 from typing import Any, Dict, Optional
 from urllib.parse import parse_qs, parse_qsl, unquote, unquote_plus
 
 from django.conf import settings
 
+from .cache import TTLCache
+from .keyring import get_key_ring
+
 logger = logging.getLogger(__name__)
 
+INIT_DATA_META_KEY = "HTTP_X_MAX_INIT_DATA"
+
+_context_cache: TTLCache["InitDataContext"] = TTLCache(
+    maxsize=getattr(settings, "INIT_DATA_CACHE_SIZE", 4096),
+    ttl=getattr(settings, "INIT_DATA_CACHE_TTL", 300),
+)
+
+
+@dataclass(frozen=True)
+class InitDataContext:
+    """
+    Разобранный и провалидированный init_data одного запроса.
+
+    Экземпляр разделяется между запросами через кэш, поэтому payload
+    нельзя изменять на месте — только копировать.
+    """
+
+    validated: bool
+    tg_id: Optional[int] = None
+    payload: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def user(self) -> Dict[str, Any]:
+        user_payload = self.payload.get("user")
+        return user_payload if isinstance(user_payload, dict) else {}
+
+    @property
+    def chat(self) -> Dict[str, Any]:
+        chat_payload = self.payload.get("chat")
+        return chat_payload if isinstance(chat_payload, dict) else {}
+
+    @property
+    def user_id(self) -> str:
+        """Идентификатор пользователя MAX в виде строки (как в UserProfile.user_id)."""
+        return str(self.user.get("id") or "")
+
+
+EMPTY_INIT_DATA_CONTEXT = InitDataContext(validated=False)
+
 
 def validate_init_data(init_data: str) -> bool:
     """
     Валидирует init_data с использованием HMAC SHA256.
-    """
-    bot_token = getattr(settings, "BOT_TOKEN", "")
 
+    Подпись сверяется с ключами из набора токенов бота (текущий и предыдущие).
+    """
     if not init_data:
         logger.warning("Отсутствует заголовок Data-check-string.")
         return False
 
-    if not bot_token:
+    key_ring = get_key_ring()
+    if not key_ring:
         logger.error("Не задан BOT_TOKEN в настройках. Валидация невозможна.")
         return False
 
@@ -38,19 +81,8 @@ def validate_init_data(init_data: str) -> bool:
         return False
 
     data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(vals.items()))
-    secret_key = hmac.new(
-        "WebAppData".encode(),
-        bot_token.encode(),
-        hashlib.sha256,
-    ).digest()
-
-    generated_hash = hmac.new(
-        secret_key,
-        data_check_string.encode(),
-        hashlib.sha256,
-    ).hexdigest()
-
-    is_valid = hmac.compare_digest(generated_hash, hash_value)
+
+    is_valid = key_ring.verify(data_check_string, hash_value) is not None
     if not is_valid:
         logger.warning("Неверный хэш данных.")
     return is_valid
@@ -73,6 +105,69 @@ def parse_init_data_payload(init_data: str) -> Dict[str, Any]:
     return parsed
 
 
+def _coerce_user_id(user_id: Any) -> Optional[int]:
+    if isinstance(user_id, int):
+        return user_id
+    try:
+        return int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _init_data_digest(init_data: str) -> bytes:
+    return hashlib.sha256(init_data.encode("utf-8")).digest()
+
+
+def build_init_data_context(init_data: Optional[str]) -> InitDataContext:
+    """
+    Провалидировать и разобрать init_data один раз.
+
+    Успешно провалидированные контексты кэшируются по дайджесту исходной строки,
+    поэтому повторные запросы той же сессии мини-приложения не пересчитывают
+    HMAC и не декодируют JSON. Невалидные строки не кэшируются, чтобы
+    мусорные заголовки не вытесняли рабочие записи.
+    """
+    if not init_data:
+        return EMPTY_INIT_DATA_CONTEXT
+
+    digest = _init_data_digest(init_data)
+    context = _context_cache.get(digest)
+    if context is not None:
+        return context
+
+    if not validate_init_data(init_data):
+        return EMPTY_INIT_DATA_CONTEXT
+
+    payload = parse_init_data_payload(init_data)
+    user_payload = payload.get("user")
+    tg_id = None
+    if isinstance(user_payload, dict):
+        tg_id = _coerce_user_id(user_payload.get("id"))
+
+    context = InitDataContext(validated=True, tg_id=tg_id, payload=payload)
+    _context_cache.set(digest, context)
+    return context
+
+
+def get_request_init_data(request) -> InitDataContext:
+    """
+    Вернуть контекст init_data, привязанный к запросу middleware.
+
+    Для запросов в обход middleware (например, из тестов) контекст
+    строится на лету и запоминается на запросе.
+    """
+    context = getattr(request, "init_data", None)
+    if isinstance(context, InitDataContext):
+        return context
+    context = build_init_data_context(request.META.get(INIT_DATA_META_KEY))
+    request.init_data = context
+    return context
+
+
+def clear_init_data_cache() -> None:
+    _context_cache.clear()
+
+
 def get_tg_id_from_headers(headers: Dict[str, Any]) -> Optional[int]:
     """
     Получить Telegram user id из заголовков мини-приложения.
@@ -92,12 +187,5 @@ def get_tg_id_from_headers(headers: Dict[str, Any]) -> Optional[int]:
         logger.warning("Не удалось распарсить user из init_data")
         return None
 
-    user_id = user_payload.get("id")
-    if isinstance(user_id, int):
-        return user_id
-
-    try:
-        return int(user_id)
-    except (TypeError, ValueError):
-        return None
+    return _coerce_user_id(user_payload.get("id"))
 
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+WEB_APP_DATA_KEY = b"WebAppData"
+
+
+@dataclass
+class BotKey:
+    """Предвычисленный секрет для одного токена бота."""
+
+    label: str
+    fingerprint: str
+    secret: bytes
+    hits: int = 0
+    misses: int = 0
+
+
+def derive_secret_key(bot_token: str) -> bytes:
+    return hmac.new(WEB_APP_DATA_KEY, bot_token.encode(), hashlib.sha256).digest()
+
+
+def _fingerprint(bot_token: str) -> str:
+    return hashlib.sha256(bot_token.encode()).hexdigest()[:8]
+
+
+class BotTokenKeyRing:
+    """
+    Набор секретов для проверки подписи init_data.
+
+    Первый ключ — текущий токен бота, остальные — предыдущие токены,
+    которые ещё принимаются на время ротации. Ключи проверяются по порядку.
+    """
+
+    def __init__(self, tokens: Iterable[str]):
+        self._lock = threading.Lock()
+        self.keys: List[BotKey] = []
+        seen = set()
+        for token in tokens:
+            if not token or token in seen:
+                continue
+            seen.add(token)
+            label = "current" if not self.keys else f"previous-{len(self.keys)}"
+            self.keys.append(
+                BotKey(label=label, fingerprint=_fingerprint(token), secret=derive_secret_key(token))
+            )
+
+    def __bool__(self) -> bool:
+        return bool(self.keys)
+
+    def verify(self, data_check_string: str, hash_value: str) -> Optional[BotKey]:
+        """Вернуть ключ, которым подписаны данные, или None."""
+        message = data_check_string.encode()
+        for key in self.keys:
+            generated_hash = hmac.new(key.secret, message, hashlib.sha256).hexdigest()
+            matched = hmac.compare_digest(generated_hash, hash_value)
+            with self._lock:
+                if matched:
+                    key.hits += 1
+                else:
+                    key.misses += 1
+            if matched:
+                if key.label != "current":
+                    logger.info("init_data подписан предыдущим токеном бота (%s).", key.fingerprint)
+                return key
+        return None
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {
+                key.label: {"fingerprint": key.fingerprint, "hits": key.hits, "misses": key.misses}
+                for key in self.keys
+            }
+
+
+_key_ring: Optional[BotTokenKeyRing] = None
+_key_ring_lock = threading.Lock()
+
+
+def _configured_tokens() -> List[str]:
+    tokens = [getattr(settings, "BOT_TOKEN", "") or ""]
+    tokens.extend(getattr(settings, "BOT_TOKENS_PREVIOUS", []) or [])
+    return [token for token in tokens if token]
+
+
+def get_key_ring() -> BotTokenKeyRing:
+    global _key_ring
+    if _key_ring is None:
+        with _key_ring_lock:
+            if _key_ring is None:
+                _key_ring = BotTokenKeyRing(_configured_tokens())
+    return _key_ring
+
+
+def reset_key_ring() -> None:
+    """Пересобрать набор ключей при следующем обращении (после смены настроек)."""
+    global _key_ring
+    with _key_ring_lock:
+        _key_ring = None
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from django.core import signing
+from django.db.models import Q, QuerySet
+
+
+class InvalidCursor(ValueError):
+    """Курсор повреждён, подделан или выдан для другого списка."""
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any], *, salt: str) -> str:
+    """Подписанный курсор из значений ключа сортировки последней строки страницы."""
+    return signing.dumps([_plain(value) for value in values], salt=salt)
+
+
+def decode_cursor(token: str, *, salt: str, size: int) -> List[Any]:
+    try:
+        values = signing.loads(token, salt=salt)
+    except signing.BadSignature as exc:
+        raise InvalidCursor("bad signature") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("unexpected cursor shape")
+    return values
+
+
+def after(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """
+    Строки строго после values в лексикографическом порядке ordering (по возрастанию):
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    for index, field in enumerate(ordering):
+        step = Q(**{f"{field}__gt": values[index]})
+        for previous, value in zip(ordering[:index], values):
+            step &= Q(**{previous: value})
+        condition |= step
+    return condition
+
+
+def keyset_page(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    *,
+    cursor: Optional[str],
+    limit: int,
+    salt: str,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Страница queryset по ключу ordering (последнее поле — уникальное, обычно id).
+
+    Выбирается limit + 1 строка одним запросом: лишняя строка только
+    сообщает, что есть следующая страница.
+    """
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(after(ordering, decode_cursor(cursor, salt=salt, size=len(ordering))))
+    rows = list(queryset[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, field) for field in ordering], salt=salt)
+
+
+class KeysetPaginator:
+    """
+    Параметры ?cursor=&limit= списка с keyset-пагинацией.
+
+    Курсор подписан солью конкретного списка, поэтому его нельзя подделать
+    или подставить в другой список с другим ключом сортировки.
+    """
+
+    def __init__(self, ordering: Sequence[str], *, salt: str, default_limit: int = 20, max_limit: int = 100):
+        self.ordering = tuple(ordering)
+        self.salt = salt
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+
+    def limit(self, params) -> int:
+        """Размер страницы из ?limit=; ValueError, если это не число."""
+        return min(max(int(params.get("limit") or self.default_limit), 1), self.max_limit)
+
+    def paginate(self, queryset: QuerySet, params) -> Tuple[List[Any], Optional[str]]:
+        """Страница и next_cursor; ValueError (в том числе InvalidCursor) — на неверные параметры."""
+        return keyset_page(
+            queryset,
+            self.ordering,
+            cursor=params.get("cursor"),
+            limit=self.limit(params),
+            salt=self.salt,
+        )
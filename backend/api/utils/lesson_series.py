@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db.models import Q, QuerySet
+from django.db.models.fields.json import KT
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+# Поля LessonSeries, которые переносятся в каждое развёрнутое занятие
+LESSON_FIELDS = (
+    "course_id",
+    "subject",
+    "lesson_type",
+    "format",
+    "room_id",
+    "room_snapshot",
+    "teacher_id",
+    "teacher_snapshot",
+    "group_id",
+    "subgroup",
+    "links",
+    "notes",
+)
+
+
+def occurrence_id(series_id: str, day: date) -> str:
+    return f"{series_id}@{day.isoformat()}"
+
+
+def replaced_occurrence(series: Optional[dict]) -> Optional[Tuple[str, date]]:
+    """(серия, день) занятия, которое заменяет строка Lesson; None для обычных занятий."""
+    series = series if isinstance(series, dict) else {}
+    if not series.get("id") or not series.get("occurrence"):
+        return None
+    try:
+        return str(series["id"]), date.fromisoformat(str(series["occurrence"]))
+    except ValueError:
+        return None
+
+
+def _zone(name: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Неизвестный часовой пояс серии: %s", name)
+        return ZoneInfo("UTC")
+
+
+def occurrence_days(series: models.LessonSeries, first: date, last: date) -> Iterator[date]:
+    """Дни занятий серии в [first, last] с учётом interval_weeks, без exdates."""
+    first, last = max(first, series.starts_on), min(last, series.until)
+    if first > last:
+        return
+    # Чётность недель отсчитывается от недели начала серии
+    anchor = series.starts_on - timedelta(days=series.starts_on.weekday())
+    interval = max(series.interval_weeks or 1, 1)
+    days = []
+    for weekday in set(series.weekdays or ()):
+        if not 0 <= int(weekday) <= 6:
+            continue
+        day = first + timedelta(days=(int(weekday) - first.weekday()) % 7)
+        while day <= last:
+            if ((day - anchor).days // 7) % interval == 0:
+                days.append(day)
+            day += timedelta(days=7)
+    yield from sorted(days)
+
+
+def occurrence_bounds(series: models.LessonSeries, day: date) -> Tuple[datetime, datetime]:
+    starts_at = datetime.combine(day, series.start_time, _zone(series.time_zone)).astimezone(dt_timezone.utc)
+    return starts_at, starts_at + timedelta(minutes=series.duration_minutes)
+
+
+def occurrence(series: models.LessonSeries, day: date) -> models.Lesson:
+    """Несохраняемое занятие серии на день — сериализуется как обычный Lesson."""
+    starts_at, ends_at = occurrence_bounds(series, day)
+    lesson = models.Lesson(
+        id=occurrence_id(series.id, day),
+        starts_at=starts_at,
+        ends_at=ends_at,
+        status=models.LESSON_STATUS_SCHEDULED,
+        series={"id": series.id, "occurrence": day.isoformat()},
+        created_at=series.created_at,
+        updated_at=series.updated_at,
+        **{field: getattr(series, field) for field in LESSON_FIELDS},
+    )
+    # Связанные объекты уже загружены с серией (select_related)
+    for relation in ("course", "room", "teacher", "group"):
+        if getattr(series, f"{relation}_id") is not None and relation in series._state.fields_cache:
+            setattr(lesson, relation, getattr(series, relation))
+    return lesson
+
+
+def overlapping_series(date_from: datetime, date_to: datetime) -> QuerySet:
+    """Серии, действующие в окне; день берётся с запасом на часовые пояса."""
+    return models.LessonSeries.objects.filter(
+        starts_on__lte=(date_to + timedelta(days=1)).date(),
+        until__gte=(date_from - timedelta(days=1)).date(),
+    )
+
+
+def replacement_rows(series_ids: List[str]) -> QuerySet:
+    """
+    (серия, день) строк Lesson, заменяющих занятия серий.
+
+    Сравнение идёт по текстовой форме ключа (series ->> 'id'), по которой
+    построен api_lesson_series_idx; series__id__in сравнивал бы jsonb и
+    читал бы всю таблицу.
+    """
+    return (
+        models.Lesson.objects.annotate(series_key=KT("series__id"), series_day=KT("series__occurrence"))
+        .filter(series_key__in=series_ids)
+        .order_by()
+        .values_list("series_key", "series_day")
+    )
+
+
+def _replaced_occurrences(series_ids: List[str]) -> Set[Tuple[str, str]]:
+    """Занятия серий, вместо которых есть строка Lesson (перенос, отмена, замена)."""
+    if not series_ids:
+        return set()
+    return {(str(series_id), str(day)) for series_id, day in replacement_rows(series_ids) if series_id and day}
+
+
+def expand_series(
+    series_list: Iterable[models.LessonSeries],
+    date_from: datetime,
+    date_to: datetime,
+) -> List[models.Lesson]:
+    """
+    Развернуть серии в занятия с началом в [date_from, date_to).
+
+    Пропускаются даты из exdates и занятия, для которых есть строка-исключение
+    в Lesson, — сама эта строка попадает в выдачу вместе с обычными занятиями.
+    """
+    series_list = list(series_list)
+    replaced = _replaced_occurrences([series.id for series in series_list])
+    lessons: List[models.Lesson] = []
+    first, last = (date_from - timedelta(days=1)).date(), (date_to + timedelta(days=1)).date()
+    for series in series_list:
+        skipped = {str(day) for day in series.exdates or ()}
+        for day in occurrence_days(series, first, last):
+            key = day.isoformat()
+            if key in skipped or (series.id, key) in replaced:
+                continue
+            starts_at, _ = occurrence_bounds(series, day)
+            if date_from <= starts_at < date_to:
+                lessons.append(occurrence(series, day))
+    lessons.sort(key=lambda lesson: (lesson.starts_at, lesson.id))
+    return lessons
+
+
+def series_lessons(
+    date_from: datetime,
+    date_to: datetime,
+    *,
+    group_id: Optional[str] = None,
+    extra: Optional[Q] = None,
+    select_related: bool = False,
+) -> List[models.Lesson]:
+    queryset = overlapping_series(date_from, date_to)
+    if group_id is not None:
+        queryset = queryset.filter(group_id=group_id)
+    if extra is not None:
+        queryset = queryset.filter(extra)
+    if select_related:
+        queryset = queryset.select_related("teacher", "group", "room")
+    return expand_series(queryset, date_from, date_to)
+
+
+def merge_by_start(*sources: Iterable[models.Lesson]) -> List[models.Lesson]:
+    lessons = [lesson for source in sources for lesson in source]
+    lessons.sort(key=lambda lesson: (lesson.starts_at, lesson.id))
+    return lessons
+
+
+def feed_row(lesson: models.Lesson) -> Dict[str, object]:
+    """Занятие серии в форме Lesson.objects.values(*LESSON_FEED_FIELDS)."""
+    room = lesson.room if lesson.room_id else None
+    teacher = lesson.teacher if lesson.teacher_id else None
+    return {
+        "id": lesson.id,
+        "subject": lesson.subject,
+        "lesson_type": lesson.lesson_type,
+        "starts_at": lesson.starts_at,
+        "ends_at": lesson.ends_at,
+        "format": lesson.format,
+        "status": lesson.status,
+        "notes": lesson.notes,
+        "links": lesson.links,
+        "room_snapshot": lesson.room_snapshot,
+        "room__name": room.name if room else None,
+        "room__building": room.building if room else None,
+        "teacher__full_name": teacher.full_name if teacher else None,
+        "teacher_snapshot": lesson.teacher_snapshot,
+        "updated_at": lesson.updated_at,
+    }
+
+
+def series_weeks(group_id: Optional[str], starts_on: Optional[date], until: Optional[date]) -> Set[Tuple[str, date]]:
+    """Недели (с понедельника, UTC) группы, которые может задевать серия, — для пересборки снапшотов."""
+    if not group_id or not starts_on or not until or starts_on > until:
+        return set()
+    # Местное время занятия может попасть в соседний день UTC
+    first, last = starts_on - timedelta(days=1), until + timedelta(days=1)
+    week = first - timedelta(days=first.weekday())
+    weeks = set()
+    while week <= last:
+        weeks.add((group_id, week))
+        week += timedelta(days=7)
+    return weeks
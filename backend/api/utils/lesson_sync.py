@@ -0,0 +1,449 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .. import models
+from .schedule_changes import TRACKED_FIELDS, build_change, classify, record_changes, tracked_state
+from .schedule_provider import ScheduleProvider, weeks_between
+from .schedule_snapshots import WeekKey, invalidate_week_snapshots, week_of
+from .schedule_store import ensure_teacher_stubs
+from .schedule_version import bump_schedule_versions
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые приходят из API университета и сравниваются при синхронизации
+SYNCED_FIELDS = (
+    "subject",
+    "lesson_type",
+    "starts_at",
+    "ends_at",
+    "format",
+    "room_snapshot",
+    "teacher_id",
+    "teacher_snapshot",
+    "group_id",
+    "status",
+    "notes",
+    "links",
+    "updated_remote_at",
+)
+JSON_FIELDS = frozenset({"room_snapshot", "teacher_snapshot", "links", "cancel_info", "subgroup", "series", "replaces"})
+REMOVED_REASON = "removed_from_feed"
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    canceled: int = 0
+    unchanged: int = 0
+    # Созданные и изменённые занятия — для проверки пересечений
+    changed_ids: List[str] = field(default_factory=list)
+
+    def __iadd__(self, other: "SyncResult") -> "SyncResult":
+        self.created += other.created
+        self.updated += other.updated
+        self.canceled += other.canceled
+        self.unchanged += other.unchanged
+        self.changed_ids.extend(other.changed_ids)
+        return self
+
+
+def _plain(value: Any) -> Any:
+    """MappingProxyType/tuple из ScheduleStore -> обычные dict/list для JSONField."""
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _parse_remote_datetime(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    parsed = value if isinstance(value, datetime) else parse_datetime(str(value))
+    if parsed is not None and parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def lesson_fields(group_id: str, item: Mapping[str, Any]) -> Dict[str, Any]:
+    """Значения полей Lesson для занятия из API университета."""
+    teacher = _plain(item.get("teacher") or {})
+    return {
+        "subject": item.get("subject") or "",
+        "lesson_type": item.get("lesson_type") or "lecture",
+        "starts_at": _parse_remote_datetime(item["starts_at"]),
+        "ends_at": _parse_remote_datetime(item["ends_at"]),
+        "format": item.get("format") or "",
+        "room_snapshot": _plain(item.get("room") or {}),
+        "teacher_id": teacher.get("id") or None,
+        "teacher_snapshot": teacher,
+        "group_id": group_id,
+        "status": item.get("status") or models.LESSON_STATUS_SCHEDULED,
+        "notes": item.get("notes") or "",
+        "links": _plain(item.get("links") or {}),
+        "updated_remote_at": _parse_remote_datetime(item.get("updated_at") or item.get("updated_remote_at")),
+    }
+
+
+def fetch_remote_lessons(
+    provider: ScheduleProvider,
+    group_id: str,
+    date_from: datetime,
+    date_to: datetime,
+) -> List[Mapping[str, Any]]:
+    """
+    Занятия группы в окне из API университета, каждое один раз.
+
+    Провайдер может вернуть одно занятие дважды (например, фикстуры отдают
+    всё расписание группы на любую неделю), а повтор id ломает и сравнение,
+    и INSERT ... ON CONFLICT в COPY-загрузке.
+    """
+    items: List[Mapping[str, Any]] = []
+    seen: Set[Any] = set()
+    for item in provider.window(group_id, date_from, date_to):
+        lesson_id = item.get("id")
+        if lesson_id in seen:
+            continue
+        seen.add(lesson_id)
+        items.append(item)
+    return items
+
+
+def _removed_from_feed(row: Mapping[str, Any]) -> bool:
+    """Занятие отменено синхронизацией, а не университетом."""
+    return row["status"] == models.LESSON_STATUS_CANCELED and (row["cancel_info"] or {}).get("reason") == REMOVED_REASON
+
+
+def _changed(current: Dict[str, Any], incoming: Dict[str, Any]) -> bool:
+    if _removed_from_feed(current):
+        # Занятие вернулось в API — восстанавливаем, даже если updated_remote_at тот же
+        return True
+    remote_at = incoming["updated_remote_at"]
+    if remote_at is not None and current["updated_remote_at"] is not None:
+        # API сообщает время изменения — сравнение всех полей не нужно
+        return remote_at != current["updated_remote_at"]
+    return any(current[field] != incoming[field] for field in SYNCED_FIELDS)
+
+
+def _affected_weeks(group_id: str, starts: Iterable[datetime]) -> Set[WeekKey]:
+    return {(group_id, week_of(value)) for value in starts if value is not None}
+
+
+def sync_group(
+    provider: ScheduleProvider,
+    group_id: str,
+    date_from: datetime,
+    date_to: datetime,
+    *,
+    batch_size: int = 1000,
+    dry_run: bool = False,
+) -> SyncResult:
+    """
+    Сверить занятия группы в окне [date_from, date_to) с API университета.
+
+    Новые занятия вставляются bulk_create, изменённые (по updated_remote_at,
+    а без него — по значениям полей) обновляются bulk_update, пропавшие из
+    API — отменяются одним UPDATE на пачку. Пустой ответ API ничего не
+    отменяет, а отменённое синхронизацией занятие, вернувшееся в API,
+    восстанавливается.
+    """
+    remote = fetch_remote_lessons(provider, group_id, date_from, date_to)
+    incoming: Dict[str, Dict[str, Any]] = {}
+    # Занятия, которые есть в API, но не разобрались — не обновляются, но и не отменяются
+    unparsed: Set[str] = set()
+    for item in remote:
+        try:
+            incoming[item["id"]] = lesson_fields(group_id, item)
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Занятие %s группы %s пропущено: %s", item.get("id"), group_id, exc)
+            if item.get("id"):
+                unparsed.add(item["id"])
+
+    existing = {
+        row["id"]: row
+        for row in models.Lesson.objects.filter(
+            group_id=group_id, starts_at__gte=date_from, starts_at__lt=date_to
+        ).values("id", "cancel_info", "series", *SYNCED_FIELDS)
+    }
+    # Занятие могло переехать в окно из другой недели или группы
+    outside_ids = [lesson_id for lesson_id in incoming if lesson_id not in existing]
+    for row in models.Lesson.objects.filter(id__in=outside_ids).values("id", "cancel_info", "series", *SYNCED_FIELDS):
+        existing[row["id"]] = row
+
+    result = SyncResult()
+    to_create: List[models.Lesson] = []
+    to_update: List[models.Lesson] = []
+    touched_weeks: Set[WeekKey] = set()
+    touched_groups: Set[str] = {group_id}
+    for lesson_id, fields in incoming.items():
+        current = existing.get(lesson_id)
+        if current is None:
+            to_create.append(models.Lesson(id=lesson_id, **fields))
+            touched_weeks |= _affected_weeks(group_id, [fields["starts_at"]])
+            continue
+        if not _changed(current, fields):
+            result.unchanged += 1
+            continue
+        cancel_info = {} if _removed_from_feed(current) else current["cancel_info"]
+        to_update.append(models.Lesson(id=lesson_id, cancel_info=cancel_info, **fields))
+        touched_weeks |= _affected_weeks(group_id, [fields["starts_at"]])
+        if current["group_id"]:
+            touched_weeks |= _affected_weeks(current["group_id"], [current["starts_at"]])
+            touched_groups.add(current["group_id"])
+
+    to_cancel = [
+        row
+        for lesson_id, row in existing.items()
+        if lesson_id not in incoming
+        and lesson_id not in unparsed
+        and row["group_id"] == group_id
+        and row["status"] != models.LESSON_STATUS_CANCELED
+        # Переносы и отмены занятий серий ведутся у нас, в API университета их нет
+        and not (row["series"] or {}).get("id")
+    ]
+    if to_cancel and not remote:
+        # Пустой ответ при занятиях в окне — скорее сбой выгрузки (или 404), чем отмена всего окна
+        logger.warning("API вернуло пустое расписание группы %s, отмена %s занятий пропущена.", group_id, len(to_cancel))
+        to_cancel = []
+    touched_weeks |= _affected_weeks(group_id, [row["starts_at"] for row in to_cancel])
+
+    result.created, result.updated, result.canceled = len(to_create), len(to_update), len(to_cancel)
+    result.changed_ids = [lesson.id for lesson in (*to_create, *to_update)]
+    if dry_run or not (to_create or to_update or to_cancel):
+        return result
+
+    ensure_teacher_stubs(remote)
+    now = timezone.now()
+    cancel_info = {"reason": REMOVED_REASON, "canceled_at": now.isoformat()}
+    changes = [
+        build_change(models.ScheduleChange.KIND_CREATED, lesson.id, group_id, tracked_state(lesson.__dict__), now=now)
+        for lesson in to_create
+    ]
+    for lesson in to_update:
+        old, new = tracked_state(existing[lesson.id]), tracked_state(lesson.__dict__)
+        changes.append(build_change(classify(old, new), lesson.id, lesson.group_id, new, old, now=now))
+    for row in to_cancel:
+        old = tracked_state(row)
+        new = {**old, "status": models.LESSON_STATUS_CANCELED, "cancel_info": cancel_info}
+        changes.append(build_change(models.ScheduleChange.KIND_CANCELED, row["id"], group_id, new, old, now=now))
+
+    with transaction.atomic():
+        models.Lesson.objects.bulk_create(to_create, batch_size=batch_size)
+        for lesson in to_update:
+            lesson.updated_at = now
+        models.Lesson.objects.bulk_update(to_update, [*SYNCED_FIELDS, "cancel_info", "updated_at"], batch_size=batch_size)
+        cancel_ids = [row["id"] for row in to_cancel]
+        for offset in range(0, len(cancel_ids), batch_size):
+            models.Lesson.objects.filter(id__in=cancel_ids[offset : offset + batch_size]).update(
+                status=models.LESSON_STATUS_CANCELED,
+                cancel_info=cancel_info,
+                updated_at=now,
+            )
+        # Массовые операции сигналов не шлют — версии, снапшоты и ленту изменений обновляем сами
+        bump_schedule_versions(touched_groups)
+        invalidate_week_snapshots(touched_weeks)
+        record_changes(changes)
+    return result
+
+
+COPY_COLUMNS = ("id", "created_at", "updated_at", "cancel_info", "subgroup", "series", "replaces", *SYNCED_FIELDS)
+
+
+def _copy_value(column: str, value: Any) -> Any:
+    if value is None:
+        return r"\N"
+    if column in JSON_FIELDS:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _returned_changes(rows: Iterable[tuple], now: datetime) -> List[Optional[models.ScheduleChange]]:
+    """
+    События ленты из строк (id, group_id, inserted, старый group_id,
+    *новые TRACKED_FIELDS, *старые TRACKED_FIELDS).
+
+    Старые значения берутся из api_lesson в том же запросе, что и изменение:
+    основной SELECT видит снимок таблицы до изменения в WITH.
+    """
+    width = len(TRACKED_FIELDS)
+    changes = []
+    for lesson_id, group_id, inserted, _, *values in rows:
+        values = [
+            json.loads(value) if field in JSON_FIELDS and isinstance(value, str) else value
+            for field, value in zip(TRACKED_FIELDS * 2, values)
+        ]
+        new = dict(zip(TRACKED_FIELDS, values[:width]))
+        old = None if inserted else dict(zip(TRACKED_FIELDS, values[width:]))
+        changes.append(build_change(classify(old, new), lesson_id, group_id, new, old, now=now))
+    return changes
+
+
+def _returned_weeks(rows: Iterable[tuple]) -> Set[WeekKey]:
+    """Недели до и после изменения — занятие могло переехать в другую группу или неделю."""
+    starts = TRACKED_FIELDS.index("starts_at")
+    weeks: Set[WeekKey] = set()
+    for _, group_id, _, previous_group_id, *values in rows:
+        weeks |= _affected_weeks(group_id, [values[starts]])
+        if previous_group_id:
+            weeks |= _affected_weeks(previous_group_id, [values[len(TRACKED_FIELDS) + starts]])
+    return weeks
+
+
+def copy_sync_groups(
+    provider: ScheduleProvider,
+    group_ids: List[str],
+    date_from: datetime,
+    date_to: datetime,
+) -> SyncResult:
+    """
+    Полная загрузка семестра через COPY во временную таблицу (только PostgreSQL).
+
+    Сравнение и применение изменений выполняются в БД: INSERT ... ON CONFLICT
+    обновляет только строки с другим updated_remote_at (или без него),
+    занятия, пропавшие из API, отменяются одним UPDATE.
+    """
+    if connection.vendor != "postgresql":
+        raise RuntimeError("COPY-загрузка доступна только для PostgreSQL.")
+
+    now = timezone.now()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    remote_items: List[Mapping[str, Any]] = []
+    unparsed: List[str] = []
+    seen: Set[str] = set()
+    rows = 0
+    # Группы с пустым ответом API не отменяются целиком — см. sync_group
+    cancel_groups: List[str] = []
+    for group_id in group_ids:
+        items = fetch_remote_lessons(provider, group_id, date_from, date_to)
+        if items:
+            cancel_groups.append(group_id)
+        else:
+            logger.warning("API вернуло пустое расписание группы %s, отмена занятий пропущена.", group_id)
+        remote_items.extend(items)
+        for item in items:
+            try:
+                fields = lesson_fields(group_id, item)
+            except (KeyError, TypeError, ValueError) as exc:
+                logger.warning("Занятие %s группы %s пропущено: %s", item.get("id"), group_id, exc)
+                if item.get("id"):
+                    unparsed.append(item["id"])
+                continue
+            if item["id"] in seen:
+                # Одно занятие у двух групп: ON CONFLICT не может обновить строку дважды
+                logger.warning("Занятие %s повторяется в выгрузке группы %s, пропущено.", item["id"], group_id)
+                continue
+            seen.add(item["id"])
+            values = {
+                "id": item["id"],
+                "created_at": now,
+                "updated_at": now,
+                "cancel_info": {},
+                "subgroup": {},
+                "series": {},
+                "replaces": {},
+                **fields,
+            }
+            writer.writerow([_copy_value(column, values[column]) for column in COPY_COLUMNS])
+            rows += 1
+    buffer.seek(0)
+    ensure_teacher_stubs(remote_items)
+
+    columns = ", ".join(COPY_COLUMNS)
+    compared = [field for field in SYNCED_FIELDS if field != "updated_remote_at"]
+    assignments = ", ".join(f"{field} = EXCLUDED.{field}" for field in (*SYNCED_FIELDS, "updated_at"))
+    # Занятие, отменённое синхронизацией, вернулось в API — сбрасываем cancel_info
+    removed = "(api_lesson.status = %s AND api_lesson.cancel_info ->> 'reason' = %s)"
+    assignments += f", cancel_info = CASE WHEN {removed} THEN EXCLUDED.cancel_info ELSE api_lesson.cancel_info END"
+    distinct = " OR ".join(f"api_lesson.{field} IS DISTINCT FROM EXCLUDED.{field}" for field in compared)
+    tracked_new = ", ".join(f"changed.{field}" for field in TRACKED_FIELDS)
+    tracked_old = ", ".join(f"previous.{field}" for field in TRACKED_FIELDS)
+    returning = ", ".join(("id", "group_id", *TRACKED_FIELDS))
+    result = SyncResult()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TEMP TABLE lesson_sync_staging (LIKE api_lesson INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cursor.copy_expert(
+            f"COPY lesson_sync_staging ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        cursor.execute("ANALYZE lesson_sync_staging")
+        cursor.execute(
+            f"""
+            WITH changed AS (
+                INSERT INTO api_lesson ({columns})
+                SELECT {columns} FROM lesson_sync_staging
+                ON CONFLICT (id) DO UPDATE SET {assignments}
+                WHERE (EXCLUDED.updated_remote_at IS NOT NULL AND api_lesson.updated_remote_at IS NOT NULL
+                       AND api_lesson.updated_remote_at IS DISTINCT FROM EXCLUDED.updated_remote_at)
+                   OR ((EXCLUDED.updated_remote_at IS NULL OR api_lesson.updated_remote_at IS NULL) AND ({distinct}))
+                   OR {removed}
+                RETURNING {returning}, (xmax = 0) AS inserted
+            )
+            SELECT changed.id, changed.group_id, changed.inserted, previous.group_id, {tracked_new}, {tracked_old}
+            FROM changed LEFT JOIN api_lesson previous ON previous.id = changed.id
+            """,
+            [models.LESSON_STATUS_CANCELED, REMOVED_REASON] * 2,
+        )
+        changed_rows = cursor.fetchall()
+        for lesson_id, _, inserted, *_ in changed_rows:
+            result.changed_ids.append(lesson_id)
+            if inserted:
+                result.created += 1
+            else:
+                result.updated += 1
+        result.unchanged = rows - result.created - result.updated
+        changes = _returned_changes(changed_rows, now)
+
+        cursor.execute(
+            f"""
+            WITH changed AS (
+                UPDATE api_lesson SET status = %s, cancel_info = %s::jsonb, updated_at = %s
+                WHERE group_id = ANY(%s) AND starts_at >= %s AND starts_at < %s AND status <> %s
+                  AND NOT (series ? 'id')
+                  AND NOT EXISTS (SELECT 1 FROM lesson_sync_staging s WHERE s.id = api_lesson.id)
+                  AND NOT (api_lesson.id = ANY(%s))
+                RETURNING {returning}
+            )
+            SELECT changed.id, changed.group_id, FALSE, previous.group_id, {tracked_new}, {tracked_old}
+            FROM changed JOIN api_lesson previous ON previous.id = changed.id
+            """,
+            [
+                models.LESSON_STATUS_CANCELED,
+                json.dumps({"reason": REMOVED_REASON, "canceled_at": now.isoformat()}),
+                now,
+                cancel_groups,
+                date_from,
+                date_to,
+                models.LESSON_STATUS_CANCELED,
+                unparsed,
+            ],
+        )
+        canceled_rows = cursor.fetchall()
+        result.canceled = len(canceled_rows)
+        changes.extend(_returned_changes(canceled_rows, now))
+        record_changes(changes)
+
+        if result.created or result.updated or result.canceled:
+            # Занятие могло уйти из другой группы — её версию и снапшоты тоже обновляем
+            touched_weeks = _returned_weeks(changed_rows)
+            bump_schedule_versions({*group_ids, *(group_id for group_id, _ in touched_weeks)})
+            weeks = weeks_between(date_from, date_to)
+            touched_weeks.update((group_id, week) for group_id in group_ids for week in weeks)
+            invalidate_week_snapshots(touched_weeks)
+    return result
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import math
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .. import models
+from .elective_catalog import touch_courses
+
+# В агрегаты попадают только прошедшие модерацию отзывы
+COUNTED_STATUSES = frozenset({models.TeacherFeedback.STATUS_ACCEPTED})
+TOP_TAGS = 5
+
+RollupKey = Tuple[str, str, str]
+
+
+class FeedbackState(NamedTuple):
+    key: RollupKey
+    rating: int
+    tags: Tuple[str, ...]
+
+
+def feedback_state(values: Mapping[str, Any]) -> Optional[FeedbackState]:
+    """Вклад отзыва в агрегат; None, если отзыв не учитывается (или поля не загружены)."""
+    if values.get("status") not in COUNTED_STATUSES or not values.get("rating"):
+        return None
+    if not values.get("teacher_id") or not values.get("course_id"):
+        return None
+    tags = values.get("tags") or ()
+    return FeedbackState(
+        key=(values["teacher_id"], values["course_id"], values.get("period") or ""),
+        rating=int(values["rating"]),
+        tags=tuple(str(tag) for tag in tags if tag) if isinstance(tags, (list, tuple)) else (),
+    )
+
+
+def _apply(state: FeedbackState, sign: int) -> None:
+    teacher_id, course_id, period = state.key
+    rollup, _ = models.TeacherRatingRollup.objects.select_for_update().get_or_create(
+        teacher_id=teacher_id, course_id=course_id, period=period
+    )
+    rollup.count += sign
+    rollup.rating_sum += sign * state.rating
+    rollup.rating_squares += sign * state.rating * state.rating
+    tags = Counter(rollup.tags or {})
+    for tag in state.tags:
+        tags[tag] += sign
+    rollup.tags = {tag: total for tag, total in tags.items() if total > 0}
+    if rollup.count <= 0:
+        rollup.delete()
+    else:
+        rollup.save()
+
+
+def apply_feedback_change(old: Optional[FeedbackState], new: Optional[FeedbackState]) -> None:
+    """
+    Инкрементально обновить агрегаты: вычесть старый вклад отзыва, добавить новый.
+
+    Строка агрегата блокируется на время изменения; вызывается в транзакции
+    сохранения отзыва, поэтому агрегат и отзыв фиксируются вместе.
+    """
+    if old == new:
+        return
+    with transaction.atomic():
+        # Одинаковый порядок блокировок для двух ключей, чтобы не ловить дедлоки
+        changes = sorted(
+            [(state, sign) for state, sign in ((old, -1), (new, 1)) if state is not None],
+            key=lambda change: change[0].key,
+        )
+        for state, sign in changes:
+            _apply(state, sign)
+        # Каталог элективов версионируется по updated_at курсов
+        touch_courses(models.AcademicCourse.objects.filter(id__in={state.key[1] for state, _ in changes}))
+
+
+def summarize(rollups: Iterable[models.TeacherRatingRollup]) -> Optional[Dict[str, Any]]:
+    """Среднее, число оценок, стандартное отклонение и частые теги по набору агрегатов."""
+    count = total = squares = 0
+    tags: Counter = Counter()
+    for rollup in rollups:
+        count += rollup.count
+        total += rollup.rating_sum
+        squares += rollup.rating_squares
+        tags.update(rollup.tags or {})
+    if count <= 0:
+        return None
+    avg = total / count
+    return {
+        "avg": round(avg, 2),
+        "count": count,
+        "stddev": round(math.sqrt(max(squares / count - avg * avg, 0.0)), 2),
+        "tags": dict(tags.most_common(TOP_TAGS)),
+    }
+
+
+def summarize_by_teacher(rollups: Iterable[models.TeacherRatingRollup]) -> Dict[str, Dict[str, Any]]:
+    grouped: Dict[str, List[models.TeacherRatingRollup]] = defaultdict(list)
+    for rollup in rollups:
+        grouped[rollup.teacher_id].append(rollup)
+    return {teacher_id: summarize(items) for teacher_id, items in grouped.items()}
+
+
+def rebuild_rollups(*, chunk_size: int = 5000) -> int:
+    """
+    Пересчитать все агрегаты по отзывам — для первичного заполнения
+    и после массовых операций, которые не шлют сигналы.
+    """
+    counted = models.TeacherFeedback.objects.filter(status__in=COUNTED_STATUSES, rating__isnull=False).order_by()
+    rows = counted.values("teacher_id", "course_id", "period").annotate(
+        total_count=Count("id"),
+        total_sum=Sum("rating"),
+        total_squares=Sum(F("rating") * F("rating")),
+    )
+    rollups: Dict[RollupKey, models.TeacherRatingRollup] = {
+        (row["teacher_id"], row["course_id"], row["period"]): models.TeacherRatingRollup(
+            teacher_id=row["teacher_id"],
+            course_id=row["course_id"],
+            period=row["period"],
+            count=row["total_count"],
+            rating_sum=row["total_sum"],
+            rating_squares=row["total_squares"],
+        )
+        for row in rows
+    }
+    tags: Dict[RollupKey, Counter] = defaultdict(Counter)
+    for teacher_id, course_id, period, values in counted.values_list(
+        "teacher_id", "course_id", "period", "tags"
+    ).iterator(chunk_size=chunk_size):
+        if isinstance(values, list):
+            tags[(teacher_id, course_id, period)].update(str(tag) for tag in values if tag)
+    for key, rollup in rollups.items():
+        rollup.tags = dict(tags.get(key, {}))
+
+    with transaction.atomic():
+        previous = set(models.TeacherRatingRollup.objects.values_list("course_id", flat=True).distinct())
+        models.TeacherRatingRollup.objects.all().delete()
+        models.TeacherRatingRollup.objects.bulk_create(rollups.values(), batch_size=1000)
+        touch_courses(models.AcademicCourse.objects.filter(id__in=previous | {key[1] for key in rollups}))
+    return len(rollups)
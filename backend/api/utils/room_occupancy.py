@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .. import models
+from ..serializers import ClassroomSerializer
+from .lesson_series import occurrence_id, replaced_occurrence, series_lessons
+from .schedule_conflicts import room_key
+
+logger = logging.getLogger(__name__)
+
+LESSON_COLUMNS = ("id", "starts_at", "ends_at", "room_id", "room_snapshot", "status", "series", "updated_at")
+
+# Запас на рассинхрон часов и долгие транзакции при выборке изменений по updated_at
+DELTA_OVERLAP = timedelta(seconds=5)
+
+
+@dataclass(frozen=True)
+class RoomInfo:
+    id: str
+    name: str
+    building: str
+    campus_id: Optional[str]
+    campus_title: str
+    capacity: Optional[int]
+    payload: Mapping[str, Any] = field(compare=False)
+
+    @property
+    def keys(self) -> Tuple[str, ...]:
+        """Ключи room_key(), под которыми аудитория встречается в room_snapshot."""
+        name = self.name.strip().lower()
+        places = {self.campus_title.strip().lower(), self.building.strip().lower()} - {""}
+        return tuple(f"{place}/{name}" for place in sorted(places))
+
+
+class _RoomTimeline:
+    """
+    Занятия одной аудитории: начала отсортированы, к ним — префиксный максимум
+    концов. Аудитория занята в [a, b), если среди занятий, начавшихся до b,
+    самое позднее окончание больше a, — это один bisect.
+    """
+
+    __slots__ = ("intervals", "starts", "max_ends", "dirty")
+
+    def __init__(self) -> None:
+        self.intervals: List[Tuple[int, int, str]] = []
+        self.starts = array("q")
+        self.max_ends = array("q")
+        self.dirty = False
+
+    def add(self, start: int, end: int, lesson_id: str) -> None:
+        insort(self.intervals, (start, end, lesson_id))
+        self.dirty = True
+
+    def remove(self, start: int, end: int, lesson_id: str) -> None:
+        index = bisect_left(self.intervals, (start, end, lesson_id))
+        if index < len(self.intervals) and self.intervals[index] == (start, end, lesson_id):
+            del self.intervals[index]
+            self.dirty = True
+
+    def _compact(self) -> None:
+        self.starts = array("q", (start for start, _, _ in self.intervals))
+        self.max_ends = array("q")
+        latest = 0
+        for _, end, _ in self.intervals:
+            latest = max(latest, end)
+            self.max_ends.append(latest)
+        self.dirty = False
+
+    def busy(self, start: int, end: int) -> bool:
+        if self.dirty:
+            self._compact()
+        index = bisect_left(self.starts, end)
+        return index > 0 and self.max_ends[index - 1] > start
+
+
+class RoomOccupancyIndex:
+    """
+    Занятость аудиторий в памяти процесса за окно [covered_from, covered_to).
+
+    Занятие привязывается к Classroom по FK, а занятия из API университета —
+    по названию и корпусу из room_snapshot. Отменённые занятия аудиторию
+    не занимают.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.rooms: Dict[str, RoomInfo] = {}
+        self.room_by_key: Dict[str, str] = {}
+        self.timelines: Dict[str, _RoomTimeline] = {}
+        self.lessons: Dict[str, Tuple[str, int, int]] = {}
+        self.covered_from: Optional[datetime] = None
+        self.covered_to: Optional[datetime] = None
+
+    # ------------------------------------------------------------------ изменение
+
+    def set_rooms(self, rooms: Iterable[RoomInfo]) -> None:
+        with self.lock:
+            self.rooms = {room.id: room for room in rooms}
+            by_key: Dict[str, str] = {}
+            by_name: Dict[str, Set[str]] = {}
+            for room in self.rooms.values():
+                for key in room.keys:
+                    by_key.setdefault(key, room.id)
+                by_name.setdefault(room.name.strip().lower(), set()).add(room.id)
+            # Снимок без корпуса («Zoom», «Аудитория 101») — только если имя однозначно
+            for name, room_ids in by_name.items():
+                if len(room_ids) == 1:
+                    by_key.setdefault(f"/{name}", next(iter(room_ids)))
+            self.room_by_key = by_key
+
+    def resolve_room(self, room_id: Optional[object], snapshot: Optional[Mapping]) -> Optional[str]:
+        if room_id:
+            return str(room_id)
+        key = room_key(None, snapshot)
+        return self.room_by_key.get(key) if key else None
+
+    def discard(self, lesson_id: str) -> None:
+        with self.lock:
+            placed = self.lessons.pop(lesson_id, None)
+            if placed is not None:
+                room_id, start, end = placed
+                self.timelines[room_id].remove(start, end, lesson_id)
+
+    def apply(
+        self,
+        lesson_id: str,
+        starts_at: Optional[datetime],
+        ends_at: Optional[datetime],
+        room_id: Optional[object],
+        snapshot: Optional[Mapping],
+        status: str,
+    ) -> None:
+        """Учесть новое состояние занятия (создание, перенос, отмена)."""
+        with self.lock:
+            self.discard(lesson_id)
+            if status == models.LESSON_STATUS_CANCELED or not starts_at or not ends_at or ends_at <= starts_at:
+                return
+            if self.covered_from is not None and (ends_at <= self.covered_from or starts_at >= self.covered_to):
+                return
+            resolved = self.resolve_room(room_id, snapshot)
+            if resolved is None:
+                return
+            start, end = int(starts_at.timestamp()), int(ends_at.timestamp())
+            self.timelines.setdefault(resolved, _RoomTimeline()).add(start, end, lesson_id)
+            self.lessons[lesson_id] = (resolved, start, end)
+
+    # ------------------------------------------------------------------ запросы
+
+    def covers(self, date_from: datetime, date_to: datetime) -> bool:
+        return (
+            self.covered_from is not None
+            and self.covered_from <= date_from
+            and date_to <= self.covered_to
+        )
+
+    def candidates(
+        self,
+        *,
+        campus_id: Optional[str] = None,
+        building: Optional[str] = None,
+        min_capacity: Optional[int] = None,
+    ) -> List[RoomInfo]:
+        building = (building or "").strip().lower()
+        return [
+            room
+            for room in self.rooms.values()
+            if (not campus_id or room.campus_id == campus_id)
+            and (not building or room.building.strip().lower() == building)
+            and (not min_capacity or (room.capacity or 0) >= min_capacity)
+        ]
+
+    def free_rooms(self, date_from: datetime, date_to: datetime, **filters: Any) -> List[RoomInfo]:
+        start, end = int(date_from.timestamp()), int(date_to.timestamp())
+        with self.lock:
+            free = [
+                room
+                for room in self.candidates(**filters)
+                if room.id not in self.timelines or not self.timelines[room.id].busy(start, end)
+            ]
+        free.sort(key=lambda room: (room.campus_title, room.building, room.name))
+        return free
+
+
+def load_rooms() -> List[RoomInfo]:
+    rooms = list(models.Classroom.objects.select_related("campus"))
+    return [
+        RoomInfo(
+            id=str(room.id),
+            name=room.name,
+            building=room.building or "",
+            campus_id=str(room.campus_id) if room.campus_id else None,
+            campus_title=room.campus.title if room.campus else "",
+            capacity=room.capacity,
+            payload=data,
+        )
+        for room, data in zip(rooms, ClassroomSerializer(rooms, many=True).data)
+    ]
+
+
+class LiveRoomOccupancy:
+    """
+    Индекс, который сам поддерживает себя в актуальном состоянии.
+
+    Изменения Lesson в этом процессе применяются сигналами после коммита;
+    изменения из других процессов (синхронизация, соседние воркеры)
+    подтягиваются раз в refresh_interval по updated_at. Удаления из других
+    процессов и сдвиг окна обрабатываются полной пересборкой раз
+    в rebuild_interval, изменение любой серии занятий — внеочередной.
+    """
+
+    def __init__(
+        self,
+        *,
+        past_days: int = 1,
+        future_days: int = 14,
+        refresh_interval: float = 30,
+        rebuild_interval: float = 900,
+        timer=time.monotonic,
+    ) -> None:
+        self.past_days = past_days
+        self.future_days = future_days
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.timer = timer
+        self.index = RoomOccupancyIndex()
+        self.synced_at: Optional[datetime] = None
+        self.refreshed_at = 0.0
+        self.rebuilt_at: Optional[float] = None
+        self.series_checked_at: Optional[datetime] = None
+        self.refresh_lock = threading.Lock()
+
+    def _apply_rows(self, index: RoomOccupancyIndex, rows: Iterable[Sequence]) -> Optional[datetime]:
+        """Применить строки Lesson к индексу; возвращает наибольший updated_at среди них."""
+        latest: Optional[datetime] = None
+        for lesson_id, starts_at, ends_at, room_id, snapshot, status, series, updated_at in rows:
+            index.apply(lesson_id, starts_at, ends_at, room_id, snapshot, status)
+            # Строка-исключение заменяет собой занятие серии
+            replaced = replaced_occurrence(series)
+            if replaced:
+                index.discard(occurrence_id(*replaced))
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+        return latest
+
+    def mark_stale(self) -> None:
+        self.rebuilt_at = None
+
+    def rebuild(self) -> None:
+        now = timezone.now()
+        index = RoomOccupancyIndex()
+        index.set_rooms(load_rooms())
+        index.covered_from = now - timedelta(days=self.past_days)
+        index.covered_to = now + timedelta(days=self.future_days)
+        rows = (
+            models.Lesson.objects.exclude(status=models.LESSON_STATUS_CANCELED)
+            .filter(starts_at__lt=index.covered_to, ends_at__gt=index.covered_from)
+            .order_by()
+            .values_list(*LESSON_COLUMNS)
+            .iterator(chunk_size=5000)
+        )
+        # Новый индекс собирается целиком и только потом подменяет текущий,
+        # поэтому читатели не видят его наполовину заполненным
+        self._apply_rows(index, rows)
+        for lesson in series_lessons(index.covered_from - timedelta(days=1), index.covered_to):
+            index.apply(lesson.id, lesson.starts_at, lesson.ends_at, lesson.room_id, lesson.room_snapshot, lesson.status)
+        # Дозагрузка изменений начинается с момента начала пересборки, даже если занятий не нашлось:
+        # всё, что изменилось во время чтения, придёт следующим refresh()
+        self.index, self.synced_at = index, now
+        self.series_checked_at = now
+        self.rebuilt_at = self.refreshed_at = self.timer()
+        logger.info("Индекс занятости аудиторий: %s аудиторий, %s занятий", len(index.rooms), len(index.lessons))
+
+    def refresh(self) -> None:
+        """Подтянуть изменения Lesson и Classroom с прошлого обновления."""
+        if self.series_checked_at is not None and models.LessonSeries.objects.filter(
+            updated_at__gte=self.series_checked_at - DELTA_OVERLAP
+        ).exists():
+            self.rebuild()
+            return
+        since = self.synced_at
+        if since is not None:
+            rows = (
+                models.Lesson.objects.filter(updated_at__gte=since - DELTA_OVERLAP)
+                .order_by()
+                .values_list(*LESSON_COLUMNS)
+            )
+            latest = self._apply_rows(self.index, rows)
+            if latest is not None and latest > since:
+                self.synced_at = latest
+        self.index.set_rooms(load_rooms())
+        self.refreshed_at = self.timer()
+
+    def ensure_fresh(self) -> RoomOccupancyIndex:
+        now = self.timer()
+        if self.rebuilt_at is not None and now - self.refreshed_at < self.refresh_interval:
+            return self.index
+        with self.refresh_lock:
+            now = self.timer()
+            if self.rebuilt_at is None or now - self.rebuilt_at >= self.rebuild_interval:
+                self.rebuild()
+            elif now - self.refreshed_at >= self.refresh_interval:
+                self.refresh()
+        return self.index
+
+
+_occupancy: Optional[LiveRoomOccupancy] = None
+_occupancy_lock = threading.Lock()
+
+
+def get_room_occupancy() -> LiveRoomOccupancy:
+    global _occupancy
+    if _occupancy is None:
+        with _occupancy_lock:
+            if _occupancy is None:
+                _occupancy = LiveRoomOccupancy(
+                    past_days=getattr(settings, "ROOM_OCCUPANCY_PAST_DAYS", 1),
+                    future_days=getattr(settings, "ROOM_OCCUPANCY_FUTURE_DAYS", 14),
+                    refresh_interval=getattr(settings, "ROOM_OCCUPANCY_REFRESH_INTERVAL", 30),
+                    rebuild_interval=getattr(settings, "ROOM_OCCUPANCY_REBUILD_INTERVAL", 900),
+                )
+    return _occupancy
+
+
+def reset_room_occupancy() -> None:
+    global _occupancy
+    with _occupancy_lock:
+        _occupancy = None
+
+
+def lesson_changed(lesson: models.Lesson) -> None:
+    """Обновить индекс этого процесса после коммита изменения занятия."""
+    occupancy = _occupancy
+    if occupancy is None or occupancy.rebuilt_at is None:
+        return
+    values = (lesson.id, lesson.starts_at, lesson.ends_at, lesson.room_id, lesson.room_snapshot, lesson.status)
+    replaced = replaced_occurrence(lesson.series)
+
+    def apply() -> None:
+        occupancy.index.apply(*values)
+        if replaced:
+            occupancy.index.discard(occurrence_id(*replaced))
+
+    transaction.on_commit(apply)
+
+
+def series_changed() -> None:
+    """Серия меняет занятия на весь семестр — индекс этого процесса пересобирается целиком."""
+    occupancy = _occupancy
+    if occupancy is not None:
+        transaction.on_commit(occupancy.mark_stale)
+
+
+def lesson_deleted(lesson_id: str) -> None:
+    occupancy = _occupancy
+    if occupancy is None:
+        return
+    transaction.on_commit(lambda: occupancy.index.discard(lesson_id))
+
+
+def find_free_rooms(date_from: datetime, date_to: datetime, **filters: Any) -> List[RoomInfo]:
+    """
+    Свободные аудитории в [date_from, date_to).
+
+    Окна внутри индекса отвечаются из памяти; для далёких дат занятые
+    аудитории выбираются одним запросом по индексу starts_at, а занятия
+    серий разворачиваются на это окно.
+    """
+    index = get_room_occupancy().ensure_fresh()
+    if index.covers(date_from, date_to):
+        return index.free_rooms(date_from, date_to, **filters)
+
+    rows = (
+        models.Lesson.objects.exclude(status=models.LESSON_STATUS_CANCELED)
+        .filter(starts_at__lt=date_to, ends_at__gt=date_from)
+        .order_by()
+        .values_list("room_id", "room_snapshot")
+    )
+    busy = {index.resolve_room(room_id, snapshot) for room_id, snapshot in rows}
+    busy.update(
+        index.resolve_room(lesson.room_id, lesson.room_snapshot)
+        for lesson in series_lessons(date_from - timedelta(days=1), date_to)
+        if lesson.starts_at < date_to and lesson.ends_at > date_from
+    )
+    free = [room for room in index.candidates(**filters) if room.id not in busy]
+    free.sort(key=lambda room: (room.campus_title, room.building, room.name))
+    return free
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .. import models
+from .keyset import InvalidCursor, after, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Поля Lesson, изменение которых попадает в ленту
+TRACKED_FIELDS = (
+    "subject",
+    "starts_at",
+    "ends_at",
+    "status",
+    "format",
+    "room_id",
+    "room_snapshot",
+    "teacher_id",
+    "replaces",
+    "cancel_info",
+)
+CHANGES_ORDERING = ("xact_id", "id")
+CHANGES_CURSOR_SALT = "api.schedule_changes"
+CHANGES_FIELDS = ("id", "lesson_id", "kind", "starts_at", "previous_starts_at", "changed_at", "payload")
+# Транзакции младше этой ещё могут быть не зафиксированы
+_COMMITTED_HORIZON = "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+# Поля, которые показываются в ленте, но сами по себе изменением не считаются
+CONTEXT_FIELDS = ("subject",)
+
+KIND_LABELS = {
+    models.ScheduleChange.KIND_CREATED: "добавлено",
+    models.ScheduleChange.KIND_RESCHEDULED: "перенесено",
+    models.ScheduleChange.KIND_CANCELED: "отменено",
+    models.ScheduleChange.KIND_RESTORED: "снова в расписании",
+    models.ScheduleChange.KIND_UPDATED: "изменено",
+    models.ScheduleChange.KIND_DELETED: "удалено",
+    models.ScheduleChange.KIND_SERIES: "изменено расписание на семестр",
+}
+
+
+def tracked_state(values: Mapping[str, Any]) -> Dict[str, Any]:
+    return {field: values[field] for field in TRACKED_FIELDS if field in values}
+
+
+def classify(old: Optional[Mapping[str, Any]], new: Mapping[str, Any]) -> Optional[str]:
+    """Вид изменения занятия; None, если отслеживаемые поля не менялись."""
+    if old is None:
+        return models.ScheduleChange.KIND_CREATED
+    changed = {
+        field for field in TRACKED_FIELDS if field in old and field in new and old[field] != new[field]
+    } - set(CONTEXT_FIELDS)
+    if not changed:
+        return None
+    old_status, new_status = old.get("status"), new.get("status")
+    if "status" in changed and new_status == models.LESSON_STATUS_CANCELED:
+        return models.ScheduleChange.KIND_CANCELED
+    if "status" in changed and old_status == models.LESSON_STATUS_CANCELED:
+        return models.ScheduleChange.KIND_RESTORED
+    if changed & {"starts_at", "ends_at"} or ("status" in changed and new_status == models.LESSON_STATUS_RESCHEDULED):
+        return models.ScheduleChange.KIND_RESCHEDULED
+    return models.ScheduleChange.KIND_UPDATED
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Mapping):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _horizon() -> timedelta:
+    return timedelta(days=getattr(settings, "SCHEDULE_CHANGES_HORIZON_DAYS", 14))
+
+
+def build_change(
+    kind: Optional[str],
+    lesson_id: str,
+    group_id: Optional[str],
+    new: Mapping[str, Any],
+    old: Optional[Mapping[str, Any]] = None,
+    *,
+    now: Optional[datetime] = None,
+) -> Optional[models.ScheduleChange]:
+    """
+    Событие ленты или None, если сообщать не о чем.
+
+    Прошедшие занятия в ленту не попадают; о новых занятиях сообщаем только
+    в пределах SCHEDULE_CHANGES_HORIZON_DAYS, чтобы загрузка семестра
+    не превращалась в тысячи уведомлений.
+    """
+    if kind is None or not group_id:
+        return None
+    now = now or timezone.now()
+    starts_at = new.get("starts_at")
+    previous = (old or {}).get("starts_at")
+    if not any(value and value >= now for value in (starts_at, previous)):
+        return None
+    if kind == models.ScheduleChange.KIND_CREATED and starts_at and starts_at > now + _horizon():
+        return None
+
+    payload = {field: _plain(new[field]) for field in TRACKED_FIELDS if field in new}
+    if old is not None:
+        payload["previous"] = {
+            field: _plain(old[field])
+            for field in TRACKED_FIELDS
+            if field in old and field in new and old[field] != new[field]
+        }
+    return models.ScheduleChange(
+        group_id=group_id,
+        lesson_id=lesson_id,
+        kind=kind,
+        starts_at=starts_at,
+        previous_starts_at=previous if previous != starts_at else None,
+        payload=payload,
+        changed_at=now,
+    )
+
+
+def record_changes(changes: Iterable[Optional[models.ScheduleChange]]) -> int:
+    changes = [change for change in changes if change is not None]
+    if changes:
+        models.ScheduleChange.objects.bulk_create(changes, batch_size=1000)
+    return len(changes)
+
+
+def series_change(series: models.LessonSeries, *, deleted: bool = False, now: Optional[datetime] = None):
+    """
+    Одно событие на изменение серии вместо события на каждое её занятие.
+
+    Новые серии не сообщаются: это загрузка семестра, а не изменение.
+    """
+    now = now or timezone.now()
+    if not series.group_id or (series.until and series.until < now.date()):
+        return None
+    return models.ScheduleChange(
+        group_id=series.group_id,
+        lesson_id=series.id,
+        kind=models.ScheduleChange.KIND_SERIES,
+        payload={
+            "subject": series.subject,
+            "starts_on": _plain(series.starts_on),
+            "until": _plain(series.until),
+            "weekdays": list(series.weekdays or ()),
+            "start_time": _plain(series.start_time),
+            "deleted": deleted,
+        },
+        changed_at=now,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Уведомления
+# ---------------------------------------------------------------------------
+
+
+def wants_schedule_notifications(profile_settings: Optional[Mapping[str, Any]]) -> bool:
+    notifications = (profile_settings or {}).get("notifications")
+    if not isinstance(notifications, Mapping):
+        return True
+    return notifications.get("schedule_changes", True) is not False
+
+
+def _zone(name: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or "Europe/Moscow")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("Europe/Moscow")
+
+
+def _moment(value: Optional[str], zone: ZoneInfo) -> str:
+    if not value:
+        return ""
+    try:
+        return datetime.fromisoformat(value).astimezone(zone).strftime("%d.%m %H:%M")
+    except ValueError:
+        return value
+
+
+def render_message(changes: List[models.ScheduleChange], time_zone: Optional[str]) -> Dict[str, Any]:
+    """Текст и элементы сообщения; несколько событий одного занятия схлопываются в последнее."""
+    zone = _zone(time_zone)
+    latest: "OrderedDict[str, models.ScheduleChange]" = OrderedDict()
+    for change in changes:
+        latest.pop(change.lesson_id, None)
+        latest[change.lesson_id] = change
+
+    lines = ["Изменения в расписании:"]
+    items = []
+    for change in latest.values():
+        payload = change.payload or {}
+        subject = payload.get("subject") or "Занятие"
+        when = _moment(payload.get("starts_at"), zone)
+        label = KIND_LABELS.get(change.kind, change.kind)
+        if change.kind == models.ScheduleChange.KIND_RESCHEDULED and change.previous_starts_at:
+            label = f"перенесено с {change.previous_starts_at.astimezone(zone):%d.%m %H:%M}"
+        lines.append(f"• {subject}{', ' + when if when else ''} — {label}")
+        items.append(
+            {
+                "change_id": change.id,
+                "lesson_id": change.lesson_id,
+                "kind": change.kind,
+                "subject": subject,
+                "starts_at": payload.get("starts_at"),
+            }
+        )
+    return {"text": "\n".join(lines), "items": items}
+
+
+def notify_pending(batch_size: int = 500) -> Tuple[int, int]:
+    """
+    Обработать одну пачку событий: одно сообщение на пользователя.
+
+    События блокируются FOR UPDATE SKIP LOCKED, поэтому несколько
+    обработчиков могут работать параллельно. Возвращает (событий, сообщений).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        changes = list(
+            models.ScheduleChange.objects.filter(notified_at__isnull=True)
+            .order_by("id")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not changes:
+            return 0, 0
+
+        by_group: Dict[str, List[models.ScheduleChange]] = defaultdict(list)
+        for change in changes:
+            by_group[change.group_id].append(change)
+        group_zones = dict(
+            models.AcademicGroup.objects.filter(id__in=by_group).values_list("id", "schedule_time_zone")
+        )
+        members = models.UserProfile.objects.filter(academic_group_id__in=by_group).values_list(
+            "id", "academic_group_id", "settings", "time_zone"
+        )
+
+        notifications = []
+        for user_id, group_id, profile_settings, time_zone in members.iterator(chunk_size=2000):
+            if not wants_schedule_notifications(profile_settings):
+                continue
+            group_changes = by_group[group_id]
+            notifications.append(
+                models.ScheduleNotification(
+                    user_id=user_id,
+                    change_ids=[change.id for change in group_changes],
+                    payload=render_message(group_changes, time_zone or group_zones.get(group_id)),
+                )
+            )
+        models.ScheduleNotification.objects.bulk_create(notifications, batch_size=1000)
+        models.ScheduleChange.objects.filter(id__in=[change.id for change in changes]).update(notified_at=now)
+    logger.info("Изменения расписания: %s событий, %s сообщений", len(changes), len(notifications))
+    return len(changes), len(notifications)
+
+
+def _settled_changes(group_id: str):
+    """
+    События группы, к которым уже не добавится ни одно с меньшим курсором.
+
+    Берутся только транзакции старше самой старой незавершённой: все они
+    уже видны, а любое новое событие получит xact_id не меньше горизонта.
+    """
+    return models.ScheduleChange.objects.filter(group_id=group_id, xact_id__lt=RawSQL(_COMMITTED_HORIZON, []))
+
+
+def _cursor_values(since: str) -> List[Any]:
+    if since.isdigit():
+        # Числовой курсор (id события) от клиентов до перехода на порядок фиксации
+        xact_id = models.ScheduleChange.objects.filter(id=int(since)).values_list("xact_id", flat=True).first()
+        if xact_id is None:
+            raise InvalidCursor("unknown change id")
+        return [xact_id, int(since)]
+    return decode_cursor(since, salt=CHANGES_CURSOR_SALT, size=len(CHANGES_ORDERING))
+
+
+def current_changes_cursor(group_id: str) -> str:
+    """Курсор после последнего события группы (или перед первым, если событий нет)."""
+    last = _settled_changes(group_id).order_by("-xact_id", "-id").values_list(*CHANGES_ORDERING).first()
+    return encode_cursor(last or (0, 0), salt=CHANGES_CURSOR_SALT)
+
+
+def changes_page(group_id: str, since: str, limit: int) -> Tuple[List[Dict[str, Any]], str, bool]:
+    """
+    События группы после курсора since: (события, новый курсор, есть ли ещё).
+
+    Курсор идёт в порядке фиксации транзакций, поэтому событие, которое
+    долгая транзакция зафиксирует позже, не окажется позади курсора клиента.
+    Неверный курсор поднимает InvalidCursor.
+    """
+    last = _cursor_values(since)
+    queryset = _settled_changes(group_id).filter(after(CHANGES_ORDERING, last))
+    rows = list(queryset.order_by(*CHANGES_ORDERING).values(*CHANGES_FIELDS, "xact_id")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        last = [rows[-1]["xact_id"], rows[-1]["id"]]
+    for row in rows:
+        del row["xact_id"]
+    return rows, encode_cursor(last, salt=CHANGES_CURSOR_SALT), has_more
+
+
+def prune_changes(older_than: datetime) -> int:
+    deleted, _ = models.ScheduleChange.objects.filter(
+        changed_at__lt=older_than, notified_at__isnull=False
+    ).delete()
+    return deleted
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import heapq
+import logging
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from django.db.models import Func, Q, TextField, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Lower
+from django.db.models.lookups import In
+
+from .. import models
+from .lesson_series import series_lessons
+
+logger = logging.getLogger(__name__)
+
+KIND_ROOM = "room"
+KIND_TEACHER = "teacher"
+KIND_GROUP = "group"
+KINDS = (KIND_ROOM, KIND_TEACHER, KIND_GROUP)
+
+KIND_LABELS = {
+    KIND_ROOM: "аудитория",
+    KIND_TEACHER: "преподаватель",
+    KIND_GROUP: "группа",
+}
+
+LESSON_COLUMNS = ("id", "starts_at", "ends_at", "room_id", "room_snapshot", "teacher_id", "group_id", "subgroup")
+
+
+@dataclass(frozen=True)
+class Conflict:
+    kind: str
+    resource: str
+    first_id: str
+    second_id: str
+    overlap_from: datetime
+    overlap_to: datetime
+
+    def describe(self) -> str:
+        return (
+            f"{KIND_LABELS[self.kind]} {self.resource}: {self.first_id} и {self.second_id} "
+            f"({self.overlap_from:%Y-%m-%d %H:%M}–{self.overlap_to:%H:%M} UTC)"
+        )
+
+
+def room_key(room_id: Optional[object], snapshot: Optional[Mapping]) -> Optional[str]:
+    """Аудитория занятия: FK, а для занятий из API — название из снимка."""
+    if room_id:
+        return str(room_id)
+    snapshot = snapshot or {}
+    name = _room_name(snapshot)
+    if not name:
+        return None
+    campus = str(snapshot.get("campus") or snapshot.get("building") or "").strip().lower()
+    return f"{campus}/{name}"
+
+
+def _room_name(snapshot: Mapping) -> str:
+    return str(snapshot.get("name") or "").strip().lower()
+
+
+def _snapshot_room_name():
+    """Название аудитории из room_snapshot в SQL, нормализованное как в room_key."""
+    name = KeyTextTransform("name", "room_snapshot")
+    return Lower(Func(name, Value(" \t\n\r\x0b\x0c"), function="BTRIM", output_field=TextField()))
+
+
+def _subgroup_label(value: Optional[Mapping]) -> str:
+    value = value or {}
+    return str(value.get("id") or value.get("name") or "")
+
+
+class _Codes:
+    """Строковые идентификаторы -> плотные int-коды для компактных массивов."""
+
+    def __init__(self) -> None:
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: Optional[str]) -> int:
+        if not value:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class LessonIntervals:
+    """
+    Занятия семестра в виде параллельных массивов.
+
+    Время хранится в секундах UTC (array('q')), аудитории, преподаватели и
+    группы — int-кодами (-1, если не указаны), без моделей Lesson.
+    """
+
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.starts = array("q")
+        self.ends = array("q")
+        self.resources: Dict[str, array] = {kind: array("q") for kind in KINDS}
+        self.subgroups = array("q")
+        self._codes: Dict[str, _Codes] = {kind: _Codes() for kind in (*KINDS, "subgroup")}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(
+        self,
+        lesson_id: str,
+        starts_at: datetime,
+        ends_at: datetime,
+        *,
+        room: Optional[str] = None,
+        teacher: Optional[str] = None,
+        group: Optional[str] = None,
+        subgroup: str = "",
+    ) -> None:
+        self.ids.append(lesson_id)
+        self.starts.append(int(starts_at.timestamp()))
+        self.ends.append(int(ends_at.timestamp()))
+        for kind, value in ((KIND_ROOM, room), (KIND_TEACHER, teacher), (KIND_GROUP, group)):
+            self.resources[kind].append(self._codes[kind].code(value))
+        self.subgroups.append(self._codes["subgroup"].code(subgroup))
+
+    def resource(self, kind: str, code: int) -> str:
+        return self._codes[kind].values[code]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence]) -> "LessonIntervals":
+        """Строки values_list(*LESSON_COLUMNS)."""
+        intervals = cls()
+        for lesson_id, starts_at, ends_at, room_id, snapshot, teacher_id, group_id, subgroup in rows:
+            if not starts_at or not ends_at or ends_at <= starts_at:
+                continue
+            intervals.add(
+                lesson_id,
+                starts_at,
+                ends_at,
+                room=room_key(room_id, snapshot),
+                teacher=teacher_id,
+                group=group_id,
+                subgroup=_subgroup_label(subgroup),
+            )
+        return intervals
+
+
+def _sweep(intervals: LessonIntervals, kind: str) -> Iterator[Tuple[int, int, int]]:
+    """
+    Пересекающиеся пары по одному ресурсу: сортировка по (ресурс, начало)
+    и проход с кучей концов активных занятий — O(n log n + k).
+    """
+    codes = intervals.resources[kind]
+    starts, ends = intervals.starts, intervals.ends
+    order = sorted((index for index in range(len(codes)) if codes[index] >= 0), key=lambda i: (codes[i], starts[i]))
+
+    active: List[Tuple[int, int]] = []
+    current = -1
+    for index in order:
+        if codes[index] != current:
+            current = codes[index]
+            active = []
+        start = starts[index]
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, other in active:
+            yield current, other, index
+        heapq.heappush(active, (ends[index], index))
+
+
+def _subgroups_overlap(intervals: LessonIntervals, first: int, second: int) -> bool:
+    # Занятия разных подгрупп одной группы могут идти одновременно
+    left, right = intervals.subgroups[first], intervals.subgroups[second]
+    return left < 0 or right < 0 or left == right
+
+
+def detect_conflicts(intervals: LessonIntervals, *, kinds: Sequence[str] = KINDS) -> List[Conflict]:
+    conflicts: List[Conflict] = []
+    for kind in kinds:
+        for code, first, second in _sweep(intervals, kind):
+            if kind == KIND_GROUP and not _subgroups_overlap(intervals, first, second):
+                continue
+            conflicts.append(
+                Conflict(
+                    kind=kind,
+                    resource=intervals.resource(kind, code),
+                    first_id=intervals.ids[first],
+                    second_id=intervals.ids[second],
+                    overlap_from=datetime.fromtimestamp(
+                        max(intervals.starts[first], intervals.starts[second]), dt_timezone.utc
+                    ),
+                    overlap_to=datetime.fromtimestamp(min(intervals.ends[first], intervals.ends[second]), dt_timezone.utc),
+                )
+            )
+    conflicts.sort(key=lambda item: (item.overlap_from, item.kind, item.resource))
+    return conflicts
+
+
+def _active_lessons():
+    return models.Lesson.objects.exclude(status=models.LESSON_STATUS_CANCELED)
+
+
+def _occurrence_rows(date_from: datetime, date_to: datetime, extra: Optional[Q]) -> Iterator[tuple]:
+    # Занятие серии начинается не раньше чем за сутки до окна, если его пересекает
+    for lesson in series_lessons(date_from - timedelta(days=1), date_to, extra=extra):
+        if lesson.ends_at > date_from:
+            yield tuple(getattr(lesson, column) for column in LESSON_COLUMNS)
+
+
+def load_intervals(date_from: datetime, date_to: datetime, extra: Optional[Q] = None) -> LessonIntervals:
+    """Неотменённые занятия (и развёрнутые серии), пересекающие [date_from, date_to)."""
+    queryset = _active_lessons().filter(starts_at__lt=date_to, ends_at__gt=date_from)
+    if extra is not None:
+        queryset = queryset.filter(extra)
+    rows = queryset.order_by().values_list(*LESSON_COLUMNS).iterator(chunk_size=5000)
+    return LessonIntervals.from_rows(chain(rows, _occurrence_rows(date_from, date_to, extra)))
+
+
+def find_conflicts(date_from: datetime, date_to: datetime) -> List[Conflict]:
+    """Все пересечения занятий в окне (например, за семестр)."""
+    return detect_conflicts(load_intervals(date_from, date_to))
+
+
+def conflicts_for_lessons(lesson_ids: Iterable[str]) -> List[Conflict]:
+    """
+    Инкрементальная проверка: пересечения, в которых участвует хотя бы одно
+    из указанных занятий.
+
+    Загружаются только занятия тех же аудиторий, преподавателей и групп
+    в пределах времени изменённых занятий.
+    """
+    lesson_ids = set(lesson_ids)
+    if not lesson_ids:
+        return []
+    touched = list(_active_lessons().filter(id__in=lesson_ids).order_by().values_list(*LESSON_COLUMNS))
+    if not touched:
+        return []
+
+    room_ids: Set[object] = set()
+    room_names: Set[str] = set()
+    teacher_ids: Set[str] = set()
+    group_ids: Set[str] = set()
+    for _, _, _, room_id, snapshot, teacher_id, group_id, _ in touched:
+        if room_id:
+            room_ids.add(room_id)
+        elif room_key(None, snapshot):
+            room_names.add(_room_name(snapshot))
+        if teacher_id:
+            teacher_ids.add(teacher_id)
+        if group_id:
+            group_ids.add(group_id)
+
+    # Названия сравниваются в том же виде, что и в room_key: без регистра и пробелов по краям
+    related = Q(room_id__in=room_ids) | Q(teacher_id__in=teacher_ids) | Q(group_id__in=group_ids)
+    if room_names:
+        related |= Q(In(_snapshot_room_name(), sorted(room_names)))
+    lower = min(row[1] for row in touched)
+    upper = max(row[2] for row in touched)
+    intervals = load_intervals(lower, upper, related)
+    return [
+        conflict
+        for conflict in detect_conflicts(intervals)
+        if conflict.first_id in lesson_ids or conflict.second_id in lesson_ids
+    ]
+
+
+def log_conflicts(conflicts: Sequence[Conflict], *, limit: int = 50) -> None:
+    for conflict in conflicts[:limit]:
+        logger.warning("Пересечение в расписании: %s", conflict.describe())
+    if len(conflicts) > limit:
+        logger.warning("Пересечений в расписании: ещё %s", len(conflicts) - limit)
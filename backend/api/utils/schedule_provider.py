@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import abc
+import logging
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .schedule_store import GroupSchedule, build_group_schedule, get_schedule_store
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleProviderUnavailable(Exception):
+    """Источник расписания недоступен, а подходящей копии в кэше нет."""
+
+
+def week_start(value: datetime) -> date:
+    day = value.astimezone(dt_timezone.utc).date()
+    return day - timedelta(days=day.weekday())
+
+
+def _week_bounds(start: date) -> Tuple[datetime, datetime]:
+    lower = datetime(start.year, start.month, start.day, tzinfo=dt_timezone.utc)
+    return lower, lower + timedelta(days=7)
+
+
+def week_window(start: date, date_from: datetime, date_to: datetime) -> Tuple[datetime, datetime]:
+    """Часть окна [date_from, date_to), попадающая в неделю start."""
+    lower, upper = _week_bounds(start)
+    return max(date_from, lower), min(date_to, upper)
+
+
+def weeks_between(date_from: datetime, date_to: datetime) -> List[date]:
+    """Понедельники недель, пересекающихся с [date_from, date_to)."""
+    weeks = []
+    start = week_start(date_from)
+    while _week_bounds(start)[0] < date_to:
+        weeks.append(start)
+        start += timedelta(days=7)
+    return weeks
+
+
+class CircuitBreaker:
+    """
+    Простой предохранитель: после failure_threshold ошибок подряд вызовы
+    блокируются на reset_timeout секунд, затем пропускается одна пробная попытка.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, timer: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = float(reset_timeout)
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._timer() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._timer()
+            self._probe_in_flight = False
+
+
+class ScheduleProvider(abc.ABC):
+    """
+    Источник недельного расписания группы.
+
+    Для cacheable-провайдеров CachedScheduleSource собирает окно из кэшированных
+    недель; для остальных вызывает window() напрямую.
+    """
+
+    source = "unknown"
+    cacheable = True
+
+    @abc.abstractmethod
+    def fetch_week(self, group_id: str, start: date) -> GroupSchedule:
+        """Расписание группы на неделю, начинающуюся в start."""
+
+    @abc.abstractmethod
+    def window(self, group_id: str, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        """Занятия группы в полуинтервале [date_from, date_to)."""
+
+
+class FixtureScheduleProvider(ScheduleProvider):
+    """Расписание из UNIVERSITY_SCHEDULE_FIXTURES (уже в памяти, кэш не нужен)."""
+
+    source = "university_api"
+    cacheable = False
+
+    def fetch_week(self, group_id: str, start: date) -> GroupSchedule:
+        return get_schedule_store().group(group_id)
+
+    def window(self, group_id: str, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        return get_schedule_store().window(group_id, date_from, date_to)
+
+
+class HttpScheduleProvider(ScheduleProvider):
+    """
+    Расписание из HTTP API университета.
+
+    Соединения переиспользуются через пул requests.Session, у каждого вызова
+    свой таймаут, временные ошибки повторяются с экспоненциальной задержкой
+    и джиттером, а при серии отказов срабатывает CircuitBreaker.
+    """
+
+    source = "university_api"
+    RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        token: str = "",
+        connect_timeout: float = 1.0,
+        read_timeout: float = 3.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+        pool_size: int = 10,
+        breaker: Optional[CircuitBreaker] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = max(int(retries), 0)
+        self.backoff = float(backoff)
+        self.breaker = breaker or CircuitBreaker()
+        self._sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/json"
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def close(self) -> None:
+        self.session.close()
+
+    def fetch_week(self, group_id: str, start: date) -> GroupSchedule:
+        url = f"{self.base_url}/groups/{group_id}/schedule"
+        params = {"from": start.isoformat(), "to": (start + timedelta(days=7)).isoformat()}
+        payload = self._get_json(url, params)
+        entries = payload.get("items", []) if isinstance(payload, dict) else payload
+        if not isinstance(entries, list):
+            raise ScheduleProviderUnavailable("unexpected_payload")
+        return build_group_schedule(group_id, entries)
+
+    def window(self, group_id: str, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        items: List[Mapping[str, Any]] = []
+        for start in weeks_between(date_from, date_to):
+            items.extend(self.fetch_week(group_id, start).window(*week_window(start, date_from, date_to)))
+        return items
+
+    def _is_transient(self, status_code: int) -> bool:
+        return status_code in self.RETRY_STATUSES or status_code >= 500
+
+    def _get_json(self, url: str, params: Dict[str, str]) -> Any:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            if not self.breaker.allow():
+                raise ScheduleProviderUnavailable("circuit_open")
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code == 404:
+                    # Группы нет у университета — это не отказ API
+                    self.breaker.record_success()
+                    return []
+                response.raise_for_status()
+                payload = response.json()
+            except requests.HTTPError as exc:
+                last_error = exc
+                if not self._is_transient(exc.response.status_code):
+                    self.breaker.record_success()
+                    break
+                self.breaker.record_failure()
+                continue
+            except (requests.RequestException, ValueError) as exc:
+                last_error = exc
+                self.breaker.record_failure()
+                continue
+            self.breaker.record_success()
+            return payload
+        logger.warning("API расписания недоступно (%s): %s", url, last_error)
+        raise ScheduleProviderUnavailable(str(last_error))
+
+
+class StaleWhileRevalidateCache:
+    """
+    Кэш с отдачей устаревших данных на время фонового обновления.
+
+    Свежие записи (моложе fresh_ttl) отдаются сразу. Устаревшие, но моложе
+    stale_ttl, тоже отдаются сразу, а обновление уходит в фоновый поток.
+    Одновременные промахи по одному ключу объединяются: загрузку выполняет
+    один поток, остальные ждут его результата.
+    """
+
+    def __init__(
+        self,
+        fresh_ttl: float = 300.0,
+        stale_ttl: float = 3600.0,
+        maxsize: int = 2048,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.fresh_ttl = float(fresh_ttl)
+        self.stale_ttl = max(float(stale_ttl), self.fresh_ttl)
+        self.maxsize = max(int(maxsize), 1)
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, threading.Event] = {}
+        self._errors: Dict[Hashable, Exception] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        while True:
+            with self._lock:
+                now = self._timer()
+                cached = self._data.get(key)
+                if cached is not None:
+                    age = now - cached[0]
+                    if age < self.fresh_ttl:
+                        return cached[1]
+                    if age < self.stale_ttl:
+                        if key not in self._inflight:
+                            self._inflight[key] = threading.Event()
+                            threading.Thread(
+                                target=self._load, args=(key, loader), name="schedule-revalidate", daemon=True
+                            ).start()
+                        return cached[1]
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            waiter.wait()
+            with self._lock:
+                error = self._errors.get(key)
+                fresh = key in self._data and self._timer() - self._data[key][0] < self.stale_ttl
+            if error is not None and not fresh:
+                raise error
+
+        self._load(key, loader)
+        with self._lock:
+            error = self._errors.get(key)
+            cached = self._data.get(key)
+        if cached is not None and self._timer() - cached[0] < self.stale_ttl:
+            return cached[1]
+        raise error or ScheduleProviderUnavailable("load_failed")
+
+    def _load(self, key: Hashable, loader: Callable[[], Any]) -> None:
+        try:
+            value = loader()
+        except Exception as exc:  # noqa: BLE001 — ошибку получат ожидающие потоки
+            with self._lock:
+                self._errors[key] = exc
+                self._inflight.pop(key).set()
+            return
+        with self._lock:
+            if len(self._data) >= self.maxsize and key not in self._data:
+                oldest = min(self._data, key=lambda item: self._data[item][0])
+                del self._data[oldest]
+            self._data[key] = (self._timer(), value)
+            self._errors.pop(key, None)
+            self._inflight.pop(key).set()
+
+
+class CachedScheduleSource:
+    """Провайдер + кэш по ключу (группа, неделя)."""
+
+    def __init__(self, provider: ScheduleProvider, cache: Optional[StaleWhileRevalidateCache] = None):
+        self.provider = provider
+        self.cache = cache if cache is not None else StaleWhileRevalidateCache()
+
+    @property
+    def source(self) -> str:
+        return self.provider.source
+
+    def week(self, group_id: str, start: date) -> GroupSchedule:
+        if not self.provider.cacheable:
+            return self.provider.fetch_week(group_id, start)
+        return self.cache.get((group_id, start), lambda: self.provider.fetch_week(group_id, start))
+
+    def version(self, group_id: str, date_from: datetime, date_to: datetime) -> str:
+        """Отпечаток данных, из которых собирается окно расписания."""
+        if not self.provider.cacheable:
+            return self.provider.fetch_week(group_id, week_start(date_from)).digest
+        return ":".join(self.week(group_id, start).digest for start in weeks_between(date_from, date_to))
+
+    def window(self, group_id: str, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        if not self.provider.cacheable:
+            return self.provider.window(group_id, date_from, date_to)
+        items: List[Mapping[str, Any]] = []
+        for start in weeks_between(date_from, date_to):
+            # Неделя может содержать и соседние дни — берём только её часть окна
+            items.extend(self.week(group_id, start).window(*week_window(start, date_from, date_to)))
+        return items
+
+
+def build_schedule_provider() -> ScheduleProvider:
+    backend = getattr(settings, "UNIVERSITY_SCHEDULE_PROVIDER", "fixtures")
+    if backend == "http":
+        return HttpScheduleProvider(
+            settings.UNIVERSITY_SCHEDULE_API_URL,
+            token=getattr(settings, "UNIVERSITY_SCHEDULE_API_TOKEN", ""),
+            connect_timeout=getattr(settings, "UNIVERSITY_SCHEDULE_API_CONNECT_TIMEOUT", 1.0),
+            read_timeout=getattr(settings, "UNIVERSITY_SCHEDULE_API_READ_TIMEOUT", 3.0),
+            retries=getattr(settings, "UNIVERSITY_SCHEDULE_API_RETRIES", 2),
+            pool_size=getattr(settings, "UNIVERSITY_SCHEDULE_API_POOL_SIZE", 10),
+            breaker=CircuitBreaker(
+                failure_threshold=getattr(settings, "UNIVERSITY_SCHEDULE_API_BREAKER_THRESHOLD", 5),
+                reset_timeout=getattr(settings, "UNIVERSITY_SCHEDULE_API_BREAKER_RESET", 30),
+            ),
+        )
+    if backend != "fixtures":
+        logger.error("Неизвестный UNIVERSITY_SCHEDULE_PROVIDER=%s, используются фикстуры.", backend)
+    return FixtureScheduleProvider()
+
+
+_schedule_source: Optional[CachedScheduleSource] = None
+_schedule_source_lock = threading.Lock()
+
+
+def get_schedule_source() -> CachedScheduleSource:
+    global _schedule_source
+    if _schedule_source is None:
+        with _schedule_source_lock:
+            if _schedule_source is None:
+                _schedule_source = CachedScheduleSource(
+                    build_schedule_provider(),
+                    StaleWhileRevalidateCache(
+                        fresh_ttl=getattr(settings, "SCHEDULE_CACHE_TTL", 300),
+                        stale_ttl=getattr(settings, "SCHEDULE_CACHE_STALE_TTL", 3600),
+                    ),
+                )
+    return _schedule_source
+
+
+def reset_schedule_source() -> None:
+    global _schedule_source
+    with _schedule_source_lock:
+        if _schedule_source is not None and isinstance(_schedule_source.provider, HttpScheduleProvider):
+            _schedule_source.provider.close()
+        _schedule_source = None
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from .. import models
+from ..serializers import LessonSerializer
+from .lesson_series import merge_by_start, series_lessons
+
+WeekKey = Tuple[str, date]
+
+
+def week_of(value: datetime) -> date:
+    day = value.astimezone(dt_timezone.utc).date()
+    return day - timedelta(days=day.weekday())
+
+
+def snapshot_id(group_id: str, week_start: date) -> str:
+    return f"{group_id}:{week_start.isoformat()}"
+
+
+def whole_weeks(date_from: datetime, date_to: datetime, max_weeks: int = 6) -> Optional[List[date]]:
+    """Недели диапазона, если он состоит из целых недель с понедельника (UTC)."""
+    if date_from.astimezone(dt_timezone.utc).time() != time.min or date_to <= date_from:
+        return None
+    span = date_to - date_from
+    if date_from.weekday() != 0 or span.seconds or span.days % 7:
+        return None
+    count = span.days // 7
+    if count > max_weeks:
+        return None
+    first = date_from.date()
+    return [first + timedelta(days=7 * index) for index in range(count)]
+
+
+def build_week_snapshots(group_id: str, weeks: Iterable[date]) -> Dict[date, List[dict]]:
+    """Пересобрать снапшоты недель группы: один запрос к Lesson и развёрнутые серии."""
+    weeks = sorted(set(weeks))
+    if not weeks:
+        return {}
+
+    version = models.ScheduleVersion.objects.filter(group_id=group_id).values_list("version", flat=True).first()
+    lower = datetime.combine(weeks[0], time.min, dt_timezone.utc)
+    upper = datetime.combine(weeks[-1] + timedelta(days=7), time.min, dt_timezone.utc)
+    lessons = merge_by_start(
+        models.Lesson.objects.filter(group_id=group_id, starts_at__gte=lower, starts_at__lt=upper).select_related(
+            "teacher", "group", "room"
+        ),
+        series_lessons(lower, upper, group_id=group_id, select_related=True),
+    )
+
+    wanted = set(weeks)
+    payloads: Dict[date, List[dict]] = {week: [] for week in weeks}
+    for lesson, data in zip(lessons, LessonSerializer(lessons, many=True).data):
+        week = week_of(lesson.starts_at)
+        if week in wanted:
+            payloads[week].append(data)
+
+    now = timezone.now()
+    models.ScheduleWeekSnapshot.objects.bulk_create(
+        [
+            models.ScheduleWeekSnapshot(
+                id=snapshot_id(group_id, week),
+                group_id=group_id,
+                week_start=week,
+                payload=payload,
+                schedule_version=version or 0,
+                built_at=now,
+            )
+            for week, payload in payloads.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=["payload", "schedule_version", "built_at"],
+    )
+    return payloads
+
+
+def get_week_payloads(group_id: str, weeks: List[date], schedule_version: int) -> Dict[date, List[dict]]:
+    """
+    Снапшоты недель по первичному ключу; недостающие собираются и сохраняются.
+
+    Снапшот, собранный по версии расписания старше schedule_version, считается
+    недостающим: пересборка могла прочитать занятия до чужого коммита и
+    записать результат после него.
+    """
+    ids = {snapshot_id(group_id, week): week for week in weeks}
+    payloads = {
+        ids[snapshot_id_value]: payload
+        for snapshot_id_value, payload, built_version in models.ScheduleWeekSnapshot.objects.filter(
+            id__in=ids
+        ).values_list("id", "payload", "schedule_version")
+        if built_version >= schedule_version
+    }
+    missing = [week for week in weeks if week not in payloads]
+    if missing:
+        payloads.update(build_week_snapshots(group_id, missing))
+    return payloads
+
+
+def rebuild(keys: Iterable[WeekKey]) -> int:
+    by_group: Dict[str, Set[date]] = defaultdict(set)
+    for group_id, week in keys:
+        if group_id:
+            by_group[group_id].add(week)
+    for group_id, weeks in by_group.items():
+        build_week_snapshots(group_id, weeks)
+    return sum(len(weeks) for weeks in by_group.values())
+
+
+_pending = threading.local()
+
+
+def _flush_pending() -> None:
+    keys = getattr(_pending, "keys", None)
+    if not keys:
+        return
+    _pending.keys = set()
+    rebuild(keys)
+
+
+def invalidate_week_snapshots(keys: Iterable[WeekKey]) -> None:
+    """
+    Запланировать пересборку снапшотов после коммита.
+
+    Изменения одной транзакции копятся и пересобираются один раз на
+    (группа, неделя). Массовые операции над Lesson сигналов не шлют
+    и должны вызывать функцию сами.
+    """
+    keys = {(group_id, week) for group_id, week in keys if group_id}
+    if not keys:
+        return
+    if not hasattr(_pending, "keys"):
+        _pending.keys = set()
+    _pending.keys.update(keys)
+    # Занятия уже зафиксированы: ошибка пересборки не должна превращать запись в 500,
+    # устаревший снапшот пересоберётся при чтении по версии расписания
+    transaction.on_commit(_flush_pending, robust=True)
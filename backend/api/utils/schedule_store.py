@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timezone as dt_timezone
+from types import MappingProxyType
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_TEACHER = "Неизвестный преподаватель"
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _parse_starts_at(value: str) -> datetime:
+    starts_at = datetime.fromisoformat(value)
+    if starts_at.tzinfo is None:
+        starts_at = starts_at.replace(tzinfo=dt_timezone.utc)
+    return starts_at
+
+
+def teacher_id_for(full_name: str) -> str:
+    slug = slugify(full_name, allow_unicode=True) or "unknown"
+    return f"teacher-{slug}"
+
+
+def prepare_entry(group_id: str, entry: Dict[str, Any]) -> Tuple[datetime, Dict[str, Any]]:
+    """Нормализовать запись расписания так же, как это делала ScheduleMyView."""
+    starts_at = _parse_starts_at(entry["starts_at"])
+    item = dict(entry)
+    item.setdefault("id", f"{group_id}-{starts_at.isoformat()}")
+    teacher = item.get("teacher")
+    if isinstance(teacher, dict):
+        teacher = dict(teacher)
+        teacher["full_name"] = teacher.get("full_name") or UNKNOWN_TEACHER
+        if not teacher.get("id"):
+            teacher["id"] = teacher_id_for(teacher["full_name"])
+        item["teacher"] = teacher
+    return starts_at, item
+
+
+@dataclass(frozen=True)
+class GroupSchedule:
+    """Занятия группы, отсортированные по времени начала."""
+
+    starts: Tuple[datetime, ...]
+    items: Tuple[Mapping[str, Any], ...]
+    digest: str = ""
+
+    def window(self, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        """Занятия с началом в [date_from, date_to) — O(log n + k)."""
+        lo = bisect_left(self.starts, date_from)
+        hi = bisect_left(self.starts, date_to, lo)
+        return self.items[lo:hi]
+
+
+EMPTY_GROUP_SCHEDULE = GroupSchedule(starts=(), items=())
+
+
+def build_group_schedule(group_id: str, entries: Iterable[Dict[str, Any]]) -> GroupSchedule:
+    prepared = []
+    for entry in entries or []:
+        try:
+            prepared.append(prepare_entry(group_id, entry))
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Пропущено занятие группы %s: %s", group_id, exc)
+    prepared.sort(key=lambda pair: pair[0])
+    # Отпечаток содержимого для ETag — считается один раз при построении
+    digest = hashlib.sha256(
+        json.dumps([item for _, item in prepared], sort_keys=True, ensure_ascii=False, default=str).encode()
+    ).hexdigest()
+    return GroupSchedule(
+        starts=tuple(starts_at for starts_at, _ in prepared),
+        items=tuple(_freeze(item) for _, item in prepared),
+        digest=digest,
+    )
+
+
+class ScheduleStore:
+    """
+    Предразобранное расписание всех групп.
+
+    Записи парсятся один раз при построении: даты, идентификаторы занятий
+    и преподавателей вычисляются заранее. Элементы неизменяемы
+    (MappingProxyType/tuple) и отдаются вьюхам без копирования.
+    """
+
+    def __init__(self, source: Mapping[str, List[Dict[str, Any]]]):
+        self._groups: Dict[str, GroupSchedule] = {
+            group_id: build_group_schedule(group_id, entries) for group_id, entries in (source or {}).items()
+        }
+
+    def group(self, group_id: str) -> GroupSchedule:
+        return self._groups.get(group_id, EMPTY_GROUP_SCHEDULE)
+
+    def window(self, group_id: str, date_from: datetime, date_to: datetime) -> Sequence[Mapping[str, Any]]:
+        return self.group(group_id).window(date_from, date_to)
+
+    def group_ids(self) -> List[str]:
+        return list(self._groups)
+
+
+_store: Optional[ScheduleStore] = None
+_store_token: Optional[Hashable] = None
+_store_checked_at = 0.0
+_store_lock = threading.Lock()
+
+
+def _fixtures_path() -> str:
+    return getattr(settings, "UNIVERSITY_SCHEDULE_FIXTURES_PATH", "") or ""
+
+
+def _source_token() -> Hashable:
+    path = _fixtures_path()
+    if path:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return ("file", path, None)
+        return ("file", path, stat.st_mtime_ns, stat.st_size)
+    return ("settings", id(getattr(settings, "UNIVERSITY_SCHEDULE_FIXTURES", None)))
+
+
+def _load_source() -> Mapping[str, List[Dict[str, Any]]]:
+    path = _fixtures_path()
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as fixtures_file:
+                data = json.load(fixtures_file)
+            if isinstance(data, dict):
+                return data
+            logger.error("Файл расписания %s должен содержать объект, расписание не обновлено.", path)
+        except (OSError, ValueError) as exc:
+            logger.error("Не удалось прочитать файл расписания %s: %s", path, exc)
+        return {}
+    return getattr(settings, "UNIVERSITY_SCHEDULE_FIXTURES", {}) or {}
+
+
+def get_schedule_store() -> ScheduleStore:
+    """
+    Текущий снимок расписания.
+
+    Источник (файл UNIVERSITY_SCHEDULE_FIXTURES_PATH или настройка
+    UNIVERSITY_SCHEDULE_FIXTURES) проверяется не чаще раза в
+    SCHEDULE_STORE_RELOAD_INTERVAL секунд и перечитывается при изменении.
+    """
+    global _store, _store_token, _store_checked_at
+    interval = getattr(settings, "SCHEDULE_STORE_RELOAD_INTERVAL", 5)
+    now = time.monotonic()
+    if _store is not None and now - _store_checked_at < interval:
+        return _store
+
+    with _store_lock:
+        if _store is not None and now - _store_checked_at < interval:
+            return _store
+        token = _source_token()
+        if _store is None or token != _store_token:
+            _store = ScheduleStore(_load_source())
+            _store_token = token
+        _store_checked_at = now
+        return _store
+
+
+def reset_schedule_store() -> None:
+    global _store, _store_token
+    with _store_lock:
+        _store = None
+        _store_token = None
+
+
+_known_teacher_ids: Set[str] = set()
+_known_teacher_lock = threading.Lock()
+
+
+def ensure_teacher_stubs(items: Iterable[Mapping[str, Any]]) -> int:
+    """
+    Создать заглушки Teacher для преподавателей из расписания.
+
+    Уже встречавшиеся воркеру преподаватели пропускаются без запросов к БД,
+    для остальных — один SELECT и, если нужно, один INSERT ... ON CONFLICT DO NOTHING.
+    Возвращает число отправленных на вставку заглушек.
+    """
+    teachers: Dict[str, str] = {}
+    for item in items:
+        teacher = item.get("teacher")
+        if isinstance(teacher, Mapping) and teacher.get("id"):
+            teachers.setdefault(teacher["id"], teacher.get("full_name") or UNKNOWN_TEACHER)
+
+    with _known_teacher_lock:
+        unknown = {teacher_id: name for teacher_id, name in teachers.items() if teacher_id not in _known_teacher_ids}
+    if not unknown:
+        return 0
+
+    existing = set(models.Teacher.objects.filter(id__in=unknown).values_list("id", flat=True))
+    missing = [
+        models.Teacher(id=teacher_id, full_name=name, metadata={"source": "schedule_fixture"})
+        for teacher_id, name in unknown.items()
+        if teacher_id not in existing
+    ]
+    if missing:
+        models.Teacher.objects.bulk_create(missing, ignore_conflicts=True)
+
+    with _known_teacher_lock:
+        _known_teacher_ids.update(unknown)
+    return len(missing)
+
+
+def forget_teacher(teacher_id: str) -> None:
+    with _known_teacher_lock:
+        _known_teacher_ids.discard(teacher_id)
+
+
+def clear_known_teachers() -> None:
+    with _known_teacher_lock:
+        _known_teacher_ids.clear()
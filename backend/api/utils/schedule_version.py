@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable, Optional, Set
+
+from django.db.models import F
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+from .. import models
+
+
+def get_schedule_version(group_id: str) -> Optional[models.ScheduleVersion]:
+    return models.ScheduleVersion.objects.filter(group_id=group_id).first()
+
+
+def bump_schedule_versions(group_ids: Iterable[Optional[str]]) -> None:
+    """
+    Увеличить версию расписания групп.
+
+    Вызывается сигналами Lesson; массовые операции (bulk_create, update)
+    сигналы не шлют и должны вызывать функцию сами.
+    """
+    now = timezone.now()
+    for group_id in sorted({group_id for group_id in group_ids if group_id}):
+        updated = models.ScheduleVersion.objects.filter(group_id=group_id).update(
+            version=F("version") + 1,
+            changed_at=now,
+        )
+        if updated:
+            continue
+        models.ScheduleVersion.objects.bulk_create(
+            [models.ScheduleVersion(group_id=group_id, version=1, changed_at=now)],
+            ignore_conflicts=True,
+        )
+
+
+def groups_using(**lookup) -> Set[str]:
+    """Группы, в занятиях или сериях которых участвует преподаватель/аудитория (lookup по Lesson)."""
+    groups = set(models.Lesson.objects.filter(**lookup).order_by().values_list("group_id", flat=True).distinct())
+    groups.update(models.LessonSeries.objects.filter(**lookup).order_by().values_list("group_id", flat=True).distinct())
+    return groups
+
+
+def version_digest(*parts: object) -> str:
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+
+def make_etag(*parts: object) -> str:
+    return f'"{version_digest(*parts)}"'
+
+
+def request_etag_parts(request) -> str:
+    """Параметры запроса, от которых зависит представление."""
+    return "&".join(f"{key}={value}" for key, value in sorted(request.query_params.items()))
+
+
+def _opaque(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def not_modified(request, etag: str) -> Optional[HttpResponseNotModified]:
+    """Ответ 304, если клиент уже держит представление с этим ETag."""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return None
+    # If-None-Match сравнивает ETag слабо: W/"x" совпадает с "x" (с обеих сторон)
+    etags = {_opaque(value) for value in parse_etags(header)}
+    if "*" in etags or _opaque(etag) in etags:
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+    return None
+
+
+def with_etag(response, etag: str):
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -8,4 +8,5 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'api.middleware.InitDataValidationMiddleware',
+    'api.middleware.IdempotencyMiddleware',
 ]
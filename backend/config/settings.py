@@ -56,6 +56,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '123')
 
+# Предыдущие токены бота, которые ещё принимаются на время ротации
+BOT_TOKENS_PREVIOUS = [token for token in (os.environ.get('BOT_TOKENS_PREVIOUS') or '').split(',') if token]
+
+# Кэш разобранного init_data в памяти воркера
+INIT_DATA_CACHE_SIZE = int(os.environ.get('INIT_DATA_CACHE_SIZE', 4096))
+INIT_DATA_CACHE_TTL = int(os.environ.get('INIT_DATA_CACHE_TTL', 300))
+
+# Кэш профилей пользователей между запросами (сбрасывается сигналами)
+USER_PROFILE_CACHE_SIZE = int(os.environ.get('USER_PROFILE_CACHE_SIZE', 4096))
+USER_PROFILE_CACHE_TTL = int(os.environ.get('USER_PROFILE_CACHE_TTL', 30))
+
+# Буферизованная запись аудита
+AUDIT_LOG_BUFFERED = os.environ.get('AUDIT_LOG_BUFFERED', 'True') == 'True'
+AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE', 100))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL', 2.0))
+AUDIT_LOG_MAX_PENDING = int(os.environ.get('AUDIT_LOG_MAX_PENDING', 10000))
+AUDIT_LOG_SPOOL_PATH = os.environ.get('AUDIT_LOG_SPOOL_PATH', os.path.join(BASE_DIR, 'var', 'audit_spool.jsonl'))
+
+# Срок хранения ответов по Idempotency-Key, в секундах
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
 
 def _load_university_auth_fixtures():
     raw = os.environ.get('UNIVERSITY_AUTH_FIXTURES')
@@ -201,3 +222,58 @@ def _load_university_schedule_fixtures():
 
 UNIVERSITY_SCHEDULE_FIXTURES = _load_university_schedule_fixtures()
 
+# Файл с расписанием вместо UNIVERSITY_SCHEDULE_FIXTURES; перечитывается при изменении
+UNIVERSITY_SCHEDULE_FIXTURES_PATH = os.environ.get('UNIVERSITY_SCHEDULE_FIXTURES_PATH', '')
+SCHEDULE_STORE_RELOAD_INTERVAL = float(os.environ.get('SCHEDULE_STORE_RELOAD_INTERVAL', 5))
+
+# Источник персонального расписания: fixtures или http (API университета)
+UNIVERSITY_SCHEDULE_PROVIDER = os.environ.get('UNIVERSITY_SCHEDULE_PROVIDER', 'fixtures')
+UNIVERSITY_SCHEDULE_API_URL = os.environ.get('UNIVERSITY_SCHEDULE_API_URL', '')
+UNIVERSITY_SCHEDULE_API_TOKEN = os.environ.get('UNIVERSITY_SCHEDULE_API_TOKEN', '')
+UNIVERSITY_SCHEDULE_API_CONNECT_TIMEOUT = float(os.environ.get('UNIVERSITY_SCHEDULE_API_CONNECT_TIMEOUT', 1.0))
+UNIVERSITY_SCHEDULE_API_READ_TIMEOUT = float(os.environ.get('UNIVERSITY_SCHEDULE_API_READ_TIMEOUT', 3.0))
+UNIVERSITY_SCHEDULE_API_RETRIES = int(os.environ.get('UNIVERSITY_SCHEDULE_API_RETRIES', 2))
+UNIVERSITY_SCHEDULE_API_POOL_SIZE = int(os.environ.get('UNIVERSITY_SCHEDULE_API_POOL_SIZE', 10))
+UNIVERSITY_SCHEDULE_API_BREAKER_THRESHOLD = int(os.environ.get('UNIVERSITY_SCHEDULE_API_BREAKER_THRESHOLD', 5))
+UNIVERSITY_SCHEDULE_API_BREAKER_RESET = float(os.environ.get('UNIVERSITY_SCHEDULE_API_BREAKER_RESET', 30))
+
+# Кэш недельного расписания: свежие данные и допустимо устаревшие, в секундах
+SCHEDULE_CACHE_TTL = int(os.environ.get('SCHEDULE_CACHE_TTL', 300))
+SCHEDULE_CACHE_STALE_TTL = int(os.environ.get('SCHEDULE_CACHE_STALE_TTL', 3600))
+
+# iCalendar-подписки на расписание: окно в днях и размер пачки курсора
+ICS_FEED_PAST_DAYS = int(os.environ.get('ICS_FEED_PAST_DAYS', 30))
+ICS_FEED_FUTURE_DAYS = int(os.environ.get('ICS_FEED_FUTURE_DAYS', 180))
+ICS_FEED_CHUNK_SIZE = int(os.environ.get('ICS_FEED_CHUNK_SIZE', 500))
+# Срок жизни ссылки на подписку, в секундах; отозвать ссылки можно раньше через POST /schedule/feeds
+ICS_FEED_TOKEN_MAX_AGE = int(os.environ.get('ICS_FEED_TOKEN_MAX_AGE', 180 * 24 * 60 * 60))
+
+# Индекс занятости аудиторий: окно в днях, дозагрузка изменений и полная пересборка, в секундах
+ROOM_OCCUPANCY_PAST_DAYS = int(os.environ.get('ROOM_OCCUPANCY_PAST_DAYS', 1))
+ROOM_OCCUPANCY_FUTURE_DAYS = int(os.environ.get('ROOM_OCCUPANCY_FUTURE_DAYS', 14))
+ROOM_OCCUPANCY_REFRESH_INTERVAL = float(os.environ.get('ROOM_OCCUPANCY_REFRESH_INTERVAL', 30))
+ROOM_OCCUPANCY_REBUILD_INTERVAL = float(os.environ.get('ROOM_OCCUPANCY_REBUILD_INTERVAL', 900))
+
+# Поиск общих свободных окон: кэш недельных битсетов занятости и ограничения запроса
+FREE_SLOTS_CACHE_SIZE = int(os.environ.get('FREE_SLOTS_CACHE_SIZE', 20000))
+FREE_SLOTS_CACHE_TTL = int(os.environ.get('FREE_SLOTS_CACHE_TTL', 300))
+FREE_SLOTS_MAX_PARTICIPANTS = int(os.environ.get('FREE_SLOTS_MAX_PARTICIPANTS', 500))
+FREE_SLOTS_MAX_DAYS = int(os.environ.get('FREE_SLOTS_MAX_DAYS', 31))
+
+
+# Лента изменений расписания: о новых занятиях сообщаем на столько дней вперёд,
+# разосланные события храним столько дней
+SCHEDULE_CHANGES_HORIZON_DAYS = int(os.environ.get('SCHEDULE_CHANGES_HORIZON_DAYS', 14))
+SCHEDULE_CHANGES_RETENTION_DAYS = int(os.environ.get('SCHEDULE_CHANGES_RETENTION_DAYS', 30))
+
+# Каталог элективов: кэш готовых страниц и максимальный размер страницы
+ELECTIVE_CATALOG_CACHE_SIZE = int(os.environ.get('ELECTIVE_CATALOG_CACHE_SIZE', 512))
+ELECTIVE_CATALOG_CACHE_TTL = int(os.environ.get('ELECTIVE_CATALOG_CACHE_TTL', 300))
+ELECTIVE_CATALOG_MAX_LIMIT = int(os.environ.get('ELECTIVE_CATALOG_MAX_LIMIT', 200))
+
+# Распределение заявок на элективы: сколько курсов получает студент за семестр
+ELECTIVE_SEATS_PER_STUDENT = int(os.environ.get('ELECTIVE_SEATS_PER_STUDENT', 1))
+
+# Фасеты каталога поступления (программы, дни открытых дверей): кэш по версии справочника
+ADMISSIONS_FACETS_CACHE_SIZE = int(os.environ.get('ADMISSIONS_FACETS_CACHE_SIZE', 1024))
+ADMISSIONS_FACETS_CACHE_TTL = int(os.environ.get('ADMISSIONS_FACETS_CACHE_TTL', 600))
@@ -7,6 +7,7 @@ while ! nc -z $POSTGRES_HOST $POSTGRES_PORT; do
     echo "PostgreSQL started"
 
 python manage.py migrate
+python manage.py ensure_audit_partitions --months-ahead 3
 
 
 exec "$@"